@@ -0,0 +1,159 @@
+# board_frame.py Compact binary board frames, as served by the LAN proxy (tools/proxy.py).
+# A frame holds what the board shows and nothing else: fixed width times and status codes, and
+# one table of the destination and reason strings. It is read into a preallocated buffer and
+# decoded straight into a records.Records store. Strings are looked up in the interned tables
+# through memoryview slices of the buffer, so no str is made unless a string is new to the board.
+#
+# Frame layout (version 1, little endian):
+#   0   2   magic b"BF"
+#   2   1   version
+#   3   1   flags, bit 0 set if the response had train services
+#   4   2   length of the rest of the frame
+#   6   19  generatedAt "YYYY-MM-DDTHH:MM:SS", zero bytes if unknown
+#   25  1   number of strings S
+#   26  1   number of services N
+#   27      S strings, each a length byte and UTF-8 bytes
+#           N services of 8 bytes: std (u16 minutes past midnight), etd (i16, see below),
+#           destination (u8 string), reason (u8 string, 255 if none), calls (u16, bit n set if the
+#           service calls at the nth requested destination)
+# etd is minutes past midnight, ON_TIME (-1), CANCELLED (-2), DELAYED (-3), NO_REPORT (-4), or
+# OTHER - k for another status held in string k.
+
+# Released under the MIT license see LICENSE
+
+from array import array
+import darwin
+import records
+
+MAGIC = b"BF"
+VERSION = 1
+HEADER = 27  # Bytes up to the string table
+SERVICE = 8  # Bytes per service
+FOUND = 1  # Flag bit
+
+NO_REPORT = -4
+OTHER = -32
+NO_REASON = 255
+
+
+class FrameError(ValueError):
+    ''' The data isn't a frame this decoder can read. '''
+
+
+class FrameReader:
+    ''' Reads frames of up to size bytes into a buffer allocated once. '''
+
+    def __init__(self, size: int):
+        self.buf = bytearray(size)
+        self._mv = memoryview(self.buf)
+        # Offset of each string in the current frame, and its index in the interned tables, -1 if
+        # not looked up yet
+        self._offsets = array("H", [0] * 255)
+        self._names = array("h", [0] * 255)
+        self._reasons = array("h", [0] * 255)
+        self._etds = array("h", [0] * 255)
+        # Length of the last frame read
+        self.length = 0
+
+    def _fill(self, stream, start: int, end: int):
+        ''' Reads buf[start:end] from stream. '''
+        mv = self._mv
+        while start < end:
+            n = stream.readinto(mv[start:end])
+            if not n:
+                raise FrameError("Frame ends early")
+            start += n
+
+    async def _fill_async(self, stream, start: int, end: int):
+        ''' Same as _fill, for a stream with an async readinto. '''
+        mv = self._mv
+        while start < end:
+            n = await stream.areadinto(mv[start:end])
+            if not n:
+                raise FrameError("Frame ends early")
+            start += n
+
+    def _length(self):
+        ''' Checks the frame header in buf and returns the frame's length. '''
+        buf = self.buf
+        if buf[0:2] != MAGIC:
+            raise FrameError("Not a board frame")
+        if buf[2] != VERSION:
+            raise FrameError(f"Unsupported frame version {buf[2]}")
+        length = 6 + (buf[4] | buf[5] << 8)
+        if length > len(buf):
+            raise FrameError(f"Frame of {length} bytes is larger than the {len(buf)} byte buffer")
+        return length
+
+    def read(self, stream):
+        ''' Reads one frame from stream. Returns the frame's length. '''
+        self._fill(stream, 0, 6)
+        length = self._length()
+        self._fill(stream, 6, length)
+        self.length = length
+        return length
+
+    async def read_async(self, stream):
+        ''' Same as read, for a stream with an async readinto such as http_client.Response. '''
+        await self._fill_async(stream, 0, 6)
+        length = self._length()
+        await self._fill_async(stream, 6, length)
+        self.length = length
+        return length
+
+    def _string(self, k: int):
+        ''' Returns string k of the frame as a memoryview. '''
+        o = self._offsets[k]
+        return self._mv[o + 1:o + 1 + self.buf[o]]
+
+    def decode(self, store):
+        ''' Fills store, a records.Records, from the frame that was read. Returns store, or None if
+        the response had no train services. Sets darwin.generated_at like darwin.read_services. '''
+        buf = self.buf
+        end = self.length
+        store.clear()
+        darwin.generated_at = str(self._mv[6:25], "utf-8") if buf[6] else None
+        count = buf[25]
+        services = buf[26]
+        # String table
+        o = HEADER
+        offsets = self._offsets
+        for k in range(count):
+            if o >= end or o + 1 + buf[o] > end:
+                raise FrameError("Bad string table")
+            offsets[k] = o
+            self._names[k] = -1
+            self._reasons[k] = -1
+            self._etds[k] = 0
+            o += 1 + buf[o]
+        if o + services * SERVICE > end:
+            raise FrameError("Frame ends early")
+        for i in range(services):
+            std = buf[o] | buf[o + 1] << 8
+            etd = buf[o + 2] | buf[o + 3] << 8
+            if etd >= 0x8000:
+                etd -= 0x10000
+            dest = buf[o + 4]
+            reason = buf[o + 5]
+            calls = buf[o + 6] | buf[o + 7] << 8
+            o += SERVICE
+            if dest >= count or (reason != NO_REASON and reason >= count):
+                raise FrameError("Bad string index")
+            if etd <= OTHER:
+                # A status other than the usual ones, interned like any other etd text
+                k = OTHER - etd
+                if k >= count:
+                    raise FrameError("Bad string index")
+                if not self._etds[k]:
+                    self._etds[k] = records.encode_etd(self._string(k))
+                etd = self._etds[k]
+            if self._names[dest] < 0:
+                self._names[dest] = records.NAMES.index(self._string(dest))
+            if reason == NO_REASON:
+                reason = -1
+            else:
+                if self._reasons[reason] < 0:
+                    self._reasons[reason] = records.REASONS.index(self._string(reason))
+                reason = self._reasons[reason]
+            store.add(std, etd, self._names[dest], reason, calls)
+        return store if buf[3] & FOUND else None
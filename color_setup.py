@@ -58,6 +58,23 @@ pcs = machine.Pin(CS_PIN, machine.Pin.OUT)
 spi = machine.SPI(1, baudrate=4_000_000)
 pdc = machine.Pin(DC_PIN, machine.Pin.OUT)
 gc.collect()  # Precaution before instantiating framebuf
-ssd = SSD(spi, pcs, pdc, prst, pbusy, landscape=True, asyn=False)  # Create a display instance
+# partial=True only sends changed regions using a fast waveform. A full refresh is forced every
+# full_every updates to clear ghosting. Uses an extra framebuffer worth of RAM.
+# Frames are sent in SPI bursts. Set per_byte_cs=True if the panel does not clear down correctly.
+ssd = SSD(spi, pcs, pdc, prst, pbusy, landscape=True, partial=True, full_every=10)  # Create a display instance
 #ssdred = SSDred(spi, pcs, pdc, prst, pbusy, landscape=False)  # Cread a red display instance (just for B model)
 ssd.demo_mode = True
+
+# The asyncio main loop (asyncMode in config.json) needs the driver's non-blocking show. config.json
+# is read once the framebuffer is allocated, and the driver only checks asyn when showing a frame.
+# main.py validates and uses the same dict, or reads the file again to report why it failed here
+try:
+    import ujson
+    with open("config.json", "r") as file:
+        config = ujson.load(file)
+    del file
+except Exception:
+    config = None
+asyn = config.get("asyncMode", False) if config else False
+ssd._asyn = asyn
+gc.collect()
@@ -0,0 +1,314 @@
+# darwin.py Streaming extractor for Darwin GetDepBoardWithDetails and GetDepartureBoard responses.
+# Reads the response body in fixed-size chunks and keeps only the fields the board
+# displays, so peak RAM stays bounded however large the response is.
+
+# Released under the MIT license see LICENSE
+
+import records
+
+# Size of each socket read. Smaller values lower peak RAM, larger values are faster.
+CHUNK_SIZE = 512
+
+# Time the last response read by read_services was generated ("YYYY-MM-DDTHH:MM:SS", UK time), or None
+generated_at = None
+
+# Service fields (depth 3) that are kept
+_SERVICE_FIELDS = ("std", "etd", "delayReason", "cancelReason")
+
+# Object keys the extractor needs. Keys are matched against these so no new str is made per key
+_KEYS = ("trainServices", "generatedAt", "std", "etd", "delayReason", "cancelReason", "destination",
+         "locationName", "crs", "subsequentCallingPoints", "callingPoint")
+_KEY_BYTES = tuple(k.encode() for k in _KEYS)
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+# Read buffer and extractor, allocated on first use and reused for every response
+_buf = None
+_extractor = None
+
+
+def _unescape(text: str):
+    ''' Decodes JSON backslash escapes. Only called on strings that contain a backslash. '''
+    out = []
+    i = 0
+    end = len(text)
+    while i < end:
+        c = text[i]
+        if c != "\\" or i + 1 >= end:
+            out.append(c)
+            i += 1
+            continue
+        c = text[i + 1]
+        if c == "u":
+            out.append(chr(int(text[i + 2:i + 6], 16)))
+            i += 6
+        else:
+            out.append(_ESCAPES.get(c, c))
+            i += 2
+    return "".join(out)
+
+
+class ServiceExtractor:
+    ''' Incremental JSON scanner that extracts std, etd, destination and delay/cancel reason
+    for each entry of the top level trainServices array into a records.Records store.
+    Feed it chunks with feed(). '''
+
+    def __init__(self, store, calls=None):
+        self._calls = None
+        self.reset(store, calls)
+
+    def reset(self, store, calls=None):
+        ''' Prepares to read a new response into store, which is cleared. '''
+        # Services are added to this records.Records store
+        self.store = store
+        store.clear()
+        # CRS codes to look for in each service's destination and subsequent calling points.
+        # When set, bit n of the service's calls is set if it calls at calls[n] and services
+        # with no matches are dropped.
+        if calls is not self._calls or calls is None:
+            self._calls_bytes = [crs.encode() for crs in calls] if calls is not None else None
+        self._calls = calls
+        # Set when the response contains a trainServices array
+        self.found = False
+        # Time the response was generated ("YYYY-MM-DDTHH:MM:SS"), from generatedAt
+        self.generated_at = None
+        # Path to the current value. Key (one of _KEYS, or None) for objects, int index for arrays
+        self._stack = []
+        # True when the next string in the current object is a key
+        self._key_next = False
+        # String state. _in_str is True while inside a string, _keep when its bytes are needed
+        self._in_str = False
+        self._keep = False
+        self._escape = False
+        self._str = bytearray()
+        # Fields of the service currently being read. -1 when not seen yet
+        self._in_service = False
+        self._std = -1
+        self._etd = None
+        self._dest = -1
+        self._delay = -1
+        self._cancel = -1
+        self._mask = 0
+
+    def _wanted(self):
+        ''' Returns True if the string starting now is a key or a value we need to keep. '''
+        calls = self._calls is not None
+        if self._key_next:
+            # Keys are only needed down to the destination location object, or the
+            # calling point objects when looking for calling points
+            return len(self._stack) <= (7 if calls else 5)
+        stack = self._stack
+        depth = len(stack)
+        if depth == 1:
+            return stack[0] == "generatedAt"
+        if depth < 3 or stack[0] != "trainServices":
+            return False
+        if depth == 3:
+            return stack[2] in _SERVICE_FIELDS
+        if depth == 5 and stack[2] == "destination":
+            return (stack[3] == 0 and stack[4] == "locationName") or (calls and stack[4] == "crs")
+        return (calls and depth == 7 and stack[2] == "subsequentCallingPoints"
+                and stack[4] == "callingPoint" and stack[6] == "crs")
+
+    def _end_string(self):
+        ''' Handles a completed string, either as an object key or a service field value. '''
+        value = self._str
+        self._str = bytearray()
+        if value.find(b"\\") >= 0:
+            value = _unescape(str(value, "utf-8")).encode()
+        stack = self._stack
+        if self._key_next:
+            key = None
+            for i in range(len(_KEY_BYTES)):
+                if value == _KEY_BYTES[i]:
+                    key = _KEYS[i]
+                    break
+            stack[-1] = key
+            self._key_next = False
+        elif len(stack) == 1:
+            # generatedAt, e.g. "2024-05-01T21:03:12.1234567+01:00"
+            self.generated_at = str(value[:19], "utf-8")
+        elif self._in_service:
+            if len(stack) == 3:
+                field = stack[2]
+                if field == "std":
+                    self._std = records.parse_minutes(value)
+                elif field == "etd":
+                    self._etd = records.encode_etd(value)
+                elif len(value):
+                    # Reasons repeat between polls and services, so they are interned
+                    if field == "delayReason":
+                        self._delay = records.REASONS.index(value)
+                    else:
+                        self._cancel = records.REASONS.index(value)
+            elif stack[-1] == "locationName":
+                self._dest = records.NAMES.index(value)
+            else:
+                # Destination or calling point CRS that one of the pages may be looking for
+                wanted = self._calls_bytes
+                for n in range(len(wanted)):
+                    if value == wanted[n]:
+                        self._mask |= 1 << n
+
+    def _open(self, container):
+        ''' Pushes a new object ("{") or array ("[") onto the path. '''
+        stack = self._stack
+        if container == "{":
+            # A new object in the trainServices array is a new service
+            if len(stack) == 2 and stack[0] == "trainServices":
+                self._in_service = True
+                self._std = -1
+                self._etd = None
+                self._dest = -1
+                self._delay = -1
+                self._cancel = -1
+                self._mask = 0
+            stack.append(None)
+            self._key_next = True
+        else:
+            if len(stack) == 1 and stack[0] == "trainServices":
+                self.found = True
+            stack.append(0)
+
+    def _close(self):
+        ''' Pops the current container. Stores the service when a service object closes. '''
+        stack = self._stack
+        if len(stack) == 3 and stack[0] == "trainServices" and self._in_service:
+            self._emit()
+            self._in_service = False
+        stack.pop()
+        self._key_next = False
+
+    def _emit(self):
+        ''' Adds the service that has just been read to the store. '''
+        if self._std < 0 or self._etd is None or self._dest < 0:
+            print("Skipping invalid service")
+            return
+        # Drop services that don't call at any of the wanted stations
+        if self._calls is not None and not self._mask:
+            return
+        # The delay reason is shown in preference to the cancellation reason
+        reason = self._delay if self._delay >= 0 else self._cancel
+        # Services beyond the store's capacity can't be shown and are dropped
+        self.store.add(self._std, self._etd, self._dest, reason, self._mask)
+
+    def feed(self, chunk, end: int = -1):
+        ''' Processes the first end bytes of chunk (all of it if end is -1). '''
+        if end < 0:
+            end = len(chunk)
+        i = 0
+        while i < end:
+            if self._in_str:
+                # Finish a pending escape split over two chunks
+                if self._escape:
+                    if self._keep:
+                        self._str.append(chunk[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                q = chunk.find(b'"', i, end)
+                b = chunk.find(b'\\', i, end)
+                if b != -1 and (q == -1 or b < q):
+                    # Keep the escape sequence raw, it is decoded when the string ends
+                    stop = b + 2 if b + 2 <= end else end
+                    if self._keep:
+                        self._str.extend(chunk[i:stop])
+                    self._escape = b + 2 > end
+                    i = stop
+                elif q == -1:
+                    # String continues in the next chunk
+                    if self._keep:
+                        self._str.extend(chunk[i:end])
+                    i = end
+                else:
+                    if self._keep:
+                        self._str.extend(chunk[i:q])
+                        self._end_string()
+                    self._in_str = False
+                    i = q + 1
+                continue
+
+            c = chunk[i]
+            i += 1
+            if c == 0x22:  # "
+                self._in_str = True
+                self._keep = self._wanted()
+                if not self._keep and self._key_next:
+                    self._stack[-1] = None
+                    self._key_next = False
+            elif c == 0x7B:  # {
+                self._open("{")
+            elif c == 0x5B:  # [
+                self._open("[")
+            elif c == 0x7D or c == 0x5D:  # } or ]
+                self._close()
+            elif c == 0x2C:  # ,
+                stack = self._stack
+                if stack and isinstance(stack[-1], int):
+                    stack[-1] += 1
+                else:
+                    self._key_next = True
+            # Whitespace, ':' and scalar literals (numbers, true, false, null) are skipped
+
+
+def _begin(store, chunk_size: int, calls, buf):
+    ''' Returns the reset extractor and the buffer to read into. '''
+    global _buf, _extractor
+    if _extractor is None:
+        _extractor = ServiceExtractor(store, calls)
+    else:
+        _extractor.reset(store, calls)
+    if buf is None:
+        if _buf is None or len(_buf) != chunk_size:
+            _buf = bytearray(chunk_size)
+        buf = _buf
+    return _extractor, buf
+
+
+def _end(extractor, store):
+    global generated_at
+    generated_at = extractor.generated_at
+    if not extractor.found:
+        return None
+    return store
+
+
+def read_services(stream, store, chunk_size: int = CHUNK_SIZE, calls=None, buf=None):
+    ''' Reads a Darwin departure board response from stream in chunk_size pieces into store,
+    a records.Records. Returns store, or None if there are no train services.
+    If calls is a list of CRS codes, only services calling at one of them are kept.
+    buf is a bytearray to read into instead of the module's own, e.g. the HTTP receive buffer. '''
+    extractor, buf = _begin(store, chunk_size, calls, buf)
+    while True:
+        n = stream.readinto(buf)
+        if not n:
+            break
+        extractor.feed(buf, n)
+    return _end(extractor, store)
+
+
+async def read_services_async(stream, store, chunk_size: int = CHUNK_SIZE, calls=None, buf=None):
+    ''' Same as read_services, for a stream with an async readinto such as
+    http_client.Response.async_body(). Other tasks run between chunks. '''
+    extractor, buf = _begin(store, chunk_size, calls, buf)
+    while True:
+        n = await stream.areadinto(buf)
+        if not n:
+            break
+        extractor.feed(buf, n)
+    return _end(extractor, store)
+
+
+def partition(services, pages):
+    ''' Splits services read with calls=destinations into pages, one records.Records store per
+    destination. Each page is cleared and filled with the services calling at its destination,
+    up to the page's capacity. Returns pages. '''
+    for n in range(len(pages)):
+        page = pages[n]
+        page.clear()
+        if services is not None:
+            bit = 1 << n
+            for i in range(services.count):
+                if services.calls[i] & bit and not page.add_from(services, i):
+                    break
+    return pages
@@ -0,0 +1,111 @@
+# delay_messages.py Delay and cancellation reasons for the services on the board.
+# Each disrupted service's reason is kept once, keyed by the service's scheduled time and
+# destination, until the service leaves the board. Reasons that haven't been shown are rotated
+# through the textbox one per update, oldest first, and a reason already in the textbox isn't
+# drawn again, so the textbox only redraws when there is something new to show.
+
+# Released under the MIT license see LICENSE
+
+from array import array
+import records
+
+
+class MessageStore:
+    ''' Up to capacity reasons. Entry i is for the service with std[i] (minutes past midnight) and
+    dest[i] (index into records.NAMES), and holds reason[i] (index into records.REASONS) and
+    shown[i] (1 once reason[i] has been in the textbox). Entries are kept in the order the services
+    first had a reason. '''
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self.std = array("h", [0] * capacity)
+        self.dest = array("H", [0] * capacity)
+        self.reason = array("h", [0] * capacity)
+        self.shown = bytearray(capacity)
+        self._seen = bytearray(capacity)
+        # Entry last returned by next(), -1 if none or its service has gone
+        self.current = -1
+        # Counters for reporting
+        self.added = 0
+        self.changed = 0
+        self.evicted = 0
+
+    def clear(self):
+        self.count = 0
+        self.current = -1
+
+    def _find(self, std: int, dest: int):
+        for k in range(self.count):
+            if self.std[k] == std and self.dest[k] == dest:
+                return k
+        return -1
+
+    def update(self, services, rows: int):
+        ''' Brings the store up to date with the first rows services of a records.Records store (or
+        None). Reasons of newly disrupted services are added, a changed reason is shown again, and
+        entries whose services are no longer listed are removed. '''
+        seen = self._seen
+        for k in range(self.count):
+            seen[k] = 0
+        if services is not None:
+            for i in range(min(services.count, rows)):
+                reason = services.reason[i]
+                if reason < 0 or services.etd[i] == records.ON_TIME:
+                    continue
+                k = self._find(services.std[i], services.dest[i])
+                if k < 0:
+                    k = self.count
+                    if k >= self.capacity:
+                        continue
+                    self.std[k] = services.std[i]
+                    self.dest[k] = services.dest[i]
+                    self.reason[k] = reason
+                    self.shown[k] = 0
+                    self.count = k + 1
+                    self.added += 1
+                elif self.reason[k] != reason:
+                    self.reason[k] = reason
+                    self.shown[k] = 0
+                    self.changed += 1
+                seen[k] = 1
+        self._evict()
+
+    def _evict(self):
+        ''' Removes the entries not seen by the last update, keeping the order of the others. '''
+        n = 0
+        current = -1
+        for k in range(self.count):
+            if not self._seen[k]:
+                self.evicted += 1
+                continue
+            if k == self.current:
+                current = n
+            if n != k:
+                self.std[n] = self.std[k]
+                self.dest[n] = self.dest[k]
+                self.reason[n] = self.reason[k]
+                self.shown[n] = self.shown[k]
+            n += 1
+        self.count = n
+        self.current = current
+
+    def next(self):
+        ''' Returns the entry to have in the textbox: the oldest reason not yet shown, marking it
+        shown, otherwise the entry last returned if its service is still listed, otherwise the
+        oldest entry. Returns -1 if the store is empty. '''
+        for k in range(self.count):
+            if not self.shown[k]:
+                self.shown[k] = 1
+                self.current = k
+                return k
+        if self.current < 0 and self.count:
+            self.current = 0
+        return self.current
+
+    def key(self, k: int):
+        ''' Identifies the message of entry k, so an unchanged message isn't drawn again. '''
+        return (self.std[k], self.dest[k], self.reason[k])
+
+    def text(self, k: int):
+        return records.time_text(self.std[k]) + ": " + records.REASONS[self.reason[k]]
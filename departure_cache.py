@@ -0,0 +1,143 @@
+# departure_cache.py Last known good departures, kept in RAM and persisted to flash.
+# Lets the board show departures straight after power-on and during API outages.
+# The RTC is set from each response so departed services can be dropped from the cache.
+
+# Released under the MIT license see LICENSE
+
+import os
+import ujson
+import utime
+import machine
+import records
+from records import MINUTES_PER_DAY
+
+CACHE_FILE = "departures.json"
+
+
+def set_clock(generated: str):
+    ''' Sets the RTC from a Darwin generatedAt time ("YYYY-MM-DDTHH:MM:SS", UK time). '''
+    try:
+        machine.RTC().datetime((int(generated[0:4]), int(generated[5:7]), int(generated[8:10]), 0,
+                                int(generated[11:13]), int(generated[14:16]), int(generated[17:19]), 0))
+    except (ValueError, TypeError, IndexError) as e:
+        print("Could not set clock: " + str(e))
+
+
+def clock():
+    ''' Returns (date "YYYY-MM-DD", minutes past midnight) from the RTC, or (None, None) if it
+    has not been set since power-on. '''
+    t = utime.localtime()
+    if t[0] < 2024:
+        return None, None
+    return f"{t[0]:04d}-{t[1]:02d}-{t[2]:02d}", t[3] * 60 + t[4]
+
+
+def _upcoming(services, now: int, out):
+    ''' Copies the services that have not departed yet into out. '''
+    out.clear()
+    for i in range(services.count):
+        # Over 12 hours ahead means the departure is in the past
+        if (services.departs(i) - now) % MINUTES_PER_DAY <= MINUTES_PER_DAY // 2:
+            out.add_from(services, i)
+
+
+class DepartureCache:
+    ''' Holds a copy of the last successfully fetched data with the time it was generated. Flash writes
+    only happen when the data has changed, and at most once every min_write_interval seconds.
+    The stores are allocated once, pages stores of rows services (one page unless multi). '''
+
+    def __init__(self, path: str = CACHE_FILE, min_write_interval: int = 900, multi: bool = False, rows: int = 10, pages: int = 1):
+        self.path = path
+        self.min_write_interval = min_write_interval
+        # True if data is a list of pages (multi destination mode)
+        self.multi = multi
+        self._data = [records.Records(rows) for _ in range(pages)]
+        self._written = [records.Records(rows) for _ in range(pages)]  # Data last written to flash
+        self._current = [records.Records(rows) for _ in range(pages)]  # Returned by current()
+        self.valid = False  # True once data has been loaded or stored
+        self.found = False  # False if the stored response had no train services (single mode)
+        self.generated = None  # "YYYY-MM-DDTHH:MM:SS"
+        self._write_ticks = None
+
+    def _pages(self, data):
+        ''' Returns data as a list of pages. '''
+        return data if self.multi else [data]
+
+    def load(self):
+        ''' Reads the cache file. Returns True if cached data was found. '''
+        t = utime.ticks_ms()
+        try:
+            with open(self.path, "r") as file:
+                cached = ujson.load(file)
+        except (OSError, ValueError):
+            return False
+        # The file is from another configuration
+        if cached.get("m", False) != self.multi:
+            return False
+        pages = self._pages(cached["d"])
+        if len(pages) != len(self._data):
+            return False
+        for n in range(len(pages)):
+            self._data[n].from_list(pages[n])
+            self._written[n].copy(self._data[n])
+        self.found = cached["d"] is not None
+        self.generated = cached["t"]
+        self.valid = True
+        print(f"Loaded cached departures from {self.generated} in {utime.ticks_diff(utime.ticks_ms(), t)} ms")
+        return True
+
+    def update(self, data, generated: str):
+        ''' Stores a copy of newly fetched data, writing it to flash if it changed and the write interval has passed. '''
+        pages = self._pages(data)
+        for n in range(len(self._data)):
+            self._data[n].copy(pages[n])
+        self.found = data is not None
+        self.generated = generated
+        self.valid = True
+        if all(self._data[n].equals(self._written[n]) for n in range(len(self._data))):
+            return
+        now = utime.ticks_ms()
+        if self._write_ticks is not None and utime.ticks_diff(now, self._write_ticks) < self.min_write_interval * 1000:
+            return
+        # Converted to the JSON format only when written, at most once per write interval
+        stored = [page.to_list() for page in self._data]
+        stored = stored if self.multi else (stored[0] if self.found else None)
+        try:
+            # Write to a temporary file first so a power cut can't leave a half written cache
+            with open(self.path + ".tmp", "w") as file:
+                ujson.dump({"t": generated, "m": self.multi, "d": stored}, file)
+            os.rename(self.path + ".tmp", self.path)
+        except OSError as e:
+            print("Failed to write departure cache: " + str(e))
+            return
+        for n in range(len(self._data)):
+            self._written[n].copy(self._data[n])
+        self._write_ticks = now
+        print("Departure cache written")
+
+    def current(self):
+        ''' Returns the cached data with departed services removed, or None if nothing is cached.
+        Services are only dropped if the RTC has been set. '''
+        if not self.valid:
+            return None
+        date, now = clock()
+        out = self._current
+        for n in range(len(out)):
+            if now is None:
+                out[n].copy(self._data[n])
+            elif self.generated is None or self.generated[:10] != date:
+                # Everything in a cache from another day has departed
+                out[n].clear()
+            else:
+                _upcoming(self._data[n], now, out[n])
+        if self.multi:
+            return out
+        return out[0] if out[0].count else None
+
+    def stores(self):
+        ''' Returns every records.Records store the cache holds, for records.prune. '''
+        return self._data + self._written + self._current
+
+    def stale_label(self):
+        ''' Time the cached data was generated, shown on the board while it is displayed. '''
+        return self.generated[11:16] if self.generated else "--:--"
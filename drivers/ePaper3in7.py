@@ -31,6 +31,25 @@ EPD_3IN7_lut_1Gray_GC =b"\
 \x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
 \x22\x22\x22\x22\x22"
 
+# Direct update waveform used for partial refreshes. Much shorter than GC but leaves ghosting,
+# so a full GC refresh is forced every full_every partial updates.
+EPD_3IN7_lut_1Gray_DU =b"\
+\x10\x2A\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x20\x2A\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x05\x05\x00\x05\x03\x05\x05\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\
+\x22\x22\x22\x22\x22"
+
+# Panel RAM size in pixels (portrait orientation)
+_RAM_W = 280
+_RAM_H = 480
+
 
 class EPD(framebuf.FrameBuffer):
     # A monochrome approach should be used for coding this. The rgb method ensures
@@ -39,7 +58,8 @@ class EPD(framebuf.FrameBuffer):
     def rgb(r, g, b):
         return int((r > 127) or (g > 127) or (b > 127))
 
-    def __init__(self, spi, cs, dc, rst, busy, landscape=False, asyn=False):
+    def __init__(self, spi, cs, dc, rst, busy, landscape=False, asyn=False, partial=False, full_every=10,
+                 per_byte_cs=False, burst_size=1024):
         self._spi = spi
         self._cs = cs  # Pins
         self._dc = dc
@@ -57,6 +77,26 @@ class EPD(framebuf.FrameBuffer):
         self._mvb = memoryview(self._buffer)
         mode = framebuf.MONO_VLSB if landscape else framebuf.MONO_HLSB
         super().__init__(self._buffer, self.width, self.height, mode)
+        # Partial refresh. _shadow holds the last frame sent to the panel so changed regions
+        # can be found. Costs a second framebuffer worth of RAM so is optional.
+        self._shadow = bytearray(len(self._buffer)) if partial else None
+        self.full_every = full_every  # Force a full GC refresh after this many partial updates
+        self._npartial = 0  # Partial updates since the last full refresh
+        # Frame transfer. The inverted (and in landscape rotated) panel image is built in _obuf
+        # and written in bursts. per_byte_cs deasserts CS after every byte for panels that do not
+        # clear down correctly otherwise.
+        self.per_byte_cs = per_byte_cs
+        self._obuf = bytearray(max(burst_size, self.height // 8))
+        self._mvo = memoryview(self._obuf)
+        # Start of each strip in the order the panel expects them in landscape (panel X bytes)
+        nstrips = len(self._buffer) // self.width
+        self._offs = [s * self.width for s in range(nstrips - 1, -1, -1)]
+        # Timing of the last frame transfer
+        self.show_ms = 0
+        self.show_bytes = 0
+        self.busy_ms = 0  # Time the panel was busy during the last wait or async refresh
+        # Strips compared against the shadow are self.width bytes long: one vertical byte row
+        # in landscape, 8 pixel rows in portrait.
         self.init()
 
     def _command(self, command, data=None):
@@ -75,7 +115,8 @@ class EPD(framebuf.FrameBuffer):
             self._spi.write(buf1)
             self._cs(1)
 
-    def init(self):
+    # keep_ram skips the auto write of both RAMs, for wake() after deep sleep mode 1
+    def init(self, keep_ram=False):
         # Hardware reset
         self._rst(1)
         sleep_ms(20)
@@ -88,12 +129,13 @@ class EPD(framebuf.FrameBuffer):
         self._command(b'\x12')
         sleep_ms(300)  
         
-        self._command(b'\x46')
-        self._data(b'\xF7')
-        self.wait_until_ready()
-        self._command(b'\x47')
-        self._data(b'\xF7')
-        self.wait_until_ready()
+        if not keep_ram:
+            self._command(b'\x46')
+            self._data(b'\xF7')
+            self.wait_until_ready()
+            self._command(b'\x47')
+            self._data(b'\xF7')
+            self.wait_until_ready()
 
         self._command(b'\x01')   # setting gaet number
         self._data(b'\xDF')
@@ -156,6 +198,11 @@ class EPD(framebuf.FrameBuffer):
 
         self._command(b'\x32')
         self._data(EPD_3IN7_lut_1Gray_GC)
+        self._lut = EPD_3IN7_lut_1Gray_GC
+        # Panel RAM contents are unknown after a reset so the next update must be a full refresh
+        self._shadow_valid = False
+        self._retained = False
+        self.asleep = False
 
         print('Init Done.')
 
@@ -165,6 +212,7 @@ class EPD(framebuf.FrameBuffer):
         while not self.ready():  
             sleep_ms(100)
         dt = ticks_diff(ticks_ms(), t)
+        self.busy_ms = dt
         print('wait_until_ready {}ms {:5.1f}mins'.format(dt, dt/60_000))
 
     async def wait(self):
@@ -181,61 +229,187 @@ class EPD(framebuf.FrameBuffer):
     def ready(self):
         return not(self._as_busy or (self._busy() == 1))  # 1 == busy
 
-    async def _as_show(self, buf1=bytearray(1)):
-        mvb = self._mvb
-        send = self._spi.write
-        cmd = self._command
-
-        cmd(b'\x24')
-
+    def _load_lut(self, lut):
+        # Only send the waveform when it changes
+        if self._lut is not lut:
+            self._command(b'\x32', lut)
+            self._lut = lut
+
+    # Compare the framebuffer with the shadow of the last frame sent. Returns a list of
+    # (first strip, last strip, first column, last column) bands of consecutive changed
+    # strips, or None if a full refresh is needed.
+    def _dirty_bands(self):
+        if self._shadow is None or not self._shadow_valid or self._npartial >= self.full_every:
+            return None
+        buf = self._mvb
+        shadow = memoryview(self._shadow)
+        wid = self.width
+        nstrips = len(buf) // wid
+        bands = []
+        nbytes = 0
+        s0 = -1
+        for s in range(nstrips + 1):
+            a = s * wid
+            if s < nstrips and buf[a:a + wid] != shadow[a:a + wid]:
+                if s0 < 0:
+                    s0 = s
+                continue
+            if s0 < 0:
+                continue
+            # End of a run of changed strips
+            if self._lsc:
+                # Narrow the band to the changed columns
+                c0, c1 = wid, -1
+                for n in range(s0, s):
+                    b = n * wid
+                    c = 0
+                    while c < c0 and buf[b + c] == shadow[b + c]:
+                        c += 1
+                    c0 = c
+                    c = wid - 1
+                    while c > c1 and buf[b + c] == shadow[b + c]:
+                        c -= 1
+                    c1 = c
+            else:  # Panel rows are always sent in full in portrait
+                c0, c1 = 0, wid - 1
+            bands.append((s0, s - 1, c0, c1))
+            nbytes += (s - s0) * (c1 - c0 + 1)
+            s0 = -1
+        # Not worth a partial update if most of the screen changed
+        if nbytes > len(buf) // 2:
+            return None
+        return bands
+
+    # Decide between a full and a partial refresh and load the matching waveform.
+    # Returns the bands to send. An empty list means nothing has changed.
+    def _plan(self):
+        bands = self._dirty_bands()
+        if bands is None:
+            self._load_lut(EPD_3IN7_lut_1Gray_GC)
+            self._npartial = 0
+            bands = [(0, len(self._buffer) // self.width - 1, 0, self.width - 1)]
+            print('full refresh')
+        elif bands:
+            self._load_lut(EPD_3IN7_lut_1Gray_DU)
+            self._npartial += 1
+            print('partial refresh', len(bands), 'bands', self._npartial, 'of', self.full_every)
+        return bands
+
+    # Set the panel RAM window and address counter for a band, then start a RAM write.
+    # Addresses are in panel pixels. X must be byte aligned.
+    def _window(self, band):
+        s0, s1, c0, c1 = band
+        if self._lsc:  # Strips are panel X bytes in reverse order, columns are panel rows
+            last = len(self._buffer) // self.width - 1
+            x0, x1 = (last - s1) * 8, (last - s0) * 8 + 7
+            y0, y1 = c0, c1
+        else:  # Strips are 8 panel rows
+            x0, x1 = 0, _RAM_W - 1
+            y0, y1 = s0 * 8, s1 * 8 + 7
+        self._command(b'\x44', bytes((x0 & 0xff, x0 >> 8, x1 & 0xff, x1 >> 8)))
+        self._command(b'\x45', bytes((y0 & 0xff, y0 >> 8, y1 & 0xff, y1 >> 8)))
+        self._command(b'\x4E', bytes((x0 & 0xff, x0 >> 8)))
+        self._command(b'\x4F', bytes((y0 & 0xff, y0 >> 8)))
+        self._command(b'\x24')
         self._dc(1)
-        # Necessary to deassert CS after each byte otherwise display does not
-        # clear down correctly
-        t = ticks_ms()
-        if self._lsc:  # Landscape mode
-            wid = self.width
-            tbc = self.height // 8  # Vertical bytes per column
-            iidx = wid * (tbc - 1)  # Initial index
-            idx = iidx  # Index into framebuf
-            vbc = 0  # Current vertical byte count
-            hpc = 0  # Horizontal pixel count
-            for i in range(len(mvb)):
-                self._cs(0)
-                buf1[0] = ~mvb[idx]  # INVERSION HACK ~data
-                send(buf1)
-                self._cs(1)
-                idx -= self.width
-                vbc += 1
-                vbc %= tbc
-                if not vbc:
-                    hpc += 1
-                    idx = iidx + hpc
-                if not(i & 0x1f) and (ticks_diff(ticks_ms(), t) > 20):
-                    await asyncio.sleep_ms(0)
-                    t = ticks_ms()
+
+    # Fill _obuf with the inverted panel bytes of a band in the order the panel expects
+    # them. Yields the number of bytes ready to send each time _obuf is full or the band ends.
+    def _bursts(self, band):
+        s0, s1, c0, c1 = band
+        buf = self._mvb
+        ob = self._obuf
+        size = len(ob)
+        j = 0
+        if self._lsc:  # Each framebuffer column is one panel row
+            offs = self._offs
+            last = len(offs) - 1
+            offs = offs[last - s1:last - s0 + 1]
+            n = len(offs)
+            for c in range(c0, c1 + 1):
+                if j + n > size:
+                    yield j
+                    j = 0
+                for o in offs:
+                    ob[j] = buf[o + c] ^ 0xFF  # INVERSION HACK ~data
+                    j += 1
         else:
-            for i, b in enumerate(mvb):
+            for idx in range(s0 * self.width, (s1 + 1) * self.width):
+                ob[j] = buf[idx] ^ 0xFF  # INVERSION HACK ~data
+                j += 1
+                if j == size:
+                    yield j
+                    j = 0
+        if j:
+            yield j
+
+    # Send n bytes of _obuf, either as one burst or with CS deasserted after each byte
+    def _send(self, n, buf1=bytearray(1)):
+        send = self._spi.write
+        if self.per_byte_cs:
+            for b in self._mvo[:n]:
                 self._cs(0)
-                buf1[0] = ~b  # INVERSION HACK ~data
+                buf1[0] = b
                 send(buf1)
                 self._cs(1)
-                if not(i & 0x1f) and (ticks_diff(ticks_ms(), t) > 20):
+        else:
+            self._cs(0)
+            send(self._mvo[:n])
+            self._cs(1)
+
+    # Record and print the frame transfer time
+    def _timed(self, t, nbytes):
+        self.show_ms = ticks_diff(ticks_us(), t) // 1000
+        self.show_bytes = nbytes
+        print('show time', self.show_ms, 'ms', nbytes, 'bytes', 'per byte CS' if self.per_byte_cs else 'burst')
+
+    # Record what the panel now holds
+    def _commit(self, bands):
+        if self._shadow is None:
+            return
+        wid = self.width
+        for s0, s1, _, _ in bands:
+            self._shadow[s0 * wid:(s1 + 1) * wid] = self._mvb[s0 * wid:(s1 + 1) * wid]
+        self._shadow_valid = True
+
+    async def _as_show(self):
+        cmd = self._command
+
+        t0 = ticks_us()
+        bands = self._plan()
+        t = ticks_ms()
+        nbytes = 0
+        for band in bands:
+            self._window(band)
+            for n in self._bursts(band):
+                self._send(n)
+                nbytes += n
+                if ticks_diff(ticks_ms(), t) > 20:
                     await asyncio.sleep_ms(0)
                     t = ticks_ms()
+        self._commit(bands)
+        self._timed(t0, nbytes)
 
         self._updated.set()  # framebuf has now been copied to the device
         self._updated.clear()
 
-        print('async full refresh')
+        if not bands:
+            print('async no change')
+            self._as_busy = False
+            return
+        print('async refresh')
         cmd(b'\x20')  # DISPLAY_REFRESH
 
+        t = ticks_ms()
         await asyncio.sleep(1)
         while self._busy() == 1:
             await asyncio.sleep_ms(200)  # Don't release lock until update is complete
+        self.busy_ms = ticks_diff(ticks_ms(), t)
         self._as_busy = False
 
-    # draw the current frame memory. Blocking time ~180ms
-    def show(self, buf1=bytearray(1)):
+    # draw the current frame memory. Blocking time ~180ms for a full refresh, partial
+    # refreshes only send the changed bands.
+    def show(self):
         if self._asyn:
             if self._as_busy:
                 raise RuntimeError('Cannot refresh: display is busy.')
@@ -243,45 +417,24 @@ class EPD(framebuf.FrameBuffer):
             asyncio.create_task(self._as_show())
             return
         t = ticks_us()
-        mvb = self._mvb
-        send = self._spi.write
         cmd = self._command
 
-        cmd(b'\x24')
-
-        self._dc(1)
-        # Necessary to deassert CS after each byte otherwise display does not
-        # clear down correctly
-        if self._lsc:  # Landscape mode
-            wid = self.width
-            tbc = self.height // 8  # Vertical bytes per column
-            iidx = wid * (tbc - 1)  # Initial index
-            idx = iidx  # Index into framebuf
-            vbc = 0  # Current vertical byte count
-            hpc = 0  # Horizontal pixel count
-            for _ in range(len(mvb)):
-                self._cs(0)
-                buf1[0] = ~mvb[idx]  # INVERSION HACK ~data
-                send(buf1)
-                self._cs(1)
-                idx -= self.width
-                vbc += 1
-                vbc %= tbc
-                if not vbc:
-                    hpc += 1
-                    idx = iidx + hpc
-        else:
-            for b in mvb:
-                self._cs(0)
-                buf1[0] = ~b  # INVERSION HACK ~data
-                send(buf1)
-                self._cs(1)
-
-        print('sync full refresh')
+        bands = self._plan()
+        if not bands:
+            print('sync no change')
+            return
+        nbytes = 0
+        for band in bands:
+            self._window(band)
+            for n in self._bursts(band):
+                self._send(n)
+                nbytes += n
+        self._commit(bands)
+        self._timed(t, nbytes)
+
+        print('sync refresh')
         cmd(b'\x20')  # DISPLAY_REFRESH
 
-        te = ticks_us()
-        print('show time', ticks_diff(te, t)//1000, 'ms')
         if not self.demo_mode:
             # Immediate return to avoid blocking the whole application.
             # User should wait for ready before calling refresh()
@@ -290,12 +443,21 @@ class EPD(framebuf.FrameBuffer):
         sleep_ms(2000)  # Give time for user to see result
         
 
-    # to wake call init()
-    def sleep(self):
+    # to wake call init(), or wake() to keep using partial refreshes after sleep(retain=True).
+    # retain uses deep sleep mode 1, which keeps the panel RAM, and leaves the reset pin high.
+    def sleep(self, retain=False):
         self._as_busy = False
         self.wait_until_ready()
         self._command(b'\x10')
-        self._data(b'\x03')
-        self._rst(0)  # According to schematic this turns off the power
-
-
+        self._data(b'\x01' if retain else b'\x03')
+        if not retain:
+            self._rst(0)  # According to schematic this turns off the power
+        self._retained = retain
+        self.asleep = True
+
+    # Reinitialise after sleep(). After sleep(retain=True) the RAM auto write is skipped so the
+    # panel RAM still matches the shadow and the next update can be partial, otherwise it is full.
+    def wake(self):
+        valid = self._shadow_valid and self._retained
+        self.init(keep_ram=valid)
+        self._shadow_valid = valid
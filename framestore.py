@@ -0,0 +1,162 @@
+# framestore.py Last rendered frame kept on flash and shown straight after power-on.
+# The framebuffer is saved after successful updates, run length encoded as the mostly white
+# ePaper image compresses well, and restored and shown with a "stale" marker before the
+# networking modules are even imported.
+
+# Released under the MIT license see LICENSE
+
+import os
+import utime
+
+FRAME_FILE = "frame.bin"
+
+# File header: magic, width, height (2 bytes each, little endian) and flags
+_MAGIC = b"EPF1"
+_COMPRESSED = 1
+
+# Marker drawn in the top right corner of a restored frame, with the framebuf 8x8 font
+STALE_TEXT = "STALE"
+
+
+def encode(src, write, out):
+    ''' Run length encodes src, passing the output to write() in pieces of up to len(out) bytes.
+    A control byte c < 128 is followed by c + 1 literal bytes, c >= 128 by one byte repeated
+    c - 125 times. Returns the encoded length. '''
+    n = len(src)
+    size = len(out) - 2  # Each step adds at most two bytes
+    total = 0
+    j = 0
+    i = 0
+    lit = -1  # Position of the control byte of the open literal block in out
+    while i < n:
+        v = src[i]
+        r = 1
+        while i + r < n and r < 130 and src[i + r] == v:
+            r += 1
+        if r >= 3:
+            out[j] = r + 125
+            out[j + 1] = v
+            j += 2
+            i += r
+            lit = -1
+        else:
+            if lit < 0 or out[lit] == 127:
+                lit = j
+                out[j] = 0
+                j += 1
+            else:
+                out[lit] += 1
+            out[j] = v
+            j += 1
+            i += 1
+        if j >= size:
+            write(memoryview(out)[:j])
+            total += j
+            j = 0
+            lit = -1
+    if j:
+        write(memoryview(out)[:j])
+        total += j
+    return total
+
+
+def decode(src, dst):
+    ''' Expands run length encoded src into dst. Returns the number of bytes written. '''
+    i = 0
+    k = 0
+    n = len(src)
+    end = len(dst)
+    while i < n and k < end:
+        c = src[i]
+        if c < 128:
+            count = min(c + 1, end - k)
+            dst[k:k + count] = src[i + 1:i + 1 + count]
+            i += c + 2
+        else:
+            count = min(c - 125, end - k)
+            v = src[i + 1]
+            for x in range(k, k + count):
+                dst[x] = v
+            i += 2
+        k += count
+    return k
+
+
+def save(buf, width: int, height: int, path: str = FRAME_FILE, compress: bool = True):
+    ''' Writes the framebuffer buf to flash. Returns the number of bytes written. '''
+    t = utime.ticks_ms()
+    header = bytearray(_MAGIC + bytes(5))
+    header[4] = width & 0xFF
+    header[5] = width >> 8
+    header[6] = height & 0xFF
+    header[7] = height >> 8
+    header[8] = _COMPRESSED if compress else 0
+    try:
+        # Write to a temporary file first so a power cut can't leave a half written frame
+        with open(path + ".tmp", "wb") as file:
+            file.write(header)
+            if compress:
+                size = encode(buf, file.write, bytearray(512))
+            else:
+                size = file.write(buf)
+        os.rename(path + ".tmp", path)
+    except OSError as e:
+        print("Failed to save frame: " + str(e))
+        return 0
+    print(f"Frame saved, {size} of {len(buf)} bytes in {utime.ticks_diff(utime.ticks_ms(), t)} ms")
+    return size
+
+
+def load(buf, width: int, height: int, path: str = FRAME_FILE):
+    ''' Reads a saved frame into buf. Returns False if there is none, or it is for another display
+    size or orientation. '''
+    try:
+        with open(path, "rb") as file:
+            header = file.read(9)
+            if len(header) != 9 or header[:4] != _MAGIC or header[4] | header[5] << 8 != width or header[6] | header[7] << 8 != height:
+                return False
+            if header[8] & _COMPRESSED:
+                # A mostly white frame is a few KB. It is freed again before anything else is allocated
+                data = file.read()
+                ok = decode(data, buf) == len(buf)
+                del data
+                return ok
+            return file.readinto(buf) == len(buf)
+    except OSError:
+        return False
+
+
+def mark_stale(ssd):
+    ''' Draws the stale marker in the top right corner of the framebuffer. '''
+    w = 8 * len(STALE_TEXT) + 4
+    x = ssd.width - w
+    ssd.fill_rect(x, 0, w, 12, 1)
+    ssd.text(STALE_TEXT, x + 2, 2, 0)
+
+
+def restore(ssd, asyn: bool = False, path: str = FRAME_FILE):
+    ''' Shows the saved frame marked as stale. Returns True if a frame was shown.
+    The panel may still be refreshing when this returns in blocking mode, so wait for
+    ssd.ready() before the next show(). '''
+    t = utime.ticks_ms()
+    if not load(ssd._buffer, ssd.width, ssd.height, path):
+        return False
+    mark_stale(ssd)
+    if asyn:
+        import uasyncio as asyncio
+
+        async def paint():
+            ssd.show()
+            # The refresh task must finish before this event loop ends
+            await ssd.wait()
+
+        asyncio.run(paint())
+    else:
+        # Returns once the frame is sent, so the imports and Wi-Fi connection overlap the refresh
+        demo_mode = ssd.demo_mode
+        ssd.demo_mode = False
+        ssd.show()
+        ssd.demo_mode = demo_mode
+    # ticks_ms counts from reset, so this is the time to first pixel
+    print(f"Restored last frame in {utime.ticks_diff(utime.ticks_ms(), t)} ms, first paint {utime.ticks_ms()} ms after reset")
+    return True
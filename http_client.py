@@ -0,0 +1,617 @@
+# http_client.py Minimal HTTP/1.1 client with keep-alive for MicroPython (and CPython).
+# Holds one socket open across polls so the DNS lookup, TCP connect and TLS handshake are
+# only paid when the server closes the connection, instead of on every request. The status line
+# and headers are read into a receive buffer allocated once with the client, which callers can
+# also use to read the body, so reading a response makes no allocations of unknown size.
+# get_async does the same with asyncio streams, so other tasks run while a response is awaited.
+
+# Released under the MIT license see LICENSE
+
+import io
+import socket
+import ssl
+
+try:
+    import deflate  # MicroPython 1.21 and later
+except ImportError:
+    deflate = None
+    try:
+        import zlib  # CPython, for testing on a PC
+    except ImportError:
+        zlib = None
+
+# True if gzip response bodies can be decompressed, so Accept-Encoding: gzip can be sent
+GZIP = deflate is not None or zlib is not None
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:  # CPython, for testing on a PC
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+# Failure kinds, used to decide whether a failed request is worth retrying
+DNS = "dns"
+CONNECT = "connect"
+TLS = "tls"
+TIMEOUT = "timeout"
+HTTP = "http"
+BODY = "body"
+NETWORK = "network"
+
+# errno values and mbedtls error codes that mean a socket operation timed out
+_TIMEOUT_ERRORS = (110, 116, -0x6800)
+
+# Default size of the receive buffer. The longest status or header line must fit in it
+RECEIVE_BUFFER = 1024
+
+# Longest chunk size or trailer line of a chunked body
+_CHUNK_LINE = 64
+
+
+class FetchError(Exception):
+    ''' A failed request, with the kind of failure and the HTTP status if there was one. '''
+
+    def __init__(self, kind: str, message, status: int = 0):
+        super().__init__(str(message))
+        self.kind = kind
+        self.status = status
+
+
+def classify(e):
+    ''' Returns the failure kind of an exception raised while fetching and parsing a response. '''
+    if isinstance(e, FetchError):
+        return e.kind
+    if isinstance(e, OSError):
+        if (e.args and e.args[0] in _TIMEOUT_ERRORS) or "timed out" in str(e):
+            return TIMEOUT
+        return NETWORK
+    # Anything else was raised while parsing the body
+    return BODY
+
+
+# Response headers that are kept. Everything else is skipped to save RAM.
+_HEADERS = ("content-length", "transfer-encoding", "connection", "content-encoding", "etag", "x-generated-at")
+_HEADER_BYTES = tuple(h.encode() for h in _HEADERS)
+
+
+def _header(buf, end: int):
+    ''' Returns the index in _HEADERS of the header line in buf[:end], or -1. Compares the name
+    in place, ignoring case, so skipped headers allocate nothing. '''
+    colon = 0
+    while colon < end and buf[colon] != 58:
+        colon += 1
+    if colon == 0 or colon == end:
+        return -1
+    for h in range(len(_HEADER_BYTES)):
+        name = _HEADER_BYTES[h]
+        if len(name) != colon:
+            continue
+        for i in range(colon):
+            c = buf[i]
+            if 65 <= c <= 90:
+                c += 32
+            if c != name[i]:
+                break
+        else:
+            return h
+    return -1
+
+
+def _strip(buf, start: int, end: int):
+    ''' Returns buf[start:end] as a str without surrounding whitespace. '''
+    while start < end and (buf[start] == 32 or buf[start] == 9):
+        start += 1
+    while end > start and buf[end - 1] <= 32:
+        end -= 1
+    return str(memoryview(buf)[start:end], "utf-8")
+
+
+def _status(buf, n: int):
+    ''' Returns the status code of the status line in buf[:n], such as "HTTP/1.1 200 OK". '''
+    # The status is the three digits after the first space
+    i = 0
+    while i < n and buf[i] != 32:
+        i += 1
+    status = 0
+    for j in range(i + 1, i + 4):
+        if j >= n or not 48 <= buf[j] <= 57:
+            raise FetchError(HTTP, "Bad status line")
+        status = status * 10 + buf[j] - 48
+    return status
+
+
+def _keep(kept: dict, buf, n: int):
+    ''' Adds the header line in buf[:n] to kept if it is one of _HEADERS. Returns False for the blank
+    line that ends the headers. '''
+    if n <= 2 and (buf[0] == 13 or buf[0] == 10):
+        return False
+    h = _header(buf, n)
+    if h >= 0:
+        kept[_HEADERS[h]] = _strip(buf, len(_HEADERS[h]) + 1, n)
+    return True
+
+
+def _chunk_hex(line, n: int):
+    ''' Returns the size given by the chunk size line in line[:n]. '''
+    size = 0
+    for i in range(n):
+        c = line[i]
+        if 48 <= c <= 57:
+            c -= 48
+        elif 97 <= c <= 102 or 65 <= c <= 70:
+            c = (c | 32) - 87
+        else:
+            # ";" starts chunk extensions, which are ignored
+            break
+        size = size * 16 + c
+    return size
+
+
+def split_url(url: str):
+    ''' Splits an http(s) URL into (tls, host, port, path). '''
+    scheme, _, rest = url.partition("://")
+    tls = scheme == "https"
+    host, slash, path = rest.partition("/")
+    path = slash + path if slash else "/"
+    port = 443 if tls else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return tls, host, port, path
+
+
+class Response:
+    ''' Response to a request. The body is read with readinto() until it returns 0, then close()
+    must be called. The connection is only reused if the whole body was read. '''
+
+    def __init__(self, client, status: int, headers: dict):
+        self.status = status
+        self.headers = headers
+        self._client = client
+        self._f = client._f
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        # Bytes left in the body (or current chunk). -1 means read until the server closes.
+        if status == 304 or status == 204:
+            # Never has a body
+            self._chunked = False
+            self._left = 0
+        elif self._chunked:
+            self._left = 0
+        elif "content-length" in headers:
+            self._left = int(headers["content-length"])
+        else:
+            self._left = -1
+        self._done = self._left == 0 and not self._chunked
+        # Set once a chunk has been started, as each chunk's data ends with a CRLF
+        self._crlf = False
+        # Body bytes read so far, for logging the response size
+        self.length = 0
+        # Set when the server will close the connection after this response
+        self._close = headers.get("connection", "").lower() == "close" or self._left < 0
+
+    def _chunk_size(self):
+        ''' Reads a chunk size line. Returns the size, or 0 for the last chunk, after skipping any trailers. '''
+        client = self._client
+        line = client._chunk_line
+        if self._crlf:
+            client._readline(line)  # CRLF after the previous chunk's data
+        size = _chunk_hex(line, client._readline(line))
+        if size == 0:
+            # Skip any trailers up to the blank line
+            n = client._readline(line)
+            while n > 2 or (n and line[0] != 13 and line[0] != 10):
+                n = client._readline(line)
+        return size
+
+    async def _chunk_size_async(self):
+        ''' Same as _chunk_size, for a response from get_async. '''
+        client = self._client
+        line = client._chunk_line
+        if self._crlf:
+            await client._readline_async(line)
+        size = _chunk_hex(line, await client._readline_async(line))
+        if size == 0:
+            n = await client._readline_async(line)
+            while n > 2 or (n and line[0] != 13 and line[0] != 10):
+                n = await client._readline_async(line)
+        return size
+
+    def _next_chunk(self, size: int):
+        ''' Starts a chunk of size bytes. Returns False if it is the last chunk, which ends the body. '''
+        if size == 0:
+            self._done = True
+            return False
+        self._left = size
+        # The chunk's data is followed by a CRLF, read with the next chunk size line
+        self._crlf = True
+        return True
+
+    def _want(self, buf):
+        ''' Returns the number of bytes to read into buf. '''
+        return len(buf) if self._left < 0 else min(len(buf), self._left)
+
+    def _got(self, got: int):
+        ''' Counts got bytes read from the body. Returns got. '''
+        if not got:
+            if self._left < 0:
+                self._done = True
+                return 0
+            raise OSError("Connection closed mid response")
+        self.length += got
+        if self._left > 0:
+            self._left -= got
+            if self._left == 0 and not self._chunked:
+                self._done = True
+        return got
+
+    def readinto(self, buf):
+        ''' Reads body bytes into buf. Returns the number of bytes read, 0 at the end of the body. '''
+        if self._done:
+            return 0
+        if self._chunked and self._left == 0 and not self._next_chunk(self._chunk_size()):
+            return 0
+        return self._got(self._f.readinto(memoryview(buf)[:self._want(buf)]))
+
+    async def areadinto(self, buf):
+        ''' Same as readinto, for a response from get_async. Other tasks run while the bytes are awaited. '''
+        if self._done:
+            return 0
+        if self._chunked and self._left == 0 and not self._next_chunk(await self._chunk_size_async()):
+            return 0
+        return self._got(await self._f.readinto(memoryview(buf)[:self._want(buf)]))
+
+    def body(self):
+        ''' Returns a stream of the decoded body: the response itself, or a GzipBody if the server
+        compressed it. Servers that ignore Accept-Encoding send the body as is. '''
+        encoding = self.headers.get("content-encoding", "identity").lower()
+        if encoding == "gzip":
+            return GzipBody(self)
+        if encoding != "identity":
+            raise FetchError(BODY, "Unsupported content encoding " + encoding)
+        return self
+
+    def async_body(self):
+        ''' Returns the response itself, to be read with areadinto. Gzip bodies are decompressed by
+        blocking reads, so requests made with get_async mustn't ask for them. '''
+        encoding = self.headers.get("content-encoding", "identity").lower()
+        if encoding != "identity":
+            raise FetchError(BODY, "Unsupported content encoding " + encoding)
+        return self
+
+    def close(self):
+        ''' Finishes with the response. Closes the connection unless it can be reused. '''
+        client = self._client
+        if client is None:
+            return
+        self._client = None
+        if not self._done or self._close or not client.keep_alive:
+            client.close()
+
+
+class _Source(io.IOBase):
+    ''' Response body as a stream the deflate module can read from. Remembers socket errors so
+    they aren't mistaken for bad compressed data. '''
+
+    def __init__(self, response):
+        self._response = response
+        self.error = None
+
+    def readinto(self, buf):
+        try:
+            return self._response.readinto(buf)
+        except OSError as e:
+            self.error = e
+            raise
+
+
+class GzipBody:
+    ''' Decompresses a gzip response body as it is read, so neither the compressed nor the
+    decompressed body is ever held in full. Uses a 32 KB window while the body is read. '''
+
+    def __init__(self, response):
+        self.response = response
+        # Decompressed bytes read so far
+        self.length = 0
+        self._source = _Source(response)
+        if deflate is not None:
+            self._stream = deflate.DeflateIO(self._source, deflate.GZIP)
+        else:
+            self._z = zlib.decompressobj(31)
+            self._in = bytearray(512)
+            self._out = b""
+
+    def _read(self, buf):
+        if deflate is not None:
+            return self._stream.readinto(buf)
+        while not self._out:
+            if self._z.eof:
+                return 0
+            n = self._source.readinto(self._in)
+            if not n:
+                raise ValueError("truncated gzip body")
+            self._out = self._z.decompress(memoryview(self._in)[:n])
+        n = min(len(buf), len(self._out))
+        buf[:n] = self._out[:n]
+        self._out = self._out[n:]
+        return n
+
+    def readinto(self, buf):
+        ''' Reads decompressed bytes into buf. Returns the number of bytes read, 0 at the end. '''
+        try:
+            n = self._read(buf)
+        except (OSError, ValueError) as e:
+            if e is self._source.error:
+                raise
+            raise FetchError(BODY, "Bad gzip body: " + str(e))
+        if n:
+            self.length += n
+        else:
+            # Reads anything left after the gzip stream so the connection can be reused
+            while self.response.readinto(buf):
+                pass
+        return n
+
+
+class _StreamReader:
+    ''' CPython's asyncio StreamReader with the readinto of MicroPython's asyncio streams, for testing on a PC. '''
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    async def readinto(self, buf):
+        data = await self._reader.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class HTTPClient:
+    ''' HTTP/1.1 client that keeps one connection open between requests and reconnects
+    cleanly when the server has closed it. The resolved address is cached. A client is used
+    either with get or with get_async, not both. '''
+
+    def __init__(self, keep_alive: bool = True, timeout: int = 8, buffer_size: int = RECEIVE_BUFFER):
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        # Holds the status line and each header line while the headers are read. Free for the
+        # caller to read the body into after that
+        self.buffer = bytearray(buffer_size)
+        self._chunk_line = bytearray(_CHUNK_LINE)
+        self._byte = bytearray(1)
+        self._sock = None
+        self._f = None
+        self._target = None  # (tls, host, port) of the open connection
+        self._addr = {}  # Resolved addresses by (host, port)
+        # Statistics for logging
+        self.handshakes = 0
+        self.requests = 0
+        self.last_ms = 0
+
+    def _address(self, host: str, port: int):
+        ''' Returns the address of host, resolving it only if it is not cached. '''
+        key = (host, port)
+        addr = self._addr.get(key)
+        if addr is None:
+            try:
+                addr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+            except OSError as e:
+                raise FetchError(DNS, e)
+            self._addr[key] = addr
+        return addr
+
+    def _context(self):
+        ''' Returns the TLS context. Certificates are not verified, the same as urequests. '''
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if hasattr(ctx, "check_hostname"):
+            ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+
+    def _connect(self, tls: bool, host: str, port: int):
+        ''' Opens a new connection, resolving the address only if it is not cached. '''
+        self.close()
+        addr = self._address(host, port)
+        sock = socket.socket()
+        try:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(addr)
+            except OSError as e:
+                raise FetchError(classify(e) if classify(e) == TIMEOUT else CONNECT, e)
+            if tls:
+                try:
+                    sock = self._context().wrap_socket(sock, server_hostname=host)
+                except OSError as e:
+                    raise FetchError(classify(e) if classify(e) == TIMEOUT else TLS, e)
+                self.handshakes += 1
+        except Exception:
+            sock.close()
+            # The address may have changed
+            del self._addr[(host, port)]
+            raise
+        self._sock = sock
+        # MicroPython sockets are streams, CPython needs a file object for readline/readinto
+        self._f = sock.makefile("rwb") if hasattr(sock, "recv_into") else sock
+        self._target = (tls, host, port)
+
+    async def _connect_async(self, tls: bool, host: str, port: int):
+        ''' Opens a new connection with asyncio streams. The address is resolved by a blocking
+        lookup the first time, and cached. asyncio streams have no timeout, so the caller limits
+        the time taken, e.g. with asyncio.wait_for. '''
+        import uasyncio as asyncio
+        self.close()
+        addr = self._address(host, port)
+        try:
+            if tls:
+                # The TLS handshake is completed by the first write or read
+                reader, writer = await asyncio.open_connection(addr[0], addr[1], ssl=self._context(), server_hostname=host)
+                self.handshakes += 1
+            else:
+                reader, writer = await asyncio.open_connection(addr[0], addr[1])
+        except OSError as e:
+            del self._addr[(host, port)]
+            raise FetchError(classify(e) if classify(e) == TIMEOUT else CONNECT, e)
+        self._sock = writer
+        # MicroPython returns one stream for both directions
+        self._f = reader if hasattr(reader, "readinto") else _StreamReader(reader)
+        self._target = (tls, host, port)
+
+    def _readline(self, buf):
+        ''' Reads a line from the connection into buf a byte at a time, so nothing after the line is
+        read. Returns its length including the line ending, 0 if the connection has closed. Raises
+        FetchError if the line doesn't fit. '''
+        f = self._f
+        byte = self._byte
+        n = 0
+        size = len(buf)
+        while True:
+            if not f.readinto(byte):
+                return n
+            if n >= size:
+                raise FetchError(HTTP, f"Response line longer than the {size} byte receive buffer")
+            buf[n] = byte[0]
+            n += 1
+            if byte[0] == 10:
+                return n
+
+    async def _readline_async(self, buf):
+        ''' Same as _readline, for a connection opened by _connect_async. '''
+        f = self._f
+        byte = self._byte
+        n = 0
+        size = len(buf)
+        while True:
+            if not await f.readinto(byte):
+                return n
+            if n >= size:
+                raise FetchError(HTTP, f"Response line longer than the {size} byte receive buffer")
+            buf[n] = byte[0]
+            n += 1
+            if byte[0] == 10:
+                return n
+
+    def _request(self, host: str, path: str, headers: dict):
+        ''' Returns the request bytes. '''
+        request = "GET " + path + " HTTP/1.1\r\nHost: " + host + "\r\n"
+        if not self.keep_alive:
+            request += "Connection: close\r\n"
+        for name in headers:
+            request += name + ": " + headers[name] + "\r\n"
+        return (request + "\r\n").encode()
+
+    def _send(self, host: str, path: str, headers: dict):
+        ''' Sends the request and reads the status line and headers. '''
+        f = self._f
+        f.write(self._request(host, path, headers))
+        if hasattr(f, "flush"):
+            f.flush()
+        buf = self.buffer
+        n = self._readline(buf)
+        if not n:
+            raise OSError("Connection closed by server")
+        status = _status(buf, n)
+        kept = {}
+        while True:
+            n = self._readline(buf)
+            if not n:
+                raise OSError("Connection closed by server")
+            if not _keep(kept, buf, n):
+                break
+        return Response(self, status, kept)
+
+    async def _send_async(self, host: str, path: str, headers: dict):
+        ''' Same as _send, for a connection opened by _connect_async. '''
+        self._sock.write(self._request(host, path, headers))
+        await self._sock.drain()
+        buf = self.buffer
+        n = await self._readline_async(buf)
+        if not n:
+            raise OSError("Connection closed by server")
+        status = _status(buf, n)
+        kept = {}
+        while True:
+            n = await self._readline_async(buf)
+            if not n:
+                raise OSError("Connection closed by server")
+            if not _keep(kept, buf, n):
+                break
+        return Response(self, status, kept)
+
+    def _log(self, response, reused: bool, t: int):
+        self.requests += 1
+        self.last_ms = ticks_diff(ticks_ms(), t)
+        print(f"HTTP {response.status} in {self.last_ms} ms, {'reused' if reused else 'new'} connection, "
+              f"handshakes: {self.handshakes}, requests: {self.requests}")
+
+    def get(self, url: str, headers: dict = {}):
+        ''' Sends a GET request, reusing the open connection if possible. Returns a Response. '''
+        t = ticks_ms()
+        tls, host, port, path = split_url(url)
+        reused = self._sock is not None and self._target == (tls, host, port)
+        if not reused:
+            self._connect(tls, host, port)
+        try:
+            response = self._send(host, path, headers)
+        except OSError:
+            if not reused:
+                self.close()
+                raise
+            # The server closed the idle connection. Reconnect and try once more
+            print("HTTP connection closed by server, reconnecting")
+            reused = False
+            self._connect(tls, host, port)
+            try:
+                response = self._send(host, path, headers)
+            except Exception:
+                self.close()
+                raise
+        except Exception:
+            self.close()
+            raise
+        self._log(response, reused, t)
+        return response
+
+    async def get_async(self, url: str, headers: dict = {}):
+        ''' Same as get, with asyncio streams. The body is read with the response's areadinto.
+        Other tasks run while the connection is made and the response is awaited. '''
+        t = ticks_ms()
+        tls, host, port, path = split_url(url)
+        reused = self._sock is not None and self._target == (tls, host, port)
+        # Also closed if the task is cancelled, e.g. by asyncio.wait_for, which isn't an Exception on MicroPython
+        try:
+            if not reused:
+                await self._connect_async(tls, host, port)
+            try:
+                response = await self._send_async(host, path, headers)
+            except OSError:
+                if not reused:
+                    raise
+                print("HTTP connection closed by server, reconnecting")
+                reused = False
+                await self._connect_async(tls, host, port)
+                response = await self._send_async(host, path, headers)
+        except BaseException:
+            self.close()
+            raise
+        self._log(response, reused, t)
+        return response
+
+    def close(self):
+        ''' Closes the connection if one is open. '''
+        if self._sock is not None:
+            try:
+                if self._f is not self._sock:
+                    self._f.close()
+                self._sock.close()
+            except Exception:
+                pass
+        self._sock = None
+        self._f = None
+        self._target = None
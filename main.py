@@ -1,14 +1,70 @@
 import gc
-import network
-import urequests
-import ujson
 import utime
-from color_setup import ssd  # Import the ePaper display driver
-from gui.core.writer import Writer  # Import Writer class for writing text
-from gui.core.nanogui import refresh # Import refresh function that refreshes the contents on the screen
-from gui.widgets.label import Label  # Import Label widget to display text
-from gui.widgets.textbox import Textbox # Import Textbox widget to display long text
-import gui.fonts.courier20 as courier20  # Import courier20 font
+import profiler  # Phase timing and heap tracking
+
+# Startup is timed in stages from reset. The times are printed with the first live board
+boot = profiler.BootTimer()
+
+from color_setup import ssd, asyn, config  # Import the ePaper display driver
+boot.stage("display")
+import framestore  # Last rendered frame on flash
+
+# The last frame is shown straight away, before the networking and GUI modules are imported
+# and before config.json is validated, so the board isn't blank while the Pico starts up.
+# fastBoot is checked first so a frame saved before it was turned off isn't shown
+frame_restored = (config.get("fastBoot", True) if config else True) and framestore.restore(ssd, asyn)
+boot.stage("restore")
+
+import wifi  # Wi-Fi connection with cached access point and rejoin
+from array import array
+import os
+import ujson
+import departure_cache  # Last known good departures on flash
+import power  # Low power cycle and energy estimate
+import records  # Preallocated service records
+import delay_messages  # Delay and cancellation reasons shown in the textbox
+# uasyncio, board_frame and text_cache are imported once config.json shows they are needed. The
+# NanoGUI modules, and the networking modules only needed for the first request, are imported
+# while the Wi-Fi join runs
+boot.stage("imports")
+
+
+def import_gui():
+    ''' Imports the NanoGUI modules. Called when the board is first drawn, after the Wi-Fi join has started. '''
+    global Writer, refresh, Label, Textbox, courier20
+    from gui.core.writer import Writer  # Import Writer class for writing text
+    from gui.core.nanogui import refresh # Import refresh function that refreshes the contents on the screen
+    from gui.widgets.label import Label  # Import Label widget to display text
+    from gui.widgets.textbox import Textbox # Import Textbox widget to display long text
+    import gui.fonts.courier20 as courier20  # Import courier20 font
+
+
+def import_network():
+    ''' Imports the modules that make and read the API requests, and creates the HTTP client, poll
+    scheduler and retry policy. Called after the board is drawn, while the Wi-Fi join runs. '''
+    global darwin, http_client, scheduler, retry, http, compress_responses, poll_scheduler, retry_policy, circuit_breaker, NETWORK_FAILURES
+    import darwin  # Streaming extractor for the departure board response
+    import http_client  # HTTP/1.1 client that keeps the connection open between polls
+    import scheduler  # Adaptive polling interval
+    import retry  # Retry policy and circuit breaker for API requests
+    
+    # Responses are read into a receiveBuffer byte buffer allocated here, once, so polling doesn't
+    # fragment the heap with reads of varying size
+    http = http_client.HTTPClient(keep_alive=keep_alive, buffer_size=receive_buffer)
+    
+    # Needs the deflate module
+    compress_responses = compress_requested and http_client.GZIP
+    
+    # 180 seconds is used if the time is unknown
+    poll_scheduler = scheduler.PollScheduler(180, *poll_limits)
+    
+    # Failed requests are retried with exponential backoff within a 45 second deadline per poll.
+    # After 3 failed polls in a row, requests stop for 10 minutes before a single probe.
+    retry_policy = retry.RetryPolicy(max_attempts=5, base_delay=1, max_delay=16, deadline=45)
+    circuit_breaker = retry.CircuitBreaker(threshold=3, cooldown=600)
+    
+    # Request failures that suggest the Wi-Fi connection has been lost
+    NETWORK_FAILURES = (http_client.DNS, http_client.CONNECT, http_client.NETWORK)
 
 
 def validate_config(config: dict):
@@ -23,6 +79,10 @@ def validate_config(config: dict):
         "api_key": str,
     }
     
+    # filterCrs is not needed when a list of destinations is given
+    if "destinations" in config:
+        del expected_config["filterCrs"]
+    
     for key, expected_type in expected_config.items():
         if key not in config:
             raise ValueError(f"Missing key in config: {key}")
@@ -32,179 +92,603 @@ def validate_config(config: dict):
         # Additional checks for specific keys
         if key == "numRows" and config[key] <= 0:
             raise ValueError(f"Invalid value for 'numRows': must be a positive integer, got {config[key]}")
+
+    # Optional keys. Defaults are used when they are missing
+    optional_config = {
+        "asyncMode": bool,
+        "destinations": list,
+        "fetchRows": int,
+        "keepAlive": bool,
+        "minInterval": int,
+        "maxInterval": int,
+        "dailyCalls": int,
+        "cacheWriteInterval": int,
+        "profileCycles": int,
+        "profileBlocks": bool,
+        "textCache": int,
+        "fastBoot": bool,
+        "compressFrame": bool,
+        "fastConnect": bool,
+        "staticIp": list,
+        "lowPower": bool,
+        "quietHours": list,
+        "compressResponses": bool,
+        "proxy": str,
+        "proxyFrames": bool,
+        "leanRequests": bool,
+        "timeOffset": int,
+        "timeWindow": int,
+        "receiveBuffer": int,
+    }
+
+    for key, expected_type in optional_config.items():
+        if key in config and not isinstance(config[key], expected_type):
+            raise TypeError(f"Invalid type for key '{key}': expected {expected_type.__name__}, got {type(config[key]).__name__}")
+    
+    if "destinations" in config:
+        if not config["destinations"] or not all(isinstance(crs, str) for crs in config["destinations"]):
+            raise ValueError("Invalid value for 'destinations': must be a non-empty list of CRS codes")
+        if len(config["destinations"]) > 16:
+            raise ValueError("Invalid value for 'destinations': no more than 16 destinations are supported")
+    if config.get("minInterval", 60) <= 0 or config.get("maxInterval", 900) < config.get("minInterval", 60):
+        raise ValueError("Invalid polling interval: minInterval must be positive and no more than maxInterval")
+    if config.get("textCache", 0) < 0:
+        raise ValueError(f"Invalid value for 'textCache': must be 0 or more bytes, got {config['textCache']}")
+    if config.get("dailyCalls", 1000) <= 0:
+        raise ValueError(f"Invalid value for 'dailyCalls': must be a positive integer, got {config['dailyCalls']}")
+    if "fetchRows" in config and not 0 < config["fetchRows"] <= 150:
+        raise ValueError(f"Invalid value for 'fetchRows': must be between 1 and 150, got {config['fetchRows']}")
+    if "timeOffset" in config and not -120 <= config["timeOffset"] <= 119:
+        raise ValueError(f"Invalid value for 'timeOffset': must be between -120 and 119, got {config['timeOffset']}")
+    if "staticIp" in config and (len(config["staticIp"]) != 4 or not all(isinstance(a, str) for a in config["staticIp"])):
+        raise ValueError("Invalid value for 'staticIp': must be a list of the IP address, netmask, gateway and DNS server")
+    if "proxy" in config and not config["proxy"].startswith("http://"):
+        raise ValueError(f"Invalid value for 'proxy': must be an http:// URL such as http://192.168.1.20:8080, got {config['proxy']}")
+    if "quietHours" in config and (len(config["quietHours"]) != 2 or not all(isinstance(t, str) and records.parse_minutes(t) >= 0 for t in config["quietHours"])):
+        raise ValueError("Invalid value for 'quietHours': must be a start and end time such as [\"23:30\", \"05:30\"]")
+    if "timeWindow" in config and not 0 < config["timeWindow"] <= 120:
+        raise ValueError(f"Invalid value for 'timeWindow': must be between 1 and 120, got {config['timeWindow']}")
+    if config.get("receiveBuffer", 1024) < 256:
+        raise ValueError(f"Invalid value for 'receiveBuffer': must be at least 256 bytes, got {config['receiveBuffer']}")
     print("Configuration validated successfully.")
 
-# Opens config.json file and implements error handling
-try:
-    with open("config.json", "r") as file:
-        config = ujson.load(file)
-except OSError as e:
-    print("config.json is not found. Please ensure it is present.")
-    raise e
-except Exception as e:
-    print("Failed to open config.json file. Please ensure it is present and accessible.")
+# config.json was read by color_setup.py. If that failed it is opened again to report the error
+if config is None:
+    try:
+        with open("config.json", "r") as file:
+            config = ujson.load(file)
+    except OSError as e:
+        print("config.json is not found. Please ensure it is present.")
+        raise e
+    except Exception as e:
+        print("Failed to open config.json file. Please ensure it is present and accessible.")
 
 validate_config(config)
+boot.stage("config")
 
 # Info to connect to wireless network
 ssid = config["ssid"]
 password = config["password"]
 
+# fastConnect caches the access point in wifi.json so later connections skip the scan. staticIp
+# (IP address, netmask, gateway and DNS server) skips DHCP. A lost connection is rejoined before
+# the interface is reset.
+station = wifi.Station(ssid, password, fast=config.get("fastConnect", True),
+                       static=tuple(config["staticIp"]) if "staticIp" in config else None)
+
 # Parameters for the API call
 leaving_from = config["crs"]
-destination = config["filterCrs"]
 numRows = config["numRows"]
 
+# Destinations shown on the board. With more than one, a single unfiltered request is made for
+# the origin and the services are split locally into one page per destination.
+destinations = config.get("destinations") or [config["filterCrs"]]
+destination = destinations[0]
+multi_destination = len(destinations) > 1
+num_pages = len(destinations) if multi_destination else 1
+# Services requested in multi destination mode. Includes services to other stations, so more than numRows are needed
+fetchRows = config.get("fetchRows", min(150, numRows * len(destinations) * 2))
+
+# Lean requests use GetDepartureBoard, which leaves out the calling points of every service.
+# Multi destination mode matches services on their calling points, so it always needs the details.
+lean_requests = config.get("leanRequests", False) and not multi_destination
+# Services are only returned if they depart between timeOffset and timeOffset + timeWindow minutes from now
+time_offset = config.get("timeOffset", 0)
+time_window = config.get("timeWindow", 120)
+
 # API key from Rail Data Marketplace subscription (Live Departure Board service)
 api_key = config["api_key"]
 
+# Run the asyncio main loop instead of the blocking one. Uses more RAM. Requests are made with
+# asyncio streams, which need MicroPython 1.22 or later for HTTPS.
+async_mode = config.get("asyncMode", False)
+if async_mode:
+    import uasyncio as asyncio
+# Seconds each request in async mode may take, as asyncio streams have no timeout
+FETCH_TIMEOUT = 30
+
+# Keep the HTTPS connection open between polls. Saves a TLS handshake per poll, but the
+# connection's TLS buffers stay allocated. The HTTP client is created by import_network.
+keep_alive = config.get("keepAlive", True)
+receive_buffer = config.get("receiveBuffer", 1024)
+
+# Departures are fetched over plain HTTP from a proxy on the LAN that serves many boards, such as
+# "http://192.168.1.20:8080", instead of from the API. The API key isn't sent to the proxy.
+proxy = config.get("proxy")
+
+# proxyFrames asks the proxy for binary frames instead of JSON. A frame is read whole into a buffer
+# allocated here, with room for a destination and a reason of typical length per service.
+proxy_frames = proxy and config.get("proxyFrames", True)
+if proxy_frames:
+    import board_frame  # Binary board frames from the LAN proxy
+frame_reader = board_frame.FrameReader(board_frame.HEADER + (fetchRows if multi_destination else numRows) * 160) if proxy_frames else None
+
+# Asks the API for gzip compressed responses, which are decompressed as they are read. Needs the
+# deflate module (MicroPython 1.21 or later) and about 32 KB of RAM while a response is read.
+# deflate can't be read from an asyncio stream, so it isn't used in async mode. Off by default
+# until a heap soak on the Pico has shown the 32 KB window can be allocated after weeks of polls.
+compress_requested = config.get("compressResponses", False) and not async_mode
+
+# The time until the next poll is picked from the departures, between minInterval and maxInterval
+# seconds and within dailyCalls API calls per day, counting each retry.
+poll_limits = (config.get("minInterval", 60), config.get("maxInterval", 900), config.get("dailyCalls", 1000))
+
+# Times each phase of the poll cycle and tracks the heap, keeping the last profileCycles cycles.
+# profileBlocks also tracks the largest free block, which is slow.
+cycle_profiler = profiler.Profiler(config.get("profileCycles", 8), config.get("profileBlocks", False))
+
+# lowPower puts the panel into deep sleep and turns the Wi-Fi radio off between polls, and waits in
+# lightsleep. The asyncio loop can't lightsleep, so it is only used by the blocking loop.
+# quietHours (["HH:MM", "HH:MM"]) pauses the board between the two times.
+low_power = config.get("lowPower", False)
+if low_power and async_mode:
+    print("lowPower is not supported with asyncMode and has been turned off")
+    low_power = False
+quiet_hours = config.get("quietHours")
+power_manager = power.PowerManager(low_power, tuple(records.parse_minutes(t) for t in quiet_hours) if quiet_hours else None)
+
+# Board rows are drawn from pre-rendered text kept within textCache bytes, instead of glyph by
+# glyph by the Label widgets. 0 draws them with the widgets.
+text_budget = config.get("textCache", 6144)
+if text_budget:
+    import text_cache  # Pre-rendered text for the board rows
+
+# Each live board is saved to flash, at most once every cacheWriteInterval seconds, and shown
+# at the next power-on before anything else starts. compressFrame run length encodes it.
+fast_boot = config.get("fastBoot", True)
+compress_frame = config.get("compressFrame", True)
+frame_interval = config.get("cacheWriteInterval", 900)
+if not fast_boot:
+    # Don't show an old frame again after fastBoot is turned off
+    try:
+        os.remove(framestore.FRAME_FILE)
+    except OSError:
+        pass
+
+# Last successfully fetched departures. Shown at power-on and when the API can't be reached.
+# Written to flash at most once every cacheWriteInterval seconds to limit flash wear.
+last_departures = departure_cache.DepartureCache(min_write_interval=config.get("cacheWriteInterval", 900), multi=multi_destination,
+                                                 rows=numRows, pages=num_pages)
+
+# Services are read into fetch_store, then copied or split into one page store per destination.
+# The stores are allocated once here and reused by every poll.
+fetch_store = records.Records(fetchRows if multi_destination else numRows)
+page_stores = [records.Records(numRows) for _ in range(num_pages)]
+
 # Remove config dictionary to save RAM, and garbage collect
 del config
 gc.collect()
 
 # URL for the API endpoint with added parameters seen above
-url = f"https://api1.raildata.org.uk/1010-live-departure-board-dep/LDBWS/api/20220120/GetDepBoardWithDetails/{leaving_from}?numRows={numRows}&filterCRS={destination}"
+operation = "GetDepartureBoard" if lean_requests else "GetDepBoardWithDetails"
+url = f"https://api1.raildata.org.uk/1010-live-departure-board-dep/LDBWS/api/20220120/{operation}/{leaving_from}"
+if multi_destination:
+    url += f"?numRows={fetchRows}"
+else:
+    url += f"?numRows={numRows}&filterCRS={destination}"
+# The window is only sent when it differs from the API's default of the next 2 hours
+if time_offset or time_window != 120:
+    url += f"&timeOffset={time_offset}&timeWindow={time_window}"
+if proxy:
+    # The proxy (tools/proxy.py) requests the departures from the API for every board on the LAN
+    operation = "Proxy"
+    url = f"{proxy}/departures/{leaving_from}/{','.join(destinations)}?numRows={fetchRows if multi_destination else numRows}"
+    if proxy_frames:
+        url += "&format=frame"
+
+# ETag of the last proxy response and the services read from it. The proxy answers 304 if they
+# haven't changed, and the response isn't read again
+proxy_etag = None
+proxy_services = None
+
+# Reasons for the disrupted services on each page, rotated through the textbox
+message_stores = [delay_messages.MessageStore(numRows) for _ in range(num_pages)]
 
-# Holds the delay info text displayed on the board
-delayBuffer = ""
+# Flags per page to show if the no trains message is displayed for it
+noTrains = bytearray(num_pages)
 
-# Flag to show if there are no trains to display
-noTrains = False
+# Time ("HH:MM") of the cached data shown on the board, or None if the data is live
+stale_since = None
+
+# Refresh count and time (ticks_ms) of the last frame saved for fast boot
+frame_saved_refresh = -1
+frame_saved_at = None
+
+# Flag to show if a live board has been shown since power-on
+started = False
 
 # Flag to show if the network is connected. Assists with network reconnection during runtime
 network_connected = True
 
-def connect(ssid: str, password: str, max_retries: int = 10):
-    """Function that connects to the wireless network using the ssid and password parameters."""
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    # Closes any previous connections
-    wlan.disconnect()
 
-    wlan.connect(ssid, password)
+class BoardState:
+    ''' Model of what is currently shown on the board. Rows are only written to the widgets when
+    their content changes, and the refresh is skipped if nothing changed since the last one. '''
+
+    # Row time codes for an empty row, and a row that must be redrawn
+    BLANK = -1
+    UNKNOWN = -2
+
+    def __init__(self, num_rows: int, pages: int = 1):
+        # Time, destination and expected codes (see records.Records) displayed on each row, three values per row
+        self.rows = array("h", [BoardState.BLANK] * (num_rows * 3))
+        # Title label and its text
+        self.title = None
+        self.title_text = ""
+        # True if the widgets have changed since the last refresh. The first refresh always
+        # happens so the headings are drawn
+        self.changed = True
+        # Refresh counters for reporting
+        self.refreshes = 0
+        self.skipped = 0
+        # Pre-rendered row text, created by initialise_board. None draws the rows with the Label widgets
+        self.text = None
+        # Cells drawn and the time taken since the last report
+        self.cells = 0
+        self.render_us = 0
+        # Textbox changes waiting for the next refresh. Applied together so each message is drawn once
+        self.textbox = None
+        self._messages = []
+        self._clear = False
+        self._textbox_empty = True
+        # Message store entry (see delay_messages) of the reason each page last put in the textbox, or None
+        self.delay_keys = [None] * pages
+        self.textbox_renders = 0
+
+    def _draw(self, label, text: str):
+        ''' Draws text in a row cell. '''
+        t = utime.ticks_us()
+        if self.text is None:
+            label.value(text)
+        else:
+            self.text.draw(ssd, text, label.row, label.col, label.width)
+        self.render_us += utime.ticks_diff(utime.ticks_us(), t)
+        self.cells += 1
+
+    def _draw_time(self, label, t: int):
+        ''' Draws minutes past midnight as "HH:MM" in a row cell. '''
+        if self.text is None:
+            self._draw(label, records.time_text(t))
+            return
+        start = utime.ticks_us()
+        self.text.draw_time(ssd, t, label.row, label.col, label.width)
+        self.render_us += utime.ticks_diff(utime.ticks_us(), start)
+        self.cells += 1
+
+    def report(self):
+        ''' Prints the cells drawn and the time taken since the last report. '''
+        if not self.cells:
+            return
+        line = f"Rendered {self.cells} cells in {self.render_us / 1000:.1f} ms"
+        if self.text is not None:
+            line += ", " + self.text.stats()
+        print(line)
+        self.cells = 0
+        self.render_us = 0
+
+    def set_row(self, board, row: int, services, i: int):
+        ''' Writes service i of services to a row of the board widgets if it differs from what is
+        displayed. Text is only made for the cells that change. '''
+        rows = self.rows
+        j = row * 3
+        std = services.std[i]
+        dest = services.dest[i]
+        etd = services.etd[i]
+        redraw = rows[j] < 0
+        if not redraw and rows[j] == std and rows[j + 1] == dest and rows[j + 2] == etd:
+            return
+        if redraw or rows[j] != std:
+            self._draw_time(board[row][0], std) # Time
+        if redraw or rows[j + 1] != dest:
+            self._draw(board[row][1], services.destination(i)) # Destination
+        if redraw or rows[j + 2] != etd:
+            # Expected time, or a status such as "On time"
+            if etd >= 0:
+                self._draw_time(board[row][2], etd)
+            else:
+                self._draw(board[row][2], services.etd_text(i))
+        rows[j] = std
+        rows[j + 1] = dest
+        rows[j + 2] = etd
+        self.changed = True
+
+    def clear_row(self, board, row: int):
+        ''' Empties a row of the board widgets if it isn't already empty. '''
+        j = row * 3
+        if self.rows[j] == BoardState.BLANK:
+            return
+        for label in board[row]:
+            self._draw(label, "")
+        self.rows[j] = BoardState.BLANK
+        self.changed = True
+
+    def set_title(self, text: str):
+        ''' Sets the board title if it differs from what is displayed. '''
+        if self.title_text != text:
+            self.title.value(text)
+            self.title_text = text
+            self.changed = True
+
+    def message(self, board, text: str):
+        ''' Appends a message to the textbox at the next refresh. '''
+        self.textbox = board[-1]
+        self._messages.append(text)
+        self.changed = True
 
-    attempt = 0
+    def clear_messages(self, board):
+        ''' Clears the textbox at the next refresh, dropping messages that haven't been drawn yet. '''
+        self.textbox = board[-1]
+        self._messages = []
+        self._clear = True
+        # Every page's reason is put back the next time the page is shown
+        for page in range(len(self.delay_keys)):
+            self.delay_keys[page] = None
+        self.changed = True
 
-    while not wlan.isconnected() and attempt < max_retries:
-        print(f"Attempt {attempt + 1} of {max_retries}: Waiting for connection...")
-        utime.sleep(1.5)
-        attempt += 1
+    def clear_delay(self, board, page: int):
+        ''' Removes the delay messages from the textbox once a page has none, unless newer messages
+        are waiting to be drawn after them. '''
+        self.delay_keys[page] = None
+        if not self._messages:
+            self.clear_messages(board)
 
-    if wlan.isconnected():
-        print("Connected successfully.")
-        print("Network configuration:", wlan.ifconfig())
-        return wlan
+    def _draw_messages(self):
+        ''' Applies the textbox changes made since the last refresh. '''
+        renders = 0
+        if self._clear and not self._textbox_empty:
+            self.textbox.clear()
+            self._textbox_empty = True
+            renders += 1
+        for text in self._messages:
+            # ntrim=4 sets no. of text lines to store in RAM
+            self.textbox.append(text, ntrim=4)
+            self._textbox_empty = False
+            renders += 1
+        self._messages = []
+        self._clear = False
+        if renders:
+            self.textbox_renders += renders
+            # ticks_ms counts from reset
+            hours = utime.ticks_ms() / 3_600_000
+            print(f"Textbox drawn {self.textbox_renders} times since power-on" + (f", {self.textbox_renders / hours:.1f} per hour" if hours >= 1 else ""))
+
+    def refresh(self, ssd):
+        ''' Refreshes the display only if the board has changed since the last refresh. '''
+        self._draw_messages()
+        if not self.changed:
+            self.skipped += 1
+            print(f"Board unchanged, refresh skipped. Refreshes: {self.refreshes}, avoided: {self.skipped}")
+            return False
+        # The panel may be asleep in low power mode
+        power_manager.wake_panel(ssd)
+        refresh(ssd)
+        self.changed = False
+        self.refreshes += 1
+        return True
+
+
+# Holds what is displayed on the board
+board_state = BoardState(numRows, num_pages)
+
+def count_call():
+    ''' Counts a request against the daily API call budget, including each retry. Cycles stopped by
+    the circuit breaker make no request and aren't counted. '''
+    poll_scheduler.record_call(departure_cache.clock()[1])
+
+
+def fetch_headers(api_key: str):
+    ''' Returns the request headers of a poll. '''
+    if proxy:
+        return {"If-None-Match": proxy_etag} if proxy_etag else {}
+    headers = {"x-apikey": api_key}
+    if compress_responses:
+        headers["Accept-Encoding"] = "gzip"
+    return headers
+
+
+def fetch_status(response, start: int):
+    ''' Returns True if the proxy reported nothing has changed since the last response. Raises a
+    FetchError if the request failed. '''
+    if response.status == 304 and proxy_etag:
+        # The proxy sends the time of its departures with the 304, so the clock, the scheduler and
+        # the pruning of departed services don't carry on from the last full response. None from
+        # a proxy that doesn't send it, which leaves the clock alone
+        darwin.generated_at = response.headers.get("x-generated-at")
+        print(f"{operation} response: not modified in {utime.ticks_diff(utime.ticks_ms(), start)} ms")
+        return True
+    if response.status != 200:
+        raise http_client.FetchError(http_client.HTTP, f"HTTP status {response.status}", response.status)
+    return False
+
+
+def fetch_done(response, body, services, start: int):
+    ''' Moves the services read from a response into the page stores and logs the response. Returns the services. '''
+    global proxy_etag, proxy_services
+    if not multi_destination:
+        # Copied so a failed request can't leave the displayed store half filled
+        if services is not None:
+            page_stores[0].copy(services)
+            services = page_stores[0]
     else:
-        print(f"Failed to connect after {attempt} connection attempts.")
-        raise Exception(f"Failed to connect after {attempt} connection attempts.")
+        # Fills one store per destination
+        services = darwin.partition(services, page_stores)
+    cycle_profiler.stop("parse")
+    if proxy:
+        proxy_etag = response.headers.get("etag")
+        proxy_services = services
+    # Logged so the payload and time of lean, detailed and compressed requests can be compared
+    ms = utime.ticks_diff(utime.ticks_ms(), start)
+    if body is response:
+        print(f"{operation} response: {response.length} bytes in {ms} ms")
+    else:
+        print(f"{operation} response: {response.length} bytes gzip, {body.length} decompressed, in {ms} ms")
+    return services
+
+
+def fetch_close(response):
+    ''' Closes the connection unless the whole body was read and the server keeps it open. '''
+    try:
+        if response:
+            response.close()
+    except:
+        pass
+    gc.collect()
+
+
+def fetch_services(url: str, api_key: str):
+    ''' Function that makes a single API request and returns the services (a records.Records store, or a list of
+    them in multi destination mode), or None if there are no train services.
+    The response is streamed through darwin.read_services so only the displayed fields are ever held in RAM. '''
+    response = None
+    start = utime.ticks_ms()
+    try:
+        # Reuses the connection from the previous poll if the server kept it open
+        cycle_profiler.start("fetch")
+        count_call()
+        response = http.get(url, fetch_headers(api_key))
+        cycle_profiler.stop("fetch")
+        if fetch_status(response, start):
+            # Nothing has changed since the last response
+            return proxy_services
+        # Decompressed as it is read if the server sent it gzipped
+        body = response.body()
+        # Reads the body in chunks, extracting std, etd, destination and delay info per service
+        cycle_profiler.start("parse")
+        if proxy_frames:
+            # The proxy has already matched the destinations and set each service's calls
+            frame_reader.read(body)
+            services = frame_reader.decode(fetch_store)
+        else:
+            # Matched on destination or calling point in multi destination mode
+            services = darwin.read_services(body, fetch_store, calls=destinations if multi_destination else None, buf=http.buffer)
+        return fetch_done(response, body, services, start)
+    finally:
+        fetch_close(response)
+        response = None
+
+
+async def fetch_services_async(url: str, api_key: str):
+    ''' Same as fetch_services, with asyncio streams, so the display keeps updating while the
+    request is made and the response is read. '''
+    response = None
+    start = utime.ticks_ms()
+    try:
+        cycle_profiler.start("fetch")
+        count_call()
+        response = await http.get_async(url, fetch_headers(api_key))
+        cycle_profiler.stop("fetch")
+        if fetch_status(response, start):
+            return proxy_services
+        body = response.async_body()
+        cycle_profiler.start("parse")
+        if proxy_frames:
+            await frame_reader.read_async(body)
+            services = frame_reader.decode(fetch_store)
+        else:
+            services = await darwin.read_services_async(body, fetch_store, calls=destinations if multi_destination else None, buf=http.buffer)
+        return fetch_done(response, body, services, start)
+    finally:
+        fetch_close(response)
+        response = None
+
+
+def check_circuit():
+    ''' Raises an exception if the circuit breaker is stopping API requests after repeated failures. '''
+    if not circuit_breaker.allow():
+        raise http_client.FetchError(retry.CIRCUIT_OPEN, f"API paused after repeated failures, next attempt in {circuit_breaker.remaining()}s")
+
 
+def retry_delay(e, attempts: int, start: int):
+    ''' Logs a failed attempt and returns the delay in seconds before the next one. Raises a FetchError
+    if the failure shouldn't be retried, the retry limit or cycle deadline has been reached, or the
+    attempt was the circuit breaker's probe. '''
+    kind = http_client.classify(e)
+    status = getattr(e, "status", 0)
+    print(f"API connection failed ({kind}): {e}")
+    delay = None
+    if not circuit_breaker.half_open():
+        delay = retry_policy.next_delay(attempts, utime.ticks_diff(utime.ticks_ms(), start), kind, status)
+    if delay is None:
+        circuit_breaker.failure()
+        retry_policy.cycle_done(start)
+        raise http_client.FetchError(kind, f"API call failed ({kind}) after {attempts + 1} attempts: {e}", status)
+    print(f"Retrying in {delay:.1f}s")
+    return delay
 
 
-def get_data(url: str, api_key: str, max_retries: int = 6):
-    ''' Function that gets the departure data from the API endpoint, extracts key data and returns as a dictionary. '''
+def get_data(url: str, api_key: str):
+    ''' Function that gets the departure data from the API endpoint, extracts key data and returns as a list of dictionaries. '''
     gc.collect()
+    check_circuit()
     
+    start = utime.ticks_ms()
     attempts = 0
     
-    req = None
-    data = None
-    raw_text = None
-    
     # API connection loop
-    while attempts <= max_retries:
-        print(f"API connection attempt {attempts} of {max_retries}")
+    while True:
+        print(f"API connection attempt {attempts + 1} of {retry_policy.max_attempts}")
         try:
-            req = urequests.get(url, headers={"x-apikey": api_key}, timeout=8)
-            raw_text = req.text
+            # formatted_data is None if there are no train services
+            formatted_data = fetch_services(url, api_key)
         except Exception as e:
-            print("API connection failed: " + str(e))
-            try:
-                if req:
-                    req.close()
-            except:
-                pass
-            req = None
-            gc.collect()
-            if attempts == max_retries:
-                raise Exception(f"API call failed after {attempts} attempts.")
-            utime.sleep(2)
+            utime.sleep(retry_delay(e, attempts, start))
             attempts += 1
-            continue
         else:
-            try:
-                if req:
-                    req.close()
-            except:
-                pass
-            
-            req = None
-            gc.collect()
-            
-            break
-    
-    # If nothing is retrieved from API, return None
-    if raw_text is None:
-        return None
+            circuit_breaker.success()
+            retry_policy.cycle_done(start)
+            return formatted_data
+
+
+async def get_data_async(url: str, api_key: str):
+    ''' Same as get_data, but other tasks run while each attempt is made and between attempts. '''
+    gc.collect()
+    check_circuit()
     
+    start = utime.ticks_ms()
     attempts = 0
     
-    # JSON parsing loop
-    while attempts <= max_retries:
-        print(f"JSON parsing attempt {attempts} of {max_retries}")
-        # Parses response to JSON. Very RAM intensive ATM, need to look at this.
+    while True:
+        print(f"API connection attempt {attempts + 1} of {retry_policy.max_attempts}")
         try:
-            data = ujson.loads(raw_text)
+            # asyncio streams have no timeout, so each attempt is given FETCH_TIMEOUT seconds
+            formatted_data = await asyncio.wait_for(fetch_services_async(url, api_key), FETCH_TIMEOUT)
         except Exception as e:
-            print("JSON parsing failed: " + str(e))
-            gc.collect()
-            if attempts == max_retries:
-                raise Exception("JSON parsing failed: " + str(e))
-            utime.sleep(2)
+            if isinstance(e, asyncio.TimeoutError):
+                e = http_client.FetchError(http_client.TIMEOUT, f"No response in {FETCH_TIMEOUT}s")
+            await asyncio.sleep(retry_delay(e, attempts, start))
             attempts += 1
-            continue
         else:
-            break
-    
-    del raw_text
-    gc.collect()
-    
-    # If there are no train services, return None
-    if "trainServices" not in data:
-        return None
-    
-    # Dictionary that holds only the required departure info
-    formatted_data = []
-    
-    # Stores the train services records from the API response
-    train_services = data["trainServices"]
-    
-    for service in train_services:
-        
-        # Contains departure info about the service
-        service_info = {
-            "std": service["std"], # Time
-            "destination": service["destination"][0]["locationName"], # Destination
-            "etd": service["etd"] # Expected
-        }
-        
-        # Checks if the service contains a delay or cancellation message
-        delay_message = service.get("delayReason") or service.get("cancelReason")
-        
-        if delay_message is not None:
-            service_info["delayMessage"] = delay_message
-            
-        formatted_data.append(service_info)
-
-    gc.collect()
-    
-    return formatted_data
+            circuit_breaker.success()
+            retry_policy.cycle_done(start)
+            return formatted_data
 
 
 def initialise_board(wri, y_pos: int):
     ''' Function that prepares the display for the train info to be added. '''
     
-    # Title identifying the journey
-    Label(wri, y_pos, 0, leaving_from + " -> " + destination)
+    # Title identifying the journey. Changes with the page in multi destination mode
+    board_state.title = Label(wri, y_pos, 0, wri.stringlen("XXX -> XXX cached 00:00"))
+    board_state.set_title(leaving_from + " -> " + destination)
     
     # Increment y_pos to move down the page
     y_pos += courier20.height()
@@ -233,6 +717,9 @@ def initialise_board(wri, y_pos: int):
         # Increment y_pos to move down the screen
         y_pos += courier20.height()
 
+    if text_budget:
+        board_state.text = text_cache.TextCache(courier20, text_budget)
+
     # Finally adds the delay information to the bottom of the board
     board.append(Textbox(wri, y_pos + courier20.height(), 0, wri.stringlen("This is the width of the textbox.."), 4, clip=False))
     gc.collect()
@@ -240,75 +727,171 @@ def initialise_board(wri, y_pos: int):
     return board
 
 
-def update_board(board, data: dict):
-    ''' Adds the data to the display in a readable format. Combined updateBoard and formatData functions to save RAM '''
-    global delayBuffer, noTrains
+def update_board(board, data, page: int = 0):
+    ''' Adds the data (a records.Records store, or None) to the display in a readable format. '''
     
-    # Flag to show if a delay has already been discovered
-    delayFound = False
-    
-    # Checks if there are no trains in the response dictionary
-    if data is None and not noTrains:
-        delayBuffer = ""
-        message = "There are no direct trains between these stations within the next 2 hours. Please check the National Rail website for more info."
+    # Checks if there are no trains in the data. Each page keeps its own flag, so flipping
+    # between a page with trains and one without doesn't redraw the textbox
+    if (data is None or not data.count) and not noTrains[page]:
+        message_stores[page].clear()
+        # The message is drawn after the page's last delay message, which no longer needs clearing
+        board_state.delay_keys[page] = None
+        window = "2 hours" if time_window == 120 else f"{time_window} minutes"
+        message = f"There are no direct trains between these stations within the next {window}. Please check the National Rail website for more info."
         # Add message to textbox
-        board[-1].append(message, ntrim=4)
-        # noTrains is True. Next time the board will only refresh if trains are present
-        noTrains = True
-        # dataLen set to -1. All rows will be removed in the loop
-        dataLen = -1
+        board_state.message(board, message)
+        # noTrains is set for the page. Next time the board will only refresh if trains are present
+        noTrains[page] = 1
+        # dataLen set to 0. All rows will be removed in the loop
+        dataLen = 0
     # If the no trains message is already displayed
-    elif data is None and noTrains:
+    elif data is None or not data.count:
         # Exit function. Do not need to update board.
         return
     # If there are now train services upcoming, clear the textbox
-    elif data is not None and noTrains:
-        board[-1].clear()
-        # Next time board will refresh as normal
-        noTrains = False
-        dataLen = len(data)
+    elif noTrains[page]:
+        board_state.clear_messages(board)
+        # Next time board will refresh as normal. Other pages put their no trains message back
+        for n in range(num_pages):
+            noTrains[n] = 0
+        dataLen = data.count
     else:
-        # Trains are available, so set noTrains to False
-        noTrains = False
-        dataLen = len(data)
+        dataLen = data.count
         
     for row in range(0, numRows):
-        # If there are no more services to be displayed, reset the remaining row values and continue next loop
+        # If there are no more services to be displayed, empty the remaining rows
         if row >= dataLen:
-            board[row][0].value("") # Time
-            board[row][1].value("") # Destination
-            board[row][2].value("") # Expected
-            continue
-        
-        # Validate required keys. Must contain std, destination and etd keys
-        if not all(k in data[row] for k in ["std", "destination", "etd"]):
-            print(f"Skipping invalid entry: {data[row]}")  # Log missing data
-            continue  # Skip this entry
-
-        # Rows to be added to the board
-        board[row][0].value(data[row]["std"]) # Time
-        board[row][1].value(data[row]["destination"]) # Destination
-        board[row][2].value(data[row]["etd"]) # Expected
-        
-        # If train is on time, no need to display delay info
-        if data[row]["etd"] == "On time":
-            continue
-        
-        # If delay info is already displayed for this service, or a delay is already found, skip to next service.
-        if data[row]["std"] in delayBuffer or delayFound:
+            board_state.clear_row(board, row)
             continue
 
-        # If service is delayed or cancelled, add delay message to the textbox on board
-        if "delayMessage" in data[row]:
-            delayBuffer = data[row]["std"]
-            # Adds delay/cancellation message to display. ntrim=4 sets no. of text lines to store in RAM
-            board[-1].append(data[row]["std"] + ": " + data[row]["delayMessage"], ntrim=4)
-            delayFound = True
+        # Only changed rows are written to the widgets
+        board_state.set_row(board, row, data, row)
+    
+    show_delay_message(board, message_stores[page], data, page)
+    board_state.report()
+
+
+def show_delay_message(board, store, data, page: int = 0):
+    ''' Puts the page's next delay or cancellation reason in the textbox if it isn't there already.
+    The textbox is cleared once the services with reasons have left the page. '''
+    store.update(data, numRows)
+    k = store.next()
+    if k < 0:
+        if board_state.delay_keys[page] is not None:
+            board_state.clear_delay(board, page)
+        return
+    key = store.key(k)
+    if key != board_state.delay_keys[page]:
+        board_state.message(board, store.text(k))
+        board_state.delay_keys[page] = key
+
+
+def next_poll_interval(data, fetched: bool):
+    ''' Returns the number of seconds until the next poll. The API calls were counted by fetch_services as they were made. '''
+    if not fetched:
+        poll_scheduler.interval = poll_scheduler.default
+        return poll_scheduler.interval
+    generated = darwin.generated_at
+    now = records.parse_minutes(generated[11:16]) if generated else -1
+    # The scheduler looks at every page in multi destination mode
+    return poll_scheduler.next_interval(data if multi_destination else [data], now if now >= 0 else None)
+
+
+def store_data(data):
+    ''' Keeps newly fetched data as the last known good departures and sets the clock from it. '''
+    global stale_since
+    stale_since = None
+    if darwin.generated_at:
+        departure_cache.set_clock(darwin.generated_at)
+        last_departures.update(data, darwin.generated_at)
+
+
+def prune_strings():
+    ''' Frees the interned destination names and reasons that nothing refers to any more, those
+    of services that have left the board, the cache and the delay messages. Called between polls. '''
+    rows = board_state.rows
+    dests = [rows[j + 1] for j in range(0, len(rows), 3) if rows[j] >= 0]
+    keys = [key for key in board_state.delay_keys if key is not None]
+    stores = [fetch_store] + page_stores + message_stores + last_departures.stores()
+    return records.prune(stores, dests + [key[1] for key in keys], [key[2] for key in keys])
+
+
+def use_cache():
+    ''' Returns the cached departures that haven't left yet and marks the board as stale,
+    or returns None if nothing is cached. '''
+    global stale_since
+    data = last_departures.current()
+    if data is not None:
+        stale_since = last_departures.stale_label()
+    return data
+
+
+def live_board_shown():
+    ''' Called after a board of newly fetched departures is refreshed. Logs the startup time the
+    first time, and saves the frame to flash for the next power-on. '''
+    global started, frame_saved_refresh, frame_saved_at
+    if not started:
+        started = True
+        boot.stage("first board")
+        boot.summary()
+    if not fast_boot or stale_since is not None or board_state.refreshes == frame_saved_refresh:
+        return
+    now = utime.ticks_ms()
+    if frame_saved_at is not None and utime.ticks_diff(now, frame_saved_at) < frame_interval * 1000:
+        return
+    framestore.save(ssd._buffer, ssd.width, ssd.height, compress=compress_frame)
+    frame_saved_refresh = board_state.refreshes
+    frame_saved_at = now
+
+
+def profiled_refresh():
+    ''' Refreshes the board, recording the refresh and panel busy times in the profiler. '''
+    ssd.busy_ms = 0
+    cycle_profiler.start("refresh")
+    board_state.refresh(ssd)
+    cycle_profiler.stop("refresh")
+    cycle_profiler.record("busy", ssd.busy_ms)
+
+
+def profiled_update(board, data, page: int):
+    ''' Shows a page of data, recording the time in the profiler. '''
+    cycle_profiler.start("update")
+    show_page(board, data, page)
+    cycle_profiler.stop("update")
+
+
+def show_page(board, data, page: int):
+    ''' Shows a page of the fetched data. In multi destination mode data holds one store of services per
+    destination and the page selects which one is shown, otherwise data is passed straight to update_board. '''
+    title = leaving_from + " -> " + destinations[page]
+    if stale_since is not None:
+        # Cached data is shown with the time it was fetched
+        title += " cached " + stale_since
+    board_state.set_title(title)
+    if multi_destination:
+        data = data[page]
+    update_board(board, data, page)
+
+
+def show_paused(board):
+    ''' Clears the departures and shows that the board is paused for quiet hours. '''
+    board_state.set_title(f"{leaving_from} paused until {records.time_text(power_manager.quiet[1])}")
+    for row in range(numRows):
+        board_state.clear_row(board, row)
+    board_state.clear_messages(board)
+    board_state.message(board, "Board paused for quiet hours.")
+    # Delay and no trains messages are shown again when the board resumes
+    for store in message_stores:
+        store.clear()
+    for page in range(num_pages):
+        noTrains[page] = 0
+    board_state.refresh(ssd)
 
 
 def display_error(wri, error: str):
     ''' Function that displays an error on the display to help with troubleshooting '''
     # Clear display
+    power_manager.wake_panel(ssd)
     refresh(ssd, True)
     print("Displaying error...")
     # Sets the clip parameters row_clip=False, col_clip=False, wrap=True
@@ -322,22 +905,51 @@ def display_error(wri, error: str):
     refresh(ssd)
     print("Finished displaying error")
     
+    # Saves the recent phase timings and heap use for troubleshooting
+    try:
+        cycle_profiler.dump("profile.csv")
+    except Exception as e:
+        print("Failed to write profile: " + str(e))
+    
 
 def main():
     ''' Main function that displays the data on the screen. '''
     global network_connected
     
+    # Joins the access point while the GUI is imported and the board is drawn
+    station.start()
+    import_gui()
+    boot.stage("gui")
+    
     # Writer object with courier 20 font
     wri = Writer(ssd, courier20, verbose=False)
     
-    refresh(ssd, True)
+    if frame_restored:
+        # The restored frame stays on the panel until the first board replaces it
+        ssd.fill(0)
+        ssd.wait_until_ready()
+    else:
+        refresh(ssd, True)
+    
+    # Creates a board on display to write train departures on
+    board = initialise_board(wri, 0)
+    
+    # Shows the last known departures from flash before connecting to Wi-Fi
+    data = use_cache() if last_departures.load() else None
+    if data is not None:
+        show_page(board, data, 0)
+        del data
+    board_state.refresh(ssd)
+    boot.stage("board")
+    import_network()
+    boot.stage("network")
     
     # Initialise wlan variable
     wlan = None
     
     # Connects to network using supplied ssid and password
     try:
-        wlan = connect(ssid, password)
+        wlan = station.connect()
     # If connection fails, print a message then continue.
     except Exception as e:
         print("Wi-Fi connection failed: " + str(e))
@@ -345,34 +957,57 @@ def main():
     # If connection is successful, set network_connected to True
     else:
         network_connected = True
-    
-    # Creates a board on display to write train departures on
-    board = initialise_board(wri, 0)
+    boot.stage("wifi")
     
     while True:
         
+        cycle_profiler.begin_cycle()
+        
+        # During quiet hours the board is paused and sleeps until they end
+        quiet = power_manager.quiet_until(departure_cache.clock()[1])
+        if quiet:
+            print(f"Quiet hours, pausing for {quiet} s")
+            show_paused(board)
+            power_manager.radio_off(station, http)
+            power_manager.sleep_panel(ssd)
+            power_manager.wait(quiet)
+            power_manager.end_cycle()
+            continue
+        
+        if wlan is not None and not wlan.active() and network_connected:
+            # The radio was turned off after the last fetch to save power
+            power_manager.radio_on()
+            try:
+                cycle_profiler.start("connect")
+                wlan = station.connect()
+            except Exception as e:
+                print("Wi-Fi connection failed: " + str(e))
+                network_connected = False
+            finally:
+                # Stopped even if connecting failed, so the time of a failed attempt is recorded too
+                cycle_profiler.stop("connect")
+        
         if wlan is None or not wlan.isconnected() or not network_connected:
             print("Wi-Fi connection lost. Attempting to reconnect...")
             
-            # Cleanup the old wlan object
-            if wlan is not None:
-                try:
-                    wlan.active(False)
-                except:
-                    pass
-                wlan = None
-            
             # If Wi-Fi has only just disconnected...
             if network_connected:
                 # Set connected flag to False as we have now disconnected
                 network_connected = False
             
-            # Add a disconnection message to textbox. ntrim=4 sets no. of text lines to store in RAM
-            board[-1].append("Wi-Fi connection lost. Attempting to reconnect...", ntrim=4)
-            refresh(ssd)
-                
+            # Add a disconnection message to textbox
+            board_state.message(board, "Wi-Fi connection lost. Attempting to reconnect...")
+            board_state.refresh(ssd)
+            
+            # The interface is kept and rejoined first. The station only resets it if that fails
+            power_manager.radio_on()
             try:
-                wlan = connect(ssid, password)
+                cycle_profiler.start("connect")
+                try:
+                    wlan = station.connect()
+                finally:
+                    # Stopped before the outcome is drawn, and even if connecting failed
+                    cycle_profiler.stop("connect")
             except Exception as e:
                 # If reconnection failed, print a message and sleep for 10 seconds
                 print("Wi-Fi reconnection failed: " + str(e))
@@ -384,8 +1019,8 @@ def main():
                     print("Wi-Fi reconnected...")
                     network_connected = True
                     # Adds a message to indicate Wi-Fi reconnection
-                    board[-1].append("Wi-Fi reconnected successfully.", ntrim=4)
-                    refresh(ssd)
+                    board_state.message(board, "Wi-Fi reconnected successfully.")
+                    board_state.refresh(ssd)
                     gc.collect()
 
         try:
@@ -394,30 +1029,221 @@ def main():
         except Exception as e:
             message = "API GET request failed: " + str(e)
             print(message)
-            # Assume network has disconnected if we can't reach API
-            network_connected = False
-            board[-1].append("API connection failed. Retrying next update.", ntrim=4)
-            refresh(ssd)
-            data = None
+            # Reconnect Wi-Fi if the API host couldn't be reached at all
+            if http_client.classify(e) in NETWORK_FAILURES:
+                network_connected = False
+            board_state.message(board, "API connection failed. Retrying next update.")
+            # Falls back to the last known departures
+            data = use_cache()
+            fetched = False
         else:
-            try:
-                # Update the board with the data
-                update_board(board, data)
-            except Exception as e:
-                message = "Display update failed: " + str(e)
-                display_error(wri, message)
-                raise e
+            fetched = True
+            cycle_profiler.start("format")
+            store_data(data)
+            cycle_profiler.stop("format")
         
-        if data is not None:
-            del data
+        # Time until the next poll, based on the departures
+        interval = next_poll_interval(data, fetched)
         
-        # Refresh display after board update
-        refresh(ssd)
+        # The radio isn't needed again until the next poll in low power mode
+        power_manager.radio_off(station, http)
         
-        gc.collect()
+        # Pages rotate evenly through the poll interval. There is one page unless
+        # multiple destinations are configured
+        for page in range(num_pages):
+            if fetched or data is not None:
+                try:
+                    # Update the board with the data
+                    profiled_update(board, data, page)
+                except Exception as e:
+                    message = "Display update failed: " + str(e)
+                    display_error(wri, message)
+                    raise e
+            
+            # Refresh display after board update, skipped if nothing on the board changed
+            profiled_refresh()
+            if fetched and page == 0:
+                live_board_shown()
+            power_manager.sleep_panel(ssd)
+            
+            gc.collect()
+            
+            if page == 0:
+                cycle_profiler.summary()
 
-        # Wait for 3 minutes (180 seconds) using utime library instead of async (less RAM intensive)
-        utime.sleep(180)
+            # Wait for the poll interval in total using utime library instead of async (less RAM intensive),
+            # in lightsleep in low power mode
+            power_manager.wait(interval // num_pages)
+        
+        power_manager.end_cycle()
+        prune_strings()
         
+        if data is not None:
+            del data
+        
+
+async def main_async():
+    ''' Asyncio version of main. Wi-Fi supervision, fetching and display updates run as separate tasks,
+    so the panel's busy period overlaps with the next fetch. Requires asyncMode in config.json. '''
+    
+    # Joins the access point while the GUI is imported and the board is drawn
+    station.start()
+    import_gui()
+    boot.stage("gui")
+    
+    # Writer object with courier 20 font
+    wri = Writer(ssd, courier20, verbose=False)
+    
+    if frame_restored:
+        # The restored frame stays on the panel until the first board replaces it
+        ssd.fill(0)
+    else:
+        refresh(ssd, True)
+        await ssd.wait()
+    
+    # Creates a board on display to write train departures on
+    board = initialise_board(wri, 0)
+    
+    # Shows the last known departures from flash before connecting to Wi-Fi
+    data = use_cache() if last_departures.load() else None
+    if data is not None:
+        show_page(board, data, 0)
+    board_state.refresh(ssd)
+    boot.stage("board")
+    import_network()
+    boot.stage("network")
+    
+    # Shared between tasks. Messages and data are only written to the board by the display task
+    wifi_up = asyncio.Event()
+    display_pending = asyncio.Event()
+    messages = []
+    latest = [None, False]  # [data, new data available]
+    current = [data, 0, False]  # [data being displayed, page shown, next page due]
+    del data
+    
+    def post(message: str):
+        ''' Queues a textbox message for the display task. '''
+        messages.append(message)
+        display_pending.set()
+    
+    async def wifi_task():
+        ''' Keeps the Wi-Fi connection up and sets wifi_up while connected. '''
+        global network_connected
+        wlan = None
+        first = True
+        while True:
+            if wlan is not None and wlan.isconnected() and network_connected:
+                await asyncio.sleep(5)
+                continue
+            
+            wifi_up.clear()
+            if not first:
+                print("Wi-Fi connection lost. Attempting to reconnect...")
+                post("Wi-Fi connection lost. Attempting to reconnect...")
+            # The interface is kept and rejoined first. The station only resets it if that fails
+            try:
+                wlan = await station.connect_async()
+            except Exception as e:
+                print("Wi-Fi connection failed: " + str(e))
+                await asyncio.sleep_ms(200)
+                continue
+            
+            network_connected = True
+            if not first:
+                print("Wi-Fi reconnected...")
+                post("Wi-Fi reconnected successfully.")
+            else:
+                boot.stage("wifi")
+            first = False
+            wifi_up.set()
+            gc.collect()
+    
+    async def fetch_task():
+        ''' Fetches the departures once Wi-Fi is up, at the interval picked by the scheduler. '''
+        global network_connected
+        while True:
+            await wifi_up.wait()
+            cycle_profiler.begin_cycle()
+            try:
+                data = await get_data_async(url, api_key)
+            except Exception as e:
+                print("API GET request failed: " + str(e))
+                # Reconnect Wi-Fi if the API host couldn't be reached at all
+                if http_client.classify(e) in NETWORK_FAILURES:
+                    network_connected = False
+                post("API connection failed. Retrying next update.")
+                interval = next_poll_interval(None, False)
+                # Falls back to the last known departures
+                data = use_cache()
+                show = data is not None
+            else:
+                interval = next_poll_interval(data, True)
+                cycle_profiler.start("format")
+                store_data(data)
+                cycle_profiler.stop("format")
+                show = True
+            if show:
+                latest[0] = data
+                latest[1] = True
+                display_pending.set()
+            del data
+            # Only this task adds strings, so none are held outside a store here
+            prune_strings()
+            gc.collect()
+            await asyncio.sleep(interval)
+    
+    async def display_task():
+        ''' Applies queued messages and new data to the board once the panel is ready, then refreshes. '''
+        while True:
+            await display_pending.wait()
+            display_pending.clear()
+            # The framebuffer must not change while the panel is being updated
+            await ssd.wait()
+            while messages:
+                board_state.message(board, messages.pop(0))
+            show = False
+            if latest[1]:
+                # New data starts again from the first page
+                current[0] = latest[0]
+                current[1] = 0
+                latest[0] = None
+                latest[1] = False
+                show = True
+            elif current[2] and current[0] is not None:
+                current[1] = (current[1] + 1) % num_pages
+                show = True
+            current[2] = False
+            if show:
+                try:
+                    profiled_update(board, current[0], current[1])
+                except Exception as e:
+                    message = "Display update failed: " + str(e)
+                    display_error(wri, message)
+                    raise e
+            # Refresh is skipped if nothing on the board changed
+            board_state.refresh(ssd)
+            if show and current[1] == 0 and stale_since is None:
+                live_board_shown()
+            gc.collect()
+            if show:
+                cycle_profiler.summary()
+    
+    async def page_task():
+        ''' Rotates the destination pages evenly through the poll interval. '''
+        while True:
+            await asyncio.sleep(poll_scheduler.interval // num_pages)
+            current[2] = True
+            display_pending.set()
+    
+    asyncio.create_task(wifi_task())
+    asyncio.create_task(fetch_task())
+    if num_pages > 1:
+        asyncio.create_task(page_task())
+    await display_task()
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if async_mode:
+        asyncio.run(main_async())
+    else:
+        main()
\ No newline at end of file
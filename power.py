@@ -0,0 +1,117 @@
+# power.py Low power cycle for battery powered boards.
+# Between polls the panel is put into deep sleep, the Wi-Fi radio is turned off and the Pico waits
+# in machine.lightsleep. Quiet hours pause the board overnight. The time spent awake, with the radio
+# on, with the panel powered and asleep is measured each cycle and turned into an energy estimate.
+
+# Released under the MIT license see LICENSE
+
+import machine
+import utime
+
+# Estimated current draw in mA used for the energy estimate. Measure your own board to refine them.
+CURRENT_AWAKE = 25.0  # Pico W running with the radio off
+CURRENT_RADIO = 45.0  # Extra while the Wi-Fi radio is on
+CURRENT_PANEL = 5.0  # Extra while the panel controller is powered, averaged over its refreshes
+CURRENT_SLEEP = 1.5  # Pico W in lightsleep with the radio and panel off
+
+# Longest single lightsleep in seconds. Longer waits are split up
+MAX_SLEEP = 3600
+
+
+class PowerManager:
+    ''' Tracks the power state of each cycle. When enabled, the panel and radio are powered down
+    between polls and waits use lightsleep. quiet is (start, end) in minutes past midnight, or None. '''
+
+    def __init__(self, enabled: bool = False, quiet=None):
+        self.enabled = enabled
+        self.quiet = quiet
+        # Times in the current cycle in ms
+        self._cycle_start = utime.ticks_ms()
+        self._radio_start = self._cycle_start  # None while the radio is off
+        self._panel_start = self._cycle_start  # None while the panel is asleep
+        self.radio_ms = 0
+        self.panel_ms = 0
+        self.sleep_ms = 0
+        self._sleep_ticks = 0  # Part of sleep_ms counted by ticks_ms
+        # Estimated charge used since power-on
+        self.total_mah = 0.0
+
+    def radio_on(self):
+        ''' Records that the radio has been turned on. '''
+        if self._radio_start is None:
+            self._radio_start = utime.ticks_ms()
+
+    def radio_off(self, station, http):
+        ''' Closes the HTTP connection and turns the radio off until the next fetch. '''
+        if not self.enabled or self._radio_start is None:
+            return
+        http.close()
+        station.radio_off()
+        self.radio_ms += utime.ticks_diff(utime.ticks_ms(), self._radio_start)
+        self._radio_start = None
+
+    def wake_panel(self, ssd):
+        ''' Reinitialises the panel if it is asleep. Call before show(). '''
+        if ssd.asleep:
+            ssd.wake()
+            self._panel_start = utime.ticks_ms()
+
+    def sleep_panel(self, ssd):
+        ''' Puts the panel into deep sleep once its refresh has finished, keeping its RAM so the
+        next update can still be partial. '''
+        if not self.enabled or ssd.asleep:
+            return
+        ssd.sleep(retain=True)
+        self.panel_ms += utime.ticks_diff(utime.ticks_ms(), self._panel_start)
+        self._panel_start = None
+
+    def wait(self, seconds: int):
+        ''' Waits for seconds, in lightsleep when enabled. '''
+        if not self.enabled:
+            utime.sleep(seconds)
+            return
+        while seconds > 0:
+            t = min(seconds, MAX_SLEEP)
+            start = utime.ticks_ms()
+            machine.lightsleep(t * 1000)
+            self._sleep_ticks += utime.ticks_diff(utime.ticks_ms(), start)
+            self.sleep_ms += t * 1000
+            seconds -= t
+
+    def quiet_until(self, now):
+        ''' Returns the seconds until the end of quiet hours if minutes past midnight now is
+        within them, otherwise 0. Never quiet when the time is unknown. '''
+        if self.quiet is None or now is None:
+            return 0
+        start, end = self.quiet
+        # Quiet hours may span midnight
+        if (now - start) % 1440 >= (end - start) % 1440:
+            return 0
+        return (end - now) % 1440 * 60
+
+    def end_cycle(self):
+        ''' Prints the energy estimate for the cycle and starts the next one. '''
+        now = utime.ticks_ms()
+        # Awake time excludes the sleeps whether or not ticks_ms kept counting during them
+        awake_ms = max(0, utime.ticks_diff(now, self._cycle_start) - self._sleep_ticks)
+        cycle_ms = awake_ms + self.sleep_ms
+        # Parts still powered count up to now
+        radio_ms = self.radio_ms
+        if self._radio_start is not None:
+            radio_ms += utime.ticks_diff(now, self._radio_start)
+            self._radio_start = now
+        panel_ms = self.panel_ms
+        if self._panel_start is not None:
+            panel_ms += utime.ticks_diff(now, self._panel_start)
+            self._panel_start = now
+        mah = (awake_ms * CURRENT_AWAKE + radio_ms * CURRENT_RADIO + panel_ms * CURRENT_PANEL
+               + self.sleep_ms * CURRENT_SLEEP) / 3_600_000
+        self.total_mah += mah
+        average = mah * 3_600_000 / cycle_ms if cycle_ms else 0
+        print(f"Energy {mah:.4f} mAh over {cycle_ms // 1000} s, average {average:.1f} mA (awake {awake_ms} ms, radio {radio_ms} ms, "
+              f"panel {panel_ms} ms, asleep {self.sleep_ms} ms), {self.total_mah:.2f} mAh since power-on")
+        self._cycle_start = now
+        self.radio_ms = 0
+        self.panel_ms = 0
+        self.sleep_ms = 0
+        self._sleep_ticks = 0
@@ -0,0 +1,163 @@
+# profiler.py Phase timing and heap tracking for each poll cycle.
+# Records the time taken by each phase and the heap state before and after it, keeping the
+# last few cycles in a fixed size ring buffer that can be printed or written to a file.
+# BootTimer does the same once for the stages of startup.
+
+# Released under the MIT license see LICENSE
+
+import gc
+import utime
+from array import array
+
+# Phases of a poll cycle, in order
+PHASES = ("connect", "fetch", "parse", "format", "update", "refresh", "busy")
+
+# Values stored for each phase
+FIELDS = ("ms", "free_before", "free_after", "alloc_before", "alloc_after", "block_before", "block_after")
+
+_NPHASES = len(PHASES)
+_NFIELDS = len(FIELDS)
+
+try:
+    _mem_free = gc.mem_free
+except AttributeError:  # CPython, when main is run by the host benchmarks
+    def _mem_free():
+        return -1
+
+
+def largest_free_block(resolution: int = 256):
+    ''' Finds the largest block that can be allocated by trying allocations (binary search).
+    Slow, as it runs a few garbage collections. '''
+    gc.collect()
+    lo = 0
+    hi = gc.mem_free()
+    while hi - lo > resolution:
+        mid = (lo + hi) // 2
+        try:
+            block = bytearray(mid)
+        except MemoryError:
+            hi = mid
+        else:
+            del block
+            lo = mid
+    return lo
+
+
+class Profiler:
+    ''' Phase profiler with a ring buffer of the last cycles. Each phase records its time in ms,
+    free and allocated heap before and after it, and optionally the largest free block
+    (track_blocks, slow). Phases that didn't run in a cycle are left at -1. '''
+
+    def __init__(self, cycles: int = 8, track_blocks: bool = False):
+        self.cycles = cycles
+        self.track_blocks = track_blocks
+        # Ring buffer of cycles. Each cycle is _NPHASES * _NFIELDS values
+        self._ring = array("i", [-1] * (max(1, cycles) * _NPHASES * _NFIELDS))
+        self._cycle_no = array("i", [0] * max(1, cycles))
+        self._count = 0  # Cycles started
+        self._slot = 0  # Start of the current cycle in the ring
+        self._t = array("i", [0] * _NPHASES)  # Start ticks of running phases
+
+    def _heap(self, phase: str, offset: int):
+        ''' Stores free/allocated heap and the largest free block at offset 1 (before) or 2 (after). '''
+        i = self._slot + PHASES.index(phase) * _NFIELDS
+        ring = self._ring
+        ring[i + offset] = gc.mem_free()
+        ring[i + offset + 2] = gc.mem_alloc()
+        if self.track_blocks:
+            ring[i + offset + 4] = largest_free_block()
+
+    def begin_cycle(self):
+        ''' Starts a new cycle, overwriting the oldest one. '''
+        if not self.cycles:
+            return
+        n = self._count % self.cycles
+        self._cycle_no[n] = self._count
+        self._count += 1
+        self._slot = n * _NPHASES * _NFIELDS
+        ring = self._ring
+        for i in range(self._slot, self._slot + _NPHASES * _NFIELDS):
+            ring[i] = -1
+
+    def start(self, phase: str):
+        ''' Marks the start of a phase in the current cycle. '''
+        if not self.cycles:
+            return
+        self._heap(phase, 1)
+        self._t[PHASES.index(phase)] = utime.ticks_ms()
+
+    def stop(self, phase: str):
+        ''' Marks the end of a phase in the current cycle. '''
+        if not self.cycles:
+            return
+        p = PHASES.index(phase)
+        self._ring[self._slot + p * _NFIELDS] = utime.ticks_diff(utime.ticks_ms(), self._t[p])
+        self._heap(phase, 2)
+
+    def record(self, phase: str, ms: int):
+        ''' Records the time of a phase measured elsewhere, e.g. the panel busy wait. '''
+        if self.cycles:
+            self._ring[self._slot + PHASES.index(phase) * _NFIELDS] = ms
+
+    def summary(self):
+        ''' Prints one line with the phase times and lowest free heap of the current cycle. '''
+        if not self.cycles or not self._count:
+            return
+        ring = self._ring
+        parts = []
+        low = -1
+        for p in range(_NPHASES):
+            i = self._slot + p * _NFIELDS
+            if ring[i] >= 0:
+                parts.append(f"{PHASES[p]} {ring[i]}ms")
+            for free in (ring[i + 1], ring[i + 2]):
+                if free >= 0 and (low < 0 or free < low):
+                    low = free
+        print(f"Cycle {self._count - 1}: " + ", ".join(parts) + f", lowest free heap {low} bytes")
+
+    def dump(self, path: str = None):
+        ''' Prints the recorded cycles as CSV, oldest first, or writes them to the file at path. '''
+        file = open(path, "w") if path else None
+        try:
+            line = "cycle,phase," + ",".join(FIELDS)
+            print(line, file=file)
+            first = max(0, self._count - self.cycles)
+            for c in range(first, self._count):
+                base = (c % self.cycles) * _NPHASES * _NFIELDS
+                for p in range(_NPHASES):
+                    i = base + p * _NFIELDS
+                    if self._ring[i] < 0 and self._ring[i + 1] < 0:
+                        continue
+                    line = f"{self._cycle_no[c % self.cycles]},{PHASES[p]}," + ",".join(str(v) for v in self._ring[i:i + _NFIELDS])
+                    print(line, file=file)
+        finally:
+            if file:
+                file.close()
+        if path:
+            print("Profile written to " + path)
+
+
+class BootTimer:
+    ''' Times the stages of startup, from reset to the first live board, with the free heap at the
+    end of each. The first stage is everything before the timer was created, including starting
+    the interpreter and compiling main.py. '''
+
+    def __init__(self, first: str = "start"):
+        self._stages = []
+        self._t = 0  # ticks_ms counts from reset
+        self.low = -1  # Lowest free heap seen at a stage end
+        self.stage(first)
+
+    def stage(self, name: str):
+        ''' Ends the current stage, recording it as name. '''
+        now = utime.ticks_ms()
+        free = _mem_free()
+        self._stages.append((name, utime.ticks_diff(now, self._t), free))
+        self._t = now
+        if self.low < 0 or 0 <= free < self.low:
+            self.low = free
+
+    def summary(self):
+        ''' Prints one line with the time of each stage and the lowest free heap. '''
+        parts = [f"{name} {ms}ms" for name, ms, _ in self._stages]
+        print("Boot: " + ", ".join(parts) + f", {self._t} ms from reset, lowest free heap {self.low} bytes")
@@ -0,0 +1,212 @@
+# records.py Fixed capacity store for the services shown on the board.
+# Services are held in arrays allocated once at startup instead of a new list of dicts per poll.
+# Times are stored as minutes past midnight, and destinations, expected statuses and delay
+# reasons as indexes into tables of interned strings, so steady state polling allocates
+# almost nothing that outlives the poll. Strings no store refers to any more are freed by prune()
+# after each poll and their slots reused, so the tables don't grow over weeks of polling.
+
+# Released under the MIT license see LICENSE
+
+from array import array
+
+
+class Interned:
+    ''' Table of strings that are stored once and referred to by index. Lookups compare the raw
+    bytes, so a value read from the response doesn't need to be decoded to a str first. A slot
+    freed by sweep() is None until a new string takes it, and other indexes don't change. '''
+
+    def __init__(self, initial=()):
+        self.strings = list(initial)
+        self._bytes = [s.encode() for s in initial]
+
+    def index(self, value):
+        ''' Returns the index of value (bytes, bytearray or str), adding it if it is new. '''
+        if isinstance(value, str):
+            value = value.encode()
+        table = self._bytes
+        free = -1
+        for i in range(len(table)):
+            if value == table[i]:
+                return i
+            if free < 0 and table[i] is None:
+                free = i
+        # New strings are rare. The table is bounded by the stations and reasons on the board
+        if free < 0:
+            free = len(table)
+            table.append(None)
+            self.strings.append(None)
+        table[free] = bytes(value)
+        self.strings[free] = str(value, "utf-8")
+        return free
+
+    def __getitem__(self, i: int):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self._bytes)
+
+    def sweep(self, used):
+        ''' Frees the strings whose byte in used is 0. Returns the number freed. '''
+        freed = 0
+        for i in range(len(self._bytes)):
+            if not used[i] and self._bytes[i] is not None:
+                self._bytes[i] = None
+                self.strings[i] = None
+                freed += 1
+        return freed
+
+
+MINUTES_PER_DAY = 1440
+
+# Expected statuses other than a time. Stored in the etd array as -1 - index
+ON_TIME = -1
+CANCELLED = -2
+DELAYED = -3
+ETD = Interned(("On time", "Cancelled", "Delayed", "No report"))
+
+# Destination names and delay/cancellation reasons, shared by all stores
+NAMES = Interned()
+REASONS = Interned()
+
+
+def prune(stores, dests=(), reasons=()):
+    ''' Frees the NAMES and REASONS strings that aren't referred to by stores (objects with count,
+    dest and reason arrays, e.g. Records and delay_messages.MessageStore) or by the further indexes
+    in dests and reasons. Only call it between polls, as a response being read holds indexes that
+    aren't in a store yet. ETD isn't pruned, it only holds a few statuses. Returns the number freed. '''
+    used_names = bytearray(len(NAMES))
+    used_reasons = bytearray(len(REASONS))
+    for store in stores:
+        for i in range(store.count):
+            used_names[store.dest[i]] = 1
+            if store.reason[i] >= 0:
+                used_reasons[store.reason[i]] = 1
+    for i in dests:
+        used_names[i] = 1
+    for i in reasons:
+        used_reasons[i] = 1
+    return NAMES.sweep(used_names) + REASONS.sweep(used_reasons)
+
+
+def parse_minutes(value):
+    ''' Converts "HH:MM" (bytes or str) to minutes past midnight. Returns -1 for anything else. '''
+    if len(value) != 5:
+        return -1
+    if isinstance(value, str):
+        value = value.encode()
+    h1, h2, colon, m1, m2 = value[0] - 48, value[1] - 48, value[2], value[3] - 48, value[4] - 48
+    if colon != 0x3A or not (0 <= h1 <= 9 and 0 <= h2 <= 9 and 0 <= m1 <= 5 and 0 <= m2 <= 9):
+        return -1
+    return (h1 * 10 + h2) * 60 + m1 * 10 + m2
+
+
+def encode_etd(value):
+    ''' Returns the etd code of a Darwin etd value (bytes or str): minutes past midnight for a
+    time, or -1 - index into ETD for a status such as "On time". '''
+    t = parse_minutes(value)
+    if t >= 0:
+        return t
+    return -1 - ETD.index(value)
+
+
+def time_text(t: int):
+    ''' Formats minutes past midnight as "HH:MM". '''
+    return "%02d:%02d" % (t // 60, t % 60)
+
+
+class Records:
+    ''' Up to capacity services. Row i has std[i] (minutes past midnight), etd[i] (etd code),
+    dest[i] (index into NAMES), reason[i] (index into REASONS, -1 if none) and calls[i]
+    (bit n set if the service calls at destination n, multi destination mode only). '''
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self.std = array("h", [0] * capacity)
+        self.etd = array("h", [0] * capacity)
+        self.dest = array("H", [0] * capacity)
+        self.reason = array("h", [-1] * capacity)
+        self.calls = array("H", [0] * capacity)
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, std: int, etd: int, dest: int, reason: int = -1, calls: int = 0):
+        ''' Adds a service. Returns False if the store is full. '''
+        n = self.count
+        if n >= self.capacity:
+            return False
+        self.std[n] = std
+        self.etd[n] = etd
+        self.dest[n] = dest
+        self.reason[n] = reason
+        self.calls[n] = calls
+        self.count = n + 1
+        return True
+
+    def add_from(self, other, i: int):
+        ''' Copies row i of another store. Returns False if this store is full. '''
+        return self.add(other.std[i], other.etd[i], other.dest[i], other.reason[i], other.calls[i])
+
+    def copy(self, other):
+        ''' Replaces the contents with those of another store, up to this store's capacity. '''
+        self.count = 0
+        if other is not None:
+            for i in range(min(other.count, self.capacity)):
+                self.add_from(other, i)
+
+    def equals(self, other):
+        ''' Returns True if both stores hold the same services. '''
+        if other is None or self.count != other.count:
+            return False
+        for i in range(self.count):
+            if (self.std[i] != other.std[i] or self.etd[i] != other.etd[i] or self.dest[i] != other.dest[i]
+                    or self.reason[i] != other.reason[i]):
+                return False
+        return True
+
+    def departs(self, i: int):
+        ''' Expected departure in minutes past midnight, the scheduled time if there is no estimate. '''
+        etd = self.etd[i]
+        return etd if etd >= 0 else self.std[i]
+
+    def disrupted(self, i: int):
+        ''' True if the service is not running on time. '''
+        etd = self.etd[i]
+        return etd != ON_TIME and etd != self.std[i]
+
+    # Text for the board. Only called for rows that have changed
+    def std_text(self, i: int):
+        return time_text(self.std[i])
+
+    def etd_text(self, i: int):
+        etd = self.etd[i]
+        return time_text(etd) if etd >= 0 else ETD[-1 - etd]
+
+    def destination(self, i: int):
+        return NAMES[self.dest[i]]
+
+    def reason_text(self, i: int):
+        ''' Delay or cancellation reason, or None. '''
+        return REASONS[self.reason[i]] if self.reason[i] >= 0 else None
+
+    def to_list(self):
+        ''' Returns the services as a list of dicts in the JSON format used by the departure cache. '''
+        services = []
+        for i in range(self.count):
+            service = {"std": self.std_text(i), "destination": self.destination(i), "etd": self.etd_text(i)}
+            if self.reason[i] >= 0:
+                service["delayMessage"] = self.reason_text(i)
+            services.append(service)
+        return services
+
+    def from_list(self, services):
+        ''' Replaces the contents with a list of dicts made by to_list. Invalid entries are skipped. '''
+        self.count = 0
+        for service in services or ():
+            std = parse_minutes(service.get("std", ""))
+            if std < 0 or "destination" not in service or "etd" not in service:
+                continue
+            reason = service.get("delayMessage")
+            self.add(std, encode_etd(service["etd"]), NAMES.index(service["destination"]),
+                     REASONS.index(reason) if reason else -1)
@@ -0,0 +1,101 @@
+# retry.py Retry policy and circuit breaker for the API requests.
+# Failed requests are retried with exponential backoff and jitter within a per-cycle deadline,
+# and only if the kind of failure can be fixed by retrying. After repeated failed cycles the
+# circuit breaker stops requests for a cooldown period, then lets a single probe through.
+
+# Released under the MIT license see LICENSE
+
+import random
+import utime
+from http_client import DNS, CONNECT, TLS, TIMEOUT, NETWORK
+
+# Failure kind used when the circuit breaker stops a request
+CIRCUIT_OPEN = "circuit_open"
+
+# Failure kinds worth retrying. HTTP errors are checked separately, only 429 and 5xx are retried.
+# A bad body will be bad again, so BODY is not retried.
+RETRYABLE = (DNS, CONNECT, TLS, TIMEOUT, NETWORK)
+
+
+def retryable(kind: str, status: int = 0):
+    ''' Returns True if a failure of this kind (and HTTP status) may succeed if retried. '''
+    if status:
+        return status == 429 or status >= 500
+    return kind in RETRYABLE
+
+
+class RetryPolicy:
+    ''' Exponential backoff with jitter. Delays are base_delay * 2 ** attempt seconds, capped at
+    max_delay, with up to jitter of the delay removed at random. No retry is started that would
+    end after deadline seconds from the start of the cycle. '''
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1, max_delay: float = 16, deadline: int = 45, jitter: float = 0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.jitter = jitter
+        # Longest time spent in a single fetch cycle, in ms
+        self.worst_ms = 0
+
+    def next_delay(self, attempt: int, elapsed_ms: int, kind: str, status: int = 0):
+        ''' Returns the delay in seconds before retrying after attempt (counted from 0) failed,
+        or None if the request should not be retried. '''
+        if attempt + 1 >= self.max_attempts or not retryable(kind, status):
+            return None
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay -= delay * self.jitter * random.random()
+        if elapsed_ms + delay * 1000 > self.deadline * 1000:
+            return None
+        return delay
+
+    def cycle_done(self, start_ms: int):
+        ''' Records and prints the time spent in a fetch cycle. '''
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start_ms)
+        self.worst_ms = max(self.worst_ms, elapsed)
+        print(f"API fetch cycle took {elapsed} ms (worst {self.worst_ms} ms)")
+
+
+class CircuitBreaker:
+    ''' Opens after threshold consecutive failed cycles. While open no requests are made until
+    cooldown seconds have passed, then one probe request is allowed (half open). The probe is a
+    single attempt, not retried. A successful probe closes the breaker, a failed one opens it again. '''
+
+    def __init__(self, threshold: int = 3, cooldown: int = 600):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened = None  # ticks_ms when the breaker opened, None when closed
+
+    def allow(self):
+        ''' Returns True if a request may be made now. '''
+        if self._opened is None:
+            return True
+        if self.half_open():
+            print("Circuit breaker half open, probing API")
+            return True
+        return False
+
+    def half_open(self):
+        ''' Returns True if the cooldown has passed and the next request is the probe. '''
+        return self._opened is not None and utime.ticks_diff(utime.ticks_ms(), self._opened) >= self.cooldown * 1000
+
+    def remaining(self):
+        ''' Seconds until the next probe is allowed. '''
+        if self._opened is None:
+            return 0
+        return max(0, self.cooldown - utime.ticks_diff(utime.ticks_ms(), self._opened) // 1000)
+
+    def success(self):
+        if self._opened is not None:
+            print("Circuit breaker closed")
+        self.failures = 0
+        self._opened = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self._opened is None:
+                print(f"Circuit breaker open after {self.failures} failed cycles")
+            # Restarts the cooldown, including after a failed probe
+            self._opened = utime.ticks_ms()
@@ -0,0 +1,78 @@
+# scheduler.py Adaptive polling interval for the departure board.
+# Polls more often when a train is about to leave or a service is disrupted, and less often
+# when nothing is running, within configured limits and a daily API call budget.
+
+# Released under the MIT license see LICENSE
+
+from records import MINUTES_PER_DAY
+
+
+class PollScheduler:
+    ''' Picks the time until the next poll from the fetched services. now is the time the
+    response was generated in minutes past midnight (UK time, the same as std/etd). '''
+
+    def __init__(self, default: int = 180, min_interval: int = 60, max_interval: int = 900, daily_calls: int = 1000):
+        self.default = default
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.daily_calls = daily_calls
+        # Interval chosen by the last call to next_interval, in seconds
+        self.interval = default
+        # API calls made today. The day rolls over when now goes backwards
+        self.calls_today = 0
+        self._last_now = None
+
+    def record_call(self, now):
+        ''' Counts an API call against the daily budget. now is the time of the call in minutes past
+        midnight, or None if the clock isn't set. '''
+        if now is not None:
+            if self._last_now is not None and now < self._last_now:
+                self.calls_today = 0
+            self._last_now = now
+        self.calls_today += 1
+
+    def _budget_floor(self, now):
+        ''' Shortest interval that keeps the rest of the day within the daily call budget. '''
+        calls_left = max(1, self.daily_calls - self.calls_today)
+        if now is None:
+            return 86400 // self.daily_calls
+        return (MINUTES_PER_DAY - now) * 60 // calls_left
+
+    def next_interval(self, pages, now):
+        ''' Returns the number of seconds until the next poll. pages is a list of records.Records
+        stores (one per destination page), with None or empty stores where there are no trains. '''
+        if now is None:
+            interval, reason = self.default, "no time in response"
+        elif not any(page is not None and page.count for page in pages):
+            # No trains in the next 2 hours
+            interval, reason = self.max_interval, "no trains"
+        else:
+            nearest = None
+            disrupted = False
+            for page in pages:
+                if page is None:
+                    continue
+                # A service can appear on more than one page, which doesn't change the result
+                for i in range(page.count):
+                    if page.disrupted(i):
+                        disrupted = True
+                    # Minutes until departure, allowing for midnight. Over 12 hours means it is in the past
+                    due = (page.departs(i) - now) % MINUTES_PER_DAY
+                    if due > MINUTES_PER_DAY // 2:
+                        due = 0
+                    if nearest is None or due < nearest:
+                        nearest = due
+            if disrupted:
+                interval, reason = self.min_interval, "service disrupted"
+            elif nearest is None:
+                interval, reason = self.default, "no departure times"
+            else:
+                # Poll again at half the time until the next departure
+                interval, reason = nearest * 30, f"next train in {nearest} min"
+        interval = max(self.min_interval, min(self.max_interval, interval))
+        floor = self._budget_floor(now)
+        if interval < floor:
+            interval, reason = floor, reason + ", limited by daily budget"
+        self.interval = interval
+        print(f"Next poll in {interval}s ({reason}). API calls today: {self.calls_today} of {self.daily_calls}")
+        return interval
@@ -0,0 +1,110 @@
+# text_cache.py Pre-rendered text for the board's recurring strings.
+# Strings such as destination names and "On time" are rendered once into bitmaps in the
+# framebuffer's MONO_VLSB layout and blitted straight into the display, instead of being drawn
+# glyph by glyph by Writer on every update. Times are drawn from cached digit glyphs.
+# Strings are evicted least recently used first to stay within a byte budget.
+
+# Released under the MIT license see LICENSE
+
+import framebuf
+
+# Characters of a time, kept as glyphs for the life of the cache
+_TIME_CHARS = "0123456789:"
+
+
+class TextCache:
+    ''' Cache of rendered strings, each padded to the width of the field it is drawn in. Bitmaps
+    are font height pixels tall. budget is the most bytes held by the string bitmaps. '''
+
+    def __init__(self, font, budget: int = 6144):
+        self.font = font
+        self.budget = budget
+        self.height = font.height()
+        self._rows = (self.height + 7) // 8  # Bytes per bitmap column
+        if font.hmap():
+            self._map = framebuf.MONO_HMSB if font.reverse() else framebuf.MONO_HLSB
+        else:
+            self._map = framebuf.MONO_VLSB
+        # Glyphs are copied here to make them a writable buffer for FrameBuffer
+        width = font.max_width()
+        self._scratch = bytearray(max(((width + 7) // 8) * self.height, width * self._rows))
+        # (text, width): [FrameBuffer, size in bytes, last use]
+        self._entries = {}
+        self._used = 0
+        self._clock = 0
+        # Digit and colon glyphs for times: char: (FrameBuffer, width)
+        self._glyphs = {}
+        for ch in _TIME_CHARS:
+            self._glyphs[ch] = self._render(ch, 0)
+        # Statistics for reporting
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _render(self, text: str, width: int):
+        ''' Renders text into a new MONO_VLSB FrameBuffer of the given width (the text's width if 0).
+        Returns (FrameBuffer, width). '''
+        font = self.font
+        if not width:
+            width = sum(font.get_ch(ch)[2] for ch in text)
+        buf = bytearray(width * self._rows)
+        fb = framebuf.FrameBuffer(buf, width, self.height, framebuf.MONO_VLSB)
+        scratch = self._scratch
+        x = 0
+        for ch in text:
+            glyph, height, w = font.get_ch(ch)
+            if x >= width:
+                break
+            scratch[0:len(glyph)] = glyph
+            fb.blit(framebuf.FrameBuffer(scratch, w, height, self._map), x, 0)
+            x += w
+        return fb, width
+
+    def _evict(self, size: int):
+        ''' Drops the least recently used strings until size more bytes fit in the budget. '''
+        entries = self._entries
+        while entries and self._used + size > self.budget:
+            oldest = None
+            for key in entries:
+                if oldest is None or entries[key][2] < entries[oldest][2]:
+                    oldest = key
+            self._used -= entries.pop(oldest)[1]
+            self.evictions += 1
+
+    def draw(self, device, text: str, row: int, col: int, width: int):
+        ''' Draws text at row, col of device, clearing the rest of a field width pixels wide. '''
+        if not text:
+            device.fill_rect(col, row, width, self.height, 0)
+            return
+        self._clock += 1
+        key = (text, width)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            size = width * self._rows
+            fb, _ = self._render(text, width)
+            entry = [fb, size, 0]
+            # Strings bigger than the whole budget are drawn but not kept
+            if size <= self.budget:
+                self._evict(size)
+                self._entries[key] = entry
+                self._used += size
+        else:
+            self.hits += 1
+        entry[2] = self._clock
+        device.blit(entry[0], col, row)
+
+    def draw_time(self, device, t: int, row: int, col: int, width: int):
+        ''' Draws minutes past midnight t as "HH:MM" from the cached glyphs, without making a string. '''
+        device.fill_rect(col, row, width, self.height, 0)
+        glyphs = self._glyphs
+        x = col
+        for ch in (t // 600, t // 60 % 10, -1, t % 60 // 10, t % 10):
+            fb, w = glyphs[":" if ch < 0 else _TIME_CHARS[ch]]
+            device.blit(fb, x, row)
+            x += w
+
+    def stats(self):
+        ''' Returns a one line summary of the cache use. '''
+        return (f"text cache {len(self._entries)} strings, {self._used} of {self.budget} bytes, "
+                f"{self.hits} hits, {self.misses} misses, {self.evictions} evicted")
@@ -0,0 +1,161 @@
+# bench_async.py Checks async mode requests don't block the event loop.
+# Serves the benchmark fixtures from a local HTTP server paced like a weak Wi-Fi link, and reads
+# them with the real http_client and darwin code while a ticker task, standing in for the display
+# task, wakes every 10 ms. Reports the longest time the ticker was kept waiting when the response
+# is read with the blocking get and read_services called from a task, and with get_async and
+# read_services_async, sent with a content length and chunked. Checks every mode extracts the same
+# services and that async requests share one connection.
+#
+# Usage (from the repository root, CPython only):
+#   python tools/bench/bench_async.py              server sends at 2000 kbit/s
+#   python tools/bench/bench_async.py --kbps 400
+#
+# Released under the MIT license see LICENSE
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+# The stubs provide utime and uasyncio for the board modules
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+import fixtures
+import http_client
+import darwin
+import records
+
+# Requests per fixture and mode
+REPEATS = 2
+
+# Interval of the ticker task in ms
+TICK = 10
+
+# (name, read with asyncio streams, server sends chunked)
+MODES = (("blocking", False, False), ("async", True, False), ("chunked", True, True))
+
+
+class Handler(BaseHTTPRequestHandler):
+    ''' Serves server.body for any path in 1 KB pieces at server.rate bytes per second. '''
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        body = server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), 1024):
+            piece = body[i:i + 1024]
+            if server.chunked:
+                piece = b"%x\r\n" % len(piece) + piece + b"\r\n"
+            self.wfile.write(piece)
+            self.wfile.flush()
+            time.sleep(len(piece) / server.rate)
+        if server.chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+async def ticker(state):
+    ''' Records the longest gap between its wake ups beyond TICK ms. '''
+    last = time.perf_counter()
+    while True:
+        await asyncio.sleep(TICK / 1000)
+        now = time.perf_counter()
+        state[0] = max(state[0], (now - last) * 1000 - TICK)
+        last = now
+
+
+async def fetch(client, url: str, use_async: bool, store):
+    ''' Fetches and extracts the services into store. '''
+    headers = {"x-apikey": "bench"}
+    if use_async:
+        response = await client.get_async(url, headers)
+        try:
+            await darwin.read_services_async(response.async_body(), store)
+        finally:
+            response.close()
+    else:
+        response = client.get(url, headers)
+        try:
+            darwin.read_services(response.body(), store)
+        finally:
+            response.close()
+
+
+async def run(client, url: str, use_async: bool, store):
+    ''' Returns the longest ticker stall in ms and the total time of REPEATS requests. '''
+    state = [0.0]
+    task = asyncio.create_task(ticker(state))
+    await asyncio.sleep(0)
+    t = time.perf_counter()
+    for _ in range(REPEATS):
+        await fetch(client, url, use_async, store)
+    ms = (time.perf_counter() - t) * 1000
+    # Lets the ticker wake once more, to record a stall that lasted to the end
+    await asyncio.sleep(2 * TICK / 1000)
+    task.cancel()
+    return state[0], ms
+
+
+def main():
+    args = sys.argv[1:]
+    kbps = float(args[args.index("--kbps") + 1]) if "--kbps" in args else 2000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.rate = kbps * 1000 / 8
+    server.connections = 0
+    # The blocking client's connection is reset when it is closed, which isn't an error here
+    server.handle_error = lambda *a: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/LDBWS/api/20220120/GetDepBoardWithDetails/BFR"
+
+    # Silence the per request log lines
+    http_client.print = lambda *a, **k: None
+    failures = 0
+    print(f"Server sends at {kbps:g} kbit/s, ticker every {TICK} ms")
+    print(f"{'fixture':<18}{'mode':<10}{'bytes':>8}{'ms':>9}{'stall ms':>10}{'conns':>7}")
+    for name, body in fixtures.load():
+        server.body = body
+        expected = None
+        for mode, use_async, chunked in MODES:
+            server.chunked = chunked
+            server.connections = 0
+            client = http_client.HTTPClient(keep_alive=True)
+            store = records.Records(150)
+            stall, ms = asyncio.run(run(client, url, use_async, store))
+            client.close()
+            result = store.to_list()
+            if expected is None:
+                expected = result
+            status = ""
+            if result != expected:
+                status = "  MISMATCH"
+                failures += 1
+            if server.connections != 1:
+                status += f"  {server.connections} connections for {REPEATS} requests"
+                failures += 1
+            print(f"{name:<18}{mode:<10}{len(body):>8}{ms / REPEATS:>9.1f}{stall:>10.1f}{server.connections:>7}{status}")
+    server.shutdown()
+    if failures:
+        print(f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# bench_data_path.py Host-side benchmark of the departure board's data path.
+# Feeds GetDepBoardWithDetails responses of increasing size through the real http_client,
+# darwin, main.get_data, store_data, show_page and board refresh code, with stubs in place of
+# the Pico's hardware modules and the NanoGUI widgets. Reports time per cycle, peak memory and
+# allocations, and fails if any of them has regressed against the stored baseline.
+#
+# Usage (from the repository root):
+#   python tools/bench/bench_data_path.py                    compare with baseline.json
+#   python tools/bench/bench_data_path.py --update-baseline  store the results as the baseline
+#   micropython tools/bench/bench_data_path.py               unix port of MicroPython
+#
+# Released under the MIT license see LICENSE
+
+import gc
+import os
+import sys
+
+# MicroPython has no os.path, so paths are split by hand
+HERE = __file__.rpartition("/")[0] or "."
+if not HERE.startswith("/"):
+    HERE = os.getcwd() + "/" + HERE
+ROOT = HERE + "/../.."
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+# The stubs shadow network, machine, utime etc. and must come first
+sys.path.insert(0, HERE + "/stubs")
+
+import json
+import fixtures
+
+try:
+    import tracemalloc
+except ImportError:  # MicroPython
+    tracemalloc = None
+
+try:
+    from time import perf_counter
+except ImportError:  # MicroPython
+    from time import ticks_us
+
+    def perf_counter():
+        return ticks_us() / 1000000
+
+BASELINE = HERE + "/baseline.json"
+IMPLEMENTATION = sys.implementation.name
+
+# Cycles timed per fixture, after one warm up cycle, and cycles traced for memory use
+CYCLES = 20
+MEMORY_CYCLES = 3
+
+# Allowed increase over the baseline before a result counts as a regression. Timings vary
+# between machines and runs on a busy machine, so they get more headroom than memory.
+TOLERANCE = {"ms": 1.0, "peak_bytes": 0.1, "alloc_blocks": 0.1}
+
+CONFIG = {
+    "ssid": "bench",
+    "password": "bench",
+    "api_key": "bench",
+    "crs": "BFR",
+    "filterCrs": "LBG",
+    "numRows": 4,
+    "profileCycles": 0,
+}
+
+
+class ReplayClient:
+    ''' Stands in for http_client.HTTPClient, answering every request with the same body.
+    The body is read by a real http_client.Response, as it would be from the socket. '''
+
+    def __init__(self, body: bytes):
+        import io
+        self.body = body
+        self.keep_alive = True
+        self._io = io
+        self._f = None
+        self.requests = 0
+        self.buffer = bytearray(1024)
+
+    def get(self, url: str, headers: dict = {}):
+        import http_client
+        self._f = self._io.BytesIO(self.body)
+        self.requests += 1
+        return http_client.Response(self, 200, {"content-length": str(len(self.body))})
+
+    def close(self):
+        self._f = None
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def load_board(workdir: str):
+    ''' Imports main with a benchmark config in workdir. Returns (main, board). '''
+    try:
+        os.mkdir(workdir)
+    except OSError:
+        pass
+    os.chdir(workdir)
+    with open("config.json", "w") as file:
+        json.dump(CONFIG, file)
+    import main
+    # Done by main() after the board is drawn
+    main.import_network()
+    import darwin
+    import http_client
+    import retry
+    import scheduler
+    import departure_cache
+    # The board logs every step. Silence it so the console isn't part of the measurement
+    for module in (main, darwin, http_client, retry, scheduler, departure_cache):
+        module.print = _quiet
+    main.import_gui()
+    wri = main.Writer(main.ssd, main.courier20, verbose=False)
+    board = main.initialise_board(wri, 0)
+    return main, board
+
+
+def cycle(main, board):
+    ''' One poll cycle: request, parse, store, format and refresh. Every row is redrawn. '''
+    state = main.board_state
+    for j in range(0, len(state.rows), 3):
+        state.rows[j] = state.UNKNOWN
+    state.changed = True
+    data = main.get_data(main.url, main.api_key)
+    main.store_data(data)
+    main.show_page(board, data, 0)
+    state.refresh(main.ssd)
+    return data
+
+
+def measure(main, board, body: bytes):
+    ''' Runs the cycles for one response. Returns the results dictionary. '''
+    main.http = ReplayClient(body)
+    services = cycle(main, board)  # Warm up, e.g. the departure cache write
+    times = []
+    for _ in range(CYCLES):
+        gc.collect()
+        t = perf_counter()
+        cycle(main, board)
+        times.append(perf_counter() - t)
+    # Memory is measured separately, as tracing slows the cycle down
+    peak = 0
+    blocks = 0
+    for _ in range(MEMORY_CYCLES):
+        gc.collect()
+        if tracemalloc:
+            tracemalloc.start()
+            before = sys.getallocatedblocks()
+            cycle(main, board)
+            blocks = max(blocks, sys.getallocatedblocks() - before)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        else:
+            # With the collector off every allocation stays on the heap until the cycle ends,
+            # so the heap growth is the total allocated, an upper bound on the peak
+            gc.disable()
+            before = gc.mem_alloc()
+            cycle(main, board)
+            peak = max(peak, gc.mem_alloc() - before)
+            blocks = max(blocks, (gc.mem_alloc() - before) // 16)  # 16 byte GC blocks
+            gc.enable()
+    times.sort()
+    return {
+        "services": services.count if services else 0,
+        "ms": round(times[0] * 1000, 3),  # Fastest, the least affected by other load on the machine
+        "peak_bytes": peak,
+        "alloc_blocks": blocks,
+    }
+
+
+def compare(results: dict, baseline: dict):
+    ''' Prints the results against the baseline. Returns the number of regressions. '''
+    regressions = 0
+    print(f"{'fixture':<24}{'services':>9}{'ms':>10}{'peak bytes':>12}{'blocks':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        flags = []
+        if base:
+            for key, tolerance in TOLERANCE.items():
+                # Small absolute changes are noise, e.g. a few blocks or a fraction of a ms
+                slack = 1 if key == "ms" else 256 if key == "peak_bytes" else 8
+                if result[key] > base[key] * (1 + tolerance) + slack:
+                    flags.append(f"{key} {base[key]} -> {result[key]}")
+        else:
+            flags.append("no baseline")
+        print(f"{name:<24}{result['services']:>9}{result['ms']:>10}{result['peak_bytes']:>12}{result['alloc_blocks']:>8}"
+              + ("  REGRESSION: " + ", ".join(flags) if flags and base else "  (no baseline)" if flags else ""))
+        if base and flags:
+            regressions += 1
+    return regressions
+
+
+def main_bench():
+    update = "--update-baseline" in sys.argv
+    cwd = os.getcwd()
+    main, board = load_board("/tmp/epaper-bench")
+    results = {}
+    for name, body in fixtures.load():
+        results[name] = measure(main, board, body)
+    os.chdir(cwd)
+
+    try:
+        with open(BASELINE) as file:
+            stored = json.load(file)
+    except OSError:
+        stored = {}
+    baseline = stored.get(IMPLEMENTATION, {})
+
+    print(f"Data path benchmark on {IMPLEMENTATION}, {CYCLES} cycles per fixture")
+    regressions = compare(results, baseline)
+    if update:
+        stored[IMPLEMENTATION] = results
+        with open(BASELINE, "w") as file:
+            if tracemalloc:
+                json.dump(stored, file, indent=2, sort_keys=True)
+            else:  # MicroPython's json has no formatting options
+                json.dump(stored, file)
+        print("Baseline updated")
+        return 0
+    if regressions:
+        print(f"{regressions} fixture(s) regressed against the baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
@@ -0,0 +1,102 @@
+# bench_frame.py Binary board frames against JSON for the responses the LAN proxy serves.
+# Builds the proxy's JSON response and the equivalent board frame for each benchmark fixture, then
+# times and traces reading them three ways: ujson.loads of the whole JSON body (json on CPython),
+# the board's streaming darwin extractor, and board_frame's decoder. Checks the frame decodes to
+# the same services as the extractor reads from the JSON.
+#
+# Usage (from the repository root, CPython only):
+#   python tools/bench/bench_frame.py
+#
+# Released under the MIT license see LICENSE
+
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+
+import fixtures
+import board_frame
+import darwin
+import frame_encoder
+import proxy
+import records
+
+# Reads timed per fixture and method. The fastest is reported
+REPEATS = 50
+
+# Destinations the services are matched against, as a multi destination board would ask for
+DESTINATIONS = ["LBG", "ECR"]
+
+
+def measure(read):
+    ''' Returns (ms, peak bytes) of read(). Run once first so buffers allocated on first use aren't counted. '''
+    read()
+    best = None
+    for _ in range(REPEATS):
+        t = time.perf_counter()
+        read()
+        ms = (time.perf_counter() - t) * 1000
+        best = ms if best is None else min(best, ms)
+    tracemalloc.start()
+    read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def responses(body: bytes):
+    ''' Returns (store, JSON body, frame) for a Darwin response, as the proxy would serve them. '''
+    origin = proxy.Origin("BFR")
+    origin.destinations = list(DESTINATIONS)
+    found = darwin.read_services(io.BytesIO(body), origin.store, calls=list(DESTINATIONS)) is not None
+    origin.found = found
+    store = proxy._select(origin, DESTINATIONS, proxy.FETCH_ROWS)
+    generated = json.dumps(darwin.generated_at).encode()
+    json_body = b'{"generatedAt":' + generated + proxy._encode(origin, store, DESTINATIONS)
+    frame = frame_encoder.encode(store, found, darwin.generated_at)
+    return store, json_body, frame
+
+
+def main():
+    failures = 0
+    print(f"{'fixture':<18}{'services':>9}{'json B':>8}{'frame B':>8}"
+          f"{'loads ms':>10}{'peak B':>9}{'stream ms':>10}{'peak B':>9}{'frame ms':>10}{'peak B':>9}")
+    for name, body in fixtures.load():
+        store, json_body, frame = responses(body)
+        streamed = records.Records(proxy.FETCH_ROWS)
+        decoded = records.Records(proxy.FETCH_ROWS)
+        reader = board_frame.FrameReader(len(frame))
+
+        def loads():
+            json.loads(json_body)
+
+        def stream():
+            darwin.read_services(io.BytesIO(json_body), streamed, calls=DESTINATIONS)
+
+        def decode():
+            reader.read(io.BytesIO(frame))
+            reader.decode(decoded)
+
+        loads_ms, loads_peak = measure(loads)
+        stream_ms, stream_peak = measure(stream)
+        frame_ms, frame_peak = measure(decode)
+        status = ""
+        if decoded.to_list() != streamed.to_list() or list(decoded.calls[:decoded.count]) != list(streamed.calls[:streamed.count]):
+            status = "  MISMATCH"
+            failures += 1
+        print(f"{name:<18}{store.count:>9}{len(json_body):>8}{len(frame):>8}"
+              f"{loads_ms:>10.3f}{loads_peak:>9}{stream_ms:>10.3f}{stream_peak:>9}{frame_ms:>10.3f}{frame_peak:>9}{status}")
+    if failures:
+        print(f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# bench_gzip.py Compressed response check and benchmark against a local stand-in server.
+# Serves the benchmark fixtures from a local HTTP server that gzips the body when asked, and
+# reads them with the real http_client and darwin code in three modes: uncompressed, gzip, and
+# gzip requested from a server that ignores Accept-Encoding. Checks every mode extracts the same
+# services, and reports the bytes sent by the server, the decompressed size, the fetch time and
+# the connections opened.
+#
+# Usage (from the repository root, CPython only):
+#   python tools/bench/bench_gzip.py              unlimited link speed
+#   python tools/bench/bench_gzip.py --kbps 200   server sends at 200 kbit/s, like a weak Wi-Fi link
+#
+# Released under the MIT license see LICENSE
+
+import gzip
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+# The stubs provide utime etc. for the board modules
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+import fixtures
+import http_client
+import darwin
+import records
+
+# Requests per fixture and mode. The fastest is reported
+REPEATS = 5
+
+# (name, send Accept-Encoding: gzip, server compresses)
+MODES = (("plain", False, True), ("gzip", True, True), ("ignored", True, False))
+
+
+class Handler(BaseHTTPRequestHandler):
+    ''' Serves server.body for any path, gzipped if the request asks for it and server.compress is set. '''
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        body = server.body
+        gzipped = server.compress and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = server.gzipped
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if not server.rate:
+            self.wfile.write(body)
+            return
+        # Paced in 1 KB pieces to stand in for a slow link
+        for i in range(0, len(body), 1024):
+            piece = body[i:i + 1024]
+            self.wfile.write(piece)
+            self.wfile.flush()
+            time.sleep(len(piece) / server.rate)
+
+    def log_message(self, *args):
+        pass
+
+
+def fetch(client, url: str, accept_gzip: bool, store):
+    ''' Fetches and extracts the services into store. Returns (wire bytes, decoded bytes, ms). '''
+    headers = {"x-apikey": "bench"}
+    if accept_gzip:
+        headers["Accept-Encoding"] = "gzip"
+    t = time.perf_counter()
+    response = client.get(url, headers)
+    try:
+        body = response.body()
+        darwin.read_services(body, store)
+    finally:
+        response.close()
+    ms = (time.perf_counter() - t) * 1000
+    return response.length, body.length, ms
+
+
+def main():
+    args = sys.argv[1:]
+    kbps = float(args[args.index("--kbps") + 1]) if "--kbps" in args else 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.rate = kbps * 1000 / 8
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/LDBWS/api/20220120/GetDepBoardWithDetails/BFR"
+
+    # Silence the per request log lines
+    http_client.print = lambda *a, **k: None
+    failures = 0
+    print(f"{'fixture':<18}{'mode':<9}{'wire bytes':>11}{'decoded':>9}{'ms':>9}{'conns':>7}")
+    for name, body in fixtures.load():
+        server.body = body
+        server.gzipped = gzip.compress(body)
+        expected = None
+        for mode, accept_gzip, compress in MODES:
+            server.compress = compress
+            server.connections = 0
+            client = http_client.HTTPClient(keep_alive=True)
+            store = records.Records(150)
+            best = None
+            for _ in range(REPEATS):
+                wire, decoded, ms = fetch(client, url, accept_gzip, store)
+                best = ms if best is None else min(best, ms)
+            client.close()
+            result = store.to_list()
+            if expected is None:
+                expected = result
+            status = ""
+            if result != expected:
+                status = "  MISMATCH"
+                failures += 1
+            # Keep-alive must survive a gzip body, so one connection serves every request
+            if server.connections != 1:
+                status += f"  {server.connections} connections for {REPEATS} requests"
+                failures += 1
+            print(f"{name:<18}{mode:<9}{wire:>11}{decoded:>9}{best:>9.2f}{server.connections:>7}{status}")
+    server.shutdown()
+    if failures:
+        print(f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
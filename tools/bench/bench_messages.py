@@ -0,0 +1,124 @@
+# bench_messages.py Textbox renders of the delay and cancellation messages over a simulated day.
+# Replays a timetable with services every few minutes, some delayed or cancelled with reasons that
+# change now and then, through the real main.get_data, show_page and board refresh code. The board
+# polls every --interval seconds. Counts the textbox renders (each append or clear redraws it) and
+# how many of the reasons given for the services on the board were shown, and prints the renders
+# per hour. Reasons name where the disruption is, as Darwin's do, so most are different, and the
+# interned reasons table is checked to only hold those still referred to after each poll.
+#
+# Usage (from the repository root):
+#   python tools/bench/bench_messages.py [--hours 18] [--interval 180]
+#
+# Released under the MIT license see LICENSE
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+import fixtures
+import bench_data_path
+import records
+from gui.widgets import textbox
+
+# Services are timetabled every HEADWAY minutes from 05:00
+FIRST = 5 * 60
+HEADWAY = 6
+
+# Services listed in each response
+ROWS = 10
+
+
+def timetable(hours: float, seed: int = 7):
+    ''' Returns a list of [std, destination, delay in minutes or None if cancelled, reason or None,
+    change at, where the disruption is] '''
+    rnd = fixtures._Random(seed)
+    services = []
+    for std in range(FIRST, FIRST + int(hours * 60) + 120, HEADWAY):
+        name = rnd.choice(fixtures._STATIONS)[0]
+        state = rnd.random()
+        if state < 0.7:
+            services.append([std, name, 0, None, None, None])
+            continue
+        delay = None if state < 0.8 else rnd.randint(2, 25)
+        # The reason given for some disruptions changes before the train leaves
+        change = std - rnd.randint(5, 40) if rnd.random() < 0.3 else None
+        place = f" between {rnd.choice(fixtures._STATIONS)[0]} and {rnd.choice(fixtures._STATIONS)[0]}"
+        services.append([std, name, delay, rnd.choice(fixtures._REASONS), change, place])
+    return services
+
+
+def response(services, now: int):
+    ''' Darwin response at minutes past midnight now. '''
+    listed = []
+    for std, name, delay, reason, change, place in services:
+        departs = std + (delay or 0)
+        if departs < now:
+            continue
+        if reason is not None and change is not None and now >= change:
+            reason = fixtures._REASONS[(fixtures._REASONS.index(reason) + 1) % len(fixtures._REASONS)]
+        if delay is None:
+            etd = "Cancelled"
+        elif delay:
+            etd = fixtures._time(departs)
+        else:
+            etd = "On time"
+        service = {"std": fixtures._time(std), "etd": etd, "destination": [{"locationName": name, "crs": "XXX"}]}
+        if reason is not None:
+            service["cancelReason" if delay is None else "delayReason"] = reason + place
+        listed.append(service)
+        if len(listed) >= ROWS:
+            break
+    body = {"trainServices": listed or None, "generatedAt": "2024-05-01T" + fixtures._time(now) + ":00.0000000+01:00"}
+    return json.dumps(body).encode()
+
+
+def main():
+    args = sys.argv[1:]
+    hours = float(args[args.index("--hours") + 1]) if "--hours" in args else 18
+    interval = int(args[args.index("--interval") + 1]) if "--interval" in args else 180
+    cwd = os.getcwd()
+    main, board = bench_data_path.load_board("/tmp/epaper-bench-messages")
+    services = timetable(hours)
+    shown = set()
+    disrupted = set()
+    polls = 0
+    renders = textbox.renders[0]
+    largest = 0  # Most slots in the reasons table
+    t = FIRST * 60
+    while t < (FIRST + hours * 60) * 60:
+        now = t // 60
+        main.http = bench_data_path.ReplayClient(response(services, now))
+        data = main.get_data(main.url, main.api_key)
+        main.store_data(data)
+        main.show_page(board, data, 0)
+        main.board_state.refresh(main.ssd)
+        main.prune_strings()
+        largest = max(largest, len(records.REASONS))
+        polls += 1
+        # Reasons for the services on the board, and the messages that have been in the textbox
+        for i in range(min(data.count if data else 0, main.numRows)):
+            if data.reason[i] >= 0:
+                disrupted.add(data.std_text(i) + ": " + data.reason_text(i))
+        shown.update(board[-1].value())
+        t += interval
+    os.chdir(cwd)
+    renders = textbox.renders[0] - renders
+    reached = len(disrupted & shown)
+    print(f"{polls} polls over {hours:g} hours, every {interval} s")
+    print(f"Textbox renders: {renders}, {renders / hours:.1f} per hour")
+    print(f"Reasons given for services on the board: {len(disrupted)}, shown: {reached}")
+    print(f"Interned reasons table: at most {largest} slots")
+    # Each poll's services, the cached copy last written to flash and the textbox can each refer to a reason
+    if largest > 3 * ROWS:
+        print(f"The reasons table grew past {3 * ROWS} slots")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
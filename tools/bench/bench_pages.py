@@ -0,0 +1,90 @@
+# bench_pages.py Textbox renders with two destination pages.
+# Runs the board in multi destination mode (LBG and ECR) through the real main.get_data,
+# show_page and board refresh code, flipping between the two pages after every poll as the page
+# rotation does. Checks the textbox is only drawn when there is something new for it in two cases:
+# both pages have a delayed service with a reason, and one page has a delayed service while the
+# other has no trains. Each reason, and the no trains message, should be drawn once however many
+# times the pages flip.
+#
+# Usage (from the repository root):
+#   python tools/bench/bench_pages.py [--polls 5]
+#
+# Released under the MIT license see LICENSE
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+import bench_data_path
+from gui.widgets import textbox
+
+DESTINATIONS = ["LBG", "ECR"]
+
+# (name, services as (std, destination CRS, delay reason or None), textbox renders expected)
+CASES = (
+    ("both delayed", (("08:00", "LBG", "A signalling fault"), ("08:05", "ECR", "A broken down train")), 2),
+    ("one without trains", (("08:00", "LBG", "A signalling fault"), ("08:10", "LBG", None)), 2),
+)
+
+
+def response(services):
+    ''' Darwin response listing services, each calling at its destination. '''
+    listed = []
+    for std, crs, reason in services:
+        service = {"std": std, "etd": "08:20" if reason else "On time",
+                   "destination": [{"locationName": crs + " station", "crs": crs}],
+                   "subsequentCallingPoints": [{"callingPoint": [{"locationName": crs + " station", "crs": crs}]}]}
+        if reason:
+            service["delayReason"] = reason
+        listed.append(service)
+    return json.dumps({"generatedAt": "2024-05-01T07:55:00.0000000+01:00", "trainServices": listed}).encode()
+
+
+def reset(main, board):
+    ''' Empties the textbox and forgets the messages shown, as at power-on. '''
+    for store in main.message_stores:
+        store.clear()
+    for page in range(main.num_pages):
+        main.noTrains[page] = 0
+    main.board_state.clear_messages(board)
+    main.board_state.refresh(main.ssd)
+
+
+def main():
+    args = sys.argv[1:]
+    polls = int(args[args.index("--polls") + 1]) if "--polls" in args else 5
+    cwd = os.getcwd()
+    bench_data_path.CONFIG.pop("filterCrs", None)
+    bench_data_path.CONFIG["destinations"] = DESTINATIONS
+    main, board = bench_data_path.load_board("/tmp/epaper-bench-pages")
+    failures = 0
+    for name, services, expected in CASES:
+        reset(main, board)
+        main.http = bench_data_path.ReplayClient(response(services))
+        renders = textbox.renders[0]
+        for _ in range(polls):
+            data = main.get_data(main.url, main.api_key)
+            main.store_data(data)
+            for page in range(main.num_pages):
+                main.show_page(board, data, page)
+                main.board_state.refresh(main.ssd)
+        renders = textbox.renders[0] - renders
+        status = ""
+        if renders != expected:
+            status = f"  expected {expected}"
+            failures += 1
+        print(f"{name:<20}{polls} polls, {polls * main.num_pages} page flips, {renders} textbox renders{status}")
+        print(f"{'':<20}textbox: {board[-1].value()}")
+    os.chdir(cwd)
+    if failures:
+        print(f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# bench_parse.py Streaming extraction against the ujson.loads path it replaced.
+# For each benchmark fixture, times and measures the peak memory of reading the departures two
+# ways: the old get_data path, which decoded the whole body to a str (req.text), parsed it with
+# ujson.loads (json on CPython) and copied the displayed fields into a list of dicts, and
+# darwin.read_services streaming the body in 512 byte chunks into a records.Records store. Checks
+# both give the same departures.
+#
+# Usage (from the repository root):
+#   python tools/bench/bench_parse.py
+#   micropython tools/bench/bench_parse.py    unix port of MicroPython
+#
+# Released under the MIT license see LICENSE
+
+import gc
+import io
+import os
+import sys
+
+# MicroPython has no os.path, so paths are split by hand
+HERE = __file__.rpartition("/")[0] or "."
+if not HERE.startswith("/"):
+    HERE = os.getcwd() + "/" + HERE
+sys.path.insert(0, HERE)
+sys.path.insert(0, HERE + "/../..")
+
+import json
+import fixtures
+import darwin
+import records
+
+try:
+    import tracemalloc
+except ImportError:  # MicroPython
+    tracemalloc = None
+
+try:
+    from time import perf_counter
+except ImportError:  # MicroPython
+    from time import ticks_us
+
+    def perf_counter():
+        return ticks_us() / 1000000
+
+# Reads timed per fixture and method. The fastest is reported
+REPEATS = 10
+
+# Services kept by the store, the API's numRows limit
+CAPACITY = 150
+
+
+def loads(body: bytes):
+    ''' The get_data path before streaming: the body as a str, parsed whole, then the displayed fields copied out. '''
+    text = body.decode()
+    data = json.loads(text)
+    del text
+    services = []
+    for service in data.get("trainServices") or ():
+        info = {"std": service["std"], "destination": service["destination"][0]["locationName"], "etd": service["etd"]}
+        message = service.get("delayReason") or service.get("cancelReason")
+        if message is not None:
+            info["delayMessage"] = message
+        services.append(info)
+    return services
+
+
+def measure(read):
+    ''' Returns (ms, peak bytes) of read(). Run once first so buffers allocated on first use aren't counted. '''
+    read()
+    best = None
+    for _ in range(REPEATS):
+        gc.collect()
+        t = perf_counter()
+        read()
+        ms = (perf_counter() - t) * 1000
+        best = ms if best is None else min(best, ms)
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        read()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # With the collector off every allocation stays on the heap, so the growth is an upper bound on the peak
+        gc.disable()
+        before = gc.mem_alloc()
+        read()
+        peak = gc.mem_alloc() - before
+        gc.enable()
+    return best, peak
+
+
+def main():
+    failures = 0
+    store = records.Records(CAPACITY)
+    print(f"Parse benchmark on {sys.implementation.name}")
+    print(f"{'fixture':<22}{'services':>9}{'bytes':>9}{'loads ms':>10}{'peak B':>10}{'stream ms':>10}{'peak B':>9}{'peak ratio':>11}")
+    for name, body in fixtures.load():
+        old = [None]
+
+        def parse():
+            old[0] = None
+            old[0] = loads(body)
+
+        def stream():
+            darwin.read_services(io.BytesIO(body), store)
+
+        loads_ms, loads_peak = measure(parse)
+        stream_ms, stream_peak = measure(stream)
+        status = ""
+        if old[0][:CAPACITY] != store.to_list():
+            status = "  MISMATCH"
+            failures += 1
+        print(f"{name:<22}{store.count:>9}{len(body):>9}{loads_ms:>10.3f}{loads_peak:>10}{stream_ms:>10.3f}{stream_peak:>9}"
+              f"{loads_peak / max(stream_peak, 1):>10.0f}x{status}")
+    if failures:
+        print(f"{failures} fixture(s) gave different departures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
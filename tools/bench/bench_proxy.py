@@ -0,0 +1,148 @@
+# bench_proxy.py Load test of the LAN proxy (tools/proxy.py).
+# Runs a stand-in Darwin server, the proxy in front of it and a growing number of simulated
+# boards. Each board polls the proxy with If-None-Match like the firmware's proxy mode, reading
+# 200 responses with the real http_client and darwin code, or board_frame for binary frames. Each
+# number of boards is run once with JSON and once with frames. The departures change every few
+# seconds upstream. Reports the board requests served per second, how many were answered with
+# 304, and the upstream calls made against the calls the boards would have made directly.
+#
+# Usage (from the repository root, CPython only):
+#   python tools/bench/bench_proxy.py [--seconds 5] [--poll 0.05] [--interval 1]
+#
+# Released under the MIT license see LICENSE
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+
+import fixtures
+import http_client
+import darwin
+import records
+import proxy
+import board_frame
+
+# Boards simulated in each run
+BOARDS = (1, 5, 20, 50)
+
+# Seconds between changes of the upstream departures
+CHANGE_EVERY = 2
+
+# Response formats asked for in each run, as in proxyFrames
+FORMATS = ("json", "frame")
+
+
+class Upstream(BaseHTTPRequestHandler):
+    ''' Stand-in for Darwin. Serves one of two responses, switching every CHANGE_EVERY seconds. '''
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.calls += 1
+        body = server.bodies[int(time.monotonic() / CHANGE_EVERY) % 2]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def board(url: str, stop: float, poll: float, counts: list, lock, frame: bool = False):
+    ''' Polls the proxy until stop like a board in proxy mode, reading frames if frame is set.
+    counts is [requests, 304s, errors]. '''
+    client = http_client.HTTPClient(keep_alive=True)
+    store = records.Records(10)
+    reader = board_frame.FrameReader(board_frame.HEADER + 10 * 160) if frame else None
+    etag = None
+    requests = not_modified = errors = 0
+    while time.monotonic() < stop:
+        response = None
+        try:
+            response = client.get(url, {"If-None-Match": etag} if etag else {})
+            if response.status == 304:
+                not_modified += 1
+                # The board sets its clock from it
+                if not response.headers.get("x-generated-at"):
+                    errors += 1
+            elif response.status == 200:
+                # Interned strings are shared between the boards here, unlike on real boards
+                with lock:
+                    if frame:
+                        reader.read(response.body())
+                        reader.decode(store)
+                    else:
+                        darwin.read_services(response.body(), store)
+                etag = response.headers.get("etag")
+            else:
+                errors += 1
+            requests += 1
+        except Exception:
+            errors += 1
+            client.close()
+        finally:
+            if response is not None:
+                response.close()
+        time.sleep(poll)
+    client.close()
+    with lock:
+        counts[0] += requests
+        counts[1] += not_modified
+        counts[2] += errors
+
+
+def main():
+    args = sys.argv[1:]
+    seconds = float(args[args.index("--seconds") + 1]) if "--seconds" in args else 5
+    poll = float(args[args.index("--poll") + 1]) if "--poll" in args else 0.05
+    interval = float(args[args.index("--interval") + 1]) if "--interval" in args else 1
+
+    # The proxy and boards log every request
+    http_client.print = darwin.print = proxy.print = lambda *a, **k: None
+
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    upstream.daemon_threads = True
+    upstream.calls = 0
+    upstream.bodies = (fixtures.generate(50, seed=1), fixtures.generate(50, seed=2))
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    print(f"{seconds:g} s per run, boards poll every {poll:g} s, proxy polls upstream at most every {interval:g} s")
+    print(f"{'format':<7}{'boards':>6}{'requests':>10}{'req/s':>9}{'304s':>8}{'errors':>8}{'upstream':>10}{'direct':>8}{'saved':>8}")
+    for n, fmt in [(n, fmt) for n in BOARDS for fmt in FORMATS]:
+        lan = proxy.Proxy("bench", interval, f"http://127.0.0.1:{upstream.server_address[1]}/GetDepBoardWithDetails/")
+        server = proxy.serve(lan, 0, "127.0.0.1")
+        url = f"http://127.0.0.1:{server.server_address[1]}/departures/BFR/LBG?numRows=10"
+        if fmt == "frame":
+            url += "&format=frame"
+        upstream.calls = 0
+        counts = [0, 0, 0]
+        lock = threading.Lock()
+        stop = time.monotonic() + seconds
+        start = time.monotonic()
+        threads = [threading.Thread(target=board, args=(url, stop, poll, counts, lock, fmt == "frame")) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - start
+        server.shutdown()
+        server.server_close()
+        requests, not_modified, errors = counts
+        # Without the proxy every board request would have been an upstream call
+        saved = 1 - upstream.calls / requests if requests else 0
+        print(f"{fmt:<7}{n:>6}{requests:>10}{requests / elapsed:>9.0f}{not_modified:>8}{errors:>8}{upstream.calls:>10}{requests:>8}{saved:>8.1%}")
+    upstream.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# fixtures.py GetDepBoardWithDetails and GetDepartureBoard responses for the host-side benchmarks.
+# Recorded responses saved as fixtures/*.json are used as they are. Synthetic responses of
+# increasing size are generated with the same structure as the live API, including
+# subsequent calling points for every service, so the benchmark works without recordings.
+
+# Released under the MIT license see LICENSE
+
+import json
+import os
+
+# MicroPython has no os.path
+FIXTURE_DIR = (__file__.rpartition("/")[0] or ".") + "/fixtures"
+
+# Number of services in each generated response. 150 is the API's numRows limit.
+SIZES = (1, 10, 50, 150)
+
+_STATIONS = (
+    ("London Bridge", "LBG"), ("East Croydon", "ECR"), ("Gatwick Airport", "GTW"), ("Three Bridges", "TBD"),
+    ("Haywards Heath", "HHE"), ("Brighton", "BTN"), ("Ashford International", "AFK"), ("Sevenoaks", "SEV"),
+    ("Tonbridge", "TON"), ("Bedford", "BDM"), ("Luton Airport Parkway", "LTN"), ("St Albans City", "SAC"),
+    ("Farringdon", "ZFD"), ("St Pancras International", "STP"), ("Sutton (Surrey)", "SUO"), ("Wimbledon", "WIM"),
+)
+
+_REASONS = (
+    "This train has been delayed by a fault with the signalling system",
+    "This train has been cancelled because of a shortage of train crew",
+    "This train has been delayed by an earlier broken down train",
+    "This train has been delayed by overrunning engineering works",
+)
+
+
+class _Random:
+    ''' Small linear congruential generator, so the fixtures are the same on CPython and
+    MicroPython (which has no random.Random). '''
+
+    def __init__(self, seed: int):
+        self.state = seed
+
+    def random(self):
+        self.state = (self.state * 1103515245 + 12345) & 0x7FFFFFFF
+        return self.state / 0x80000000
+
+    def randint(self, a: int, b: int):
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, items):
+        return items[int(self.random() * len(items))]
+
+
+def _time(minutes: int):
+    return "%02d:%02d" % (minutes // 60 % 24, minutes % 60)
+
+
+def generate(services: int, calling_points: int = 12, seed: int = 1, details: bool = True):
+    ''' Returns a response body (bytes) with the given number of services. With details False the
+    response is a GetDepartureBoard one, without calling points. '''
+    rnd = _Random(seed + services)
+    start = 8 * 60
+    train_services = []
+    for n in range(services):
+        std = start + n * 2
+        dest_name, dest_crs = rnd.choice(_STATIONS)
+        state = rnd.random()
+        if state < 0.7:
+            etd = "On time"
+        elif state < 0.8:
+            etd = "Cancelled"
+        elif state < 0.85:
+            etd = "Delayed"
+        else:
+            etd = _time(std + rnd.randint(1, 20))
+        points = []
+        for p in range(calling_points):
+            name, crs = _STATIONS[(n + p) % len(_STATIONS)]
+            points.append({
+                "locationName": name, "crs": crs, "st": _time(std + 5 * (p + 1)),
+                "et": "On time", "at": None, "isCancelled": etd == "Cancelled", "length": 8,
+                "detachFront": False, "affectedByDiversion": False, "rerouteDelay": 0,
+            })
+        service = {
+            "subsequentCallingPoints": [{"callingPoint": points, "serviceType": "train", "serviceChangeRequired": False, "assocIsCancelled": False}],
+            "futureCancellation": False, "futureDelay": False,
+            "origin": [{"locationName": "London Blackfriars", "crs": "BFR", "via": None, "futureChangeTo": None, "assocIsCancelled": False}],
+            "destination": [{"locationName": dest_name, "crs": dest_crs, "via": None, "futureChangeTo": None, "assocIsCancelled": False}],
+            "currentOrigins": None, "currentDestinations": None,
+            "std": _time(std), "etd": etd, "sta": None, "eta": None, "platform": str(rnd.randint(1, 4)),
+            "operator": "Thameslink", "operatorCode": "TL", "isCircularRoute": False,
+            "isCancelled": etd == "Cancelled", "filterLocationCancelled": False, "serviceType": "train",
+            "length": 8, "detachFront": False, "isReverseFormation": False,
+            "cancelReason": rnd.choice(_REASONS) if etd == "Cancelled" else None,
+            "delayReason": rnd.choice(_REASONS) if etd not in ("On time", "Cancelled") else None,
+            "serviceID": "%07d" % (1000000 + n), "adhocAlerts": None, "rsid": None,
+        }
+        if not details:
+            del service["subsequentCallingPoints"]
+        train_services.append(service)
+    body = {
+        "trainServices": train_services, "busServices": None, "ferryServices": None,
+        "generatedAt": "2024-05-01T07:58:12.1234567+01:00", "locationName": "London Blackfriars",
+        "crs": "BFR", "filterLocationName": None, "filtercrs": None, "filterType": "to",
+        "nrccMessages": [{"Value": "Disruption between London Bridge and East Croydon."}],
+        "platformAvailable": True, "areServicesAvailable": True,
+    }
+    return json.dumps(body).encode()
+
+
+def load():
+    ''' Returns a list of (name, body) fixtures. Recorded fixtures come first, then generated ones. '''
+    fixtures = []
+    try:
+        recorded = sorted(os.listdir(FIXTURE_DIR))
+    except OSError:
+        recorded = []
+    for name in recorded:
+        if name.endswith(".json"):
+            with open(FIXTURE_DIR + "/" + name, "rb") as file:
+                fixtures.append((name[:-5], file.read()))
+    for size in SIZES:
+        fixtures.append((f"generated_{size}", generate(size)))
+    # Lean requests (leanRequests in config.json)
+    for size in SIZES:
+        fixtures.append((f"lean_{size}", generate(size, details=False)))
+    return fixtures
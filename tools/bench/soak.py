@@ -0,0 +1,245 @@
+# soak.py Heap fragmentation soak test of the poll cycle.
+# Runs thousands of poll cycles through the real http_client, darwin, main.get_data, store_data,
+# show_page and board refresh code, answering each request with the next of a set of responses of
+# different sizes, sent with a content length or chunked, and uncompressed or gzip compressed as
+# with compressResponses. Every --every cycles the total free heap and the largest block that can
+# still be allocated are sampled. Long uptimes fail when the largest free block shrinks, not when
+# the total runs out, so the two are written to a CSV file and charted side by side in an SVG file.
+# Each gzip response allocates a 32 KB window while it is read, so the lowest largest free block is
+# checked against it.
+#
+# --encoding identity or gzip sends only uncompressed or only compressed responses, to compare
+# against the default, which alternates them.
+#
+# --text also reads each response body whole into a new str that is kept until the next poll, as
+# urequests' req.text did before responses were streamed, to compare against. Only uncompressed
+# responses are sent with it.
+#
+# Usage (from the repository root):
+#   micropython -X heapsize=192k tools/bench/soak.py [--cycles 5000] [--every 50] [--out soak] [--text] [--encoding identity|gzip]
+#   python tools/bench/soak.py [...]    CPython has no free heap to measure, the bytes allocated are charted instead
+#
+# Released under the MIT license see LICENSE
+
+import gc
+import io
+import os
+import sys
+
+# MicroPython has no os.path, so paths are split by hand
+HERE = __file__.rpartition("/")[0] or "."
+if not HERE.startswith("/"):
+    HERE = os.getcwd() + "/" + HERE
+sys.path.insert(0, HERE)
+sys.path.insert(0, HERE + "/..")
+sys.path.insert(0, HERE + "/../..")
+# The stubs shadow network, machine, utime etc. and must come first
+sys.path.insert(0, HERE + "/stubs")
+
+import fixtures
+import bench_data_path
+import http_client
+import profiler
+
+try:
+    import tracemalloc
+except ImportError:  # MicroPython
+    tracemalloc = None
+
+# (services, detailed) of each response, sent in turn. Each is generated with a few seeds so
+# consecutive responses of the same size differ
+RESPONSES = ((4, False), (10, False), (20, False), (35, False), (4, True), (10, True))
+SEEDS = 3
+
+# Size of the chunks of chunked responses, varied so the chunk lines fall in different places
+CHUNKS = (0, 700, 1500)
+
+# Content encodings of the responses, alternated unless --encoding picks one
+ENCODINGS = ("identity", "gzip")
+
+# Decompression window allocated for each gzip response
+GZIP_WINDOW = 32768
+
+
+def _gzip(body: bytes):
+    ''' Returns body gzip compressed. '''
+    try:
+        import gzip
+        return gzip.compress(body)
+    except ImportError:  # MicroPython
+        import deflate
+        out = io.BytesIO()
+        with deflate.DeflateIO(out, deflate.GZIP) as stream:
+            stream.write(body)
+        return out.getvalue()
+
+
+def _response(body: bytes, chunk: int, encoding: str = "identity"):
+    ''' The raw HTTP response of body, with a content length or in chunks of chunk bytes, gzip
+    compressed if encoding is "gzip". '''
+    head = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    if encoding == "gzip":
+        body = _gzip(body)
+        head += b"Content-Encoding: gzip\r\n"
+    if not chunk:
+        return head + b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+    parts = [head + b"Transfer-Encoding: chunked\r\n\r\n"]
+    for i in range(0, len(body), chunk):
+        part = body[i:i + chunk]
+        parts.append(("%x\r\n" % len(part)).encode() + part + b"\r\n")
+    parts.append(b"0\r\n\r\n")
+    return b"".join(parts)
+
+
+def responses(encodings=ENCODINGS):
+    ''' Returns the list of raw responses to send, in each of encodings in turn. '''
+    raw = []
+    for seed in range(1, SEEDS + 1):
+        for services, detailed in RESPONSES:
+            body = fixtures.generate(services, seed=seed, details=detailed)
+            for encoding in encodings:
+                # Every encoding is sent both with a content length and chunked over the seeds
+                raw.append(_response(body, CHUNKS[(len(raw) // len(encodings)) % len(CHUNKS)], encoding))
+    return raw
+
+
+class Wire:
+    ''' Stands in for the socket, reading back the response loaded for each request. '''
+
+    def __init__(self):
+        self._in = None
+
+    def load(self, raw: bytes):
+        self._in = io.BytesIO(raw)
+
+    def write(self, data):
+        return len(data)
+
+    def readinto(self, buf):
+        return self._in.readinto(buf)
+
+    def close(self):
+        pass
+
+
+class SoakClient(http_client.HTTPClient):
+    ''' The real HTTP client, connected to a Wire instead of a socket. '''
+
+    def __init__(self, raw, text: bool = False, buffer_size: int = http_client.RECEIVE_BUFFER):
+        super().__init__(buffer_size=buffer_size)
+        self.raw = raw
+        self.text = text
+        self.body_text = None
+        self.wire = Wire()
+        self.polls = 0
+
+    def _connect(self, tls: bool, host: str, port: int):
+        self.close()
+        self._sock = self._f = self.wire
+        self._target = (tls, host, port)
+
+    def get(self, url: str, headers: dict = {}):
+        raw = self.raw[self.polls % len(self.raw)]
+        self.polls += 1
+        if self.text:
+            # The body as one new str of the response's size, as req.text made
+            self.body_text = None
+            self.body_text = raw[raw.find(b"\r\n\r\n") + 4:].decode()
+        self.wire.load(raw)
+        return super().get(url, headers)
+
+
+def _sample():
+    ''' Returns (free heap, largest free block, bytes allocated) after a collection. -1 if unknown. '''
+    gc.collect()
+    if tracemalloc:
+        return -1, -1, tracemalloc.get_traced_memory()[0]
+    return gc.mem_free(), profiler.largest_free_block(), gc.mem_alloc()
+
+
+def chart(samples, path: str):
+    ''' Writes an SVG line chart of the samples, (cycle, free, block, allocated) tuples, to path. '''
+    width, height, margin = 800, 400, 50
+    if samples[0][1] >= 0:
+        series = (("free heap", 1, "#1f77b4"), ("largest free block", 2, "#d62728"))
+    else:
+        series = (("bytes allocated", 3, "#1f77b4"),)
+    top = max(max(s[k] for s in samples) for _, k, _ in series) or 1
+    last = samples[-1][0] or 1
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" font-size="12">',
+           f'<rect width="{width}" height="{height}" fill="white"/>',
+           f'<line x1="{margin}" y1="{height - margin}" x2="{width - margin}" y2="{height - margin}" stroke="black"/>',
+           f'<line x1="{margin}" y1="{margin}" x2="{margin}" y2="{height - margin}" stroke="black"/>',
+           f'<text x="{margin}" y="{margin - 10}">{top} bytes</text>',
+           f'<text x="{width - margin}" y="{height - margin + 20}" text-anchor="end">{last} cycles</text>']
+    for n in range(len(series)):
+        name, k, colour = series[n]
+        points = " ".join(f"{margin + s[0] * (width - 2 * margin) // last},{height - margin - s[k] * (height - 2 * margin) // top}" for s in samples)
+        out.append(f'<polyline points="{points}" fill="none" stroke="{colour}" stroke-width="1.5"/>')
+        out.append(f'<text x="{width - margin}" y="{margin + 16 * n}" text-anchor="end" fill="{colour}">{name}</text>')
+    out.append("</svg>")
+    with open(path, "w") as file:
+        file.write("\n".join(out))
+
+
+def main():
+    args = sys.argv[1:]
+    cycles = int(args[args.index("--cycles") + 1]) if "--cycles" in args else 5000
+    every = int(args[args.index("--every") + 1]) if "--every" in args else 50
+    out = args[args.index("--out") + 1] if "--out" in args else "soak"
+    if not out.startswith("/"):
+        out = os.getcwd() + "/" + out
+    text = "--text" in args
+    # req.text was only ever made of uncompressed bodies
+    encodings = (args[args.index("--encoding") + 1],) if "--encoding" in args else ("identity",) if text else ENCODINGS
+    if text and encodings != ("identity",):
+        print("--text only works with --encoding identity")
+        return 2
+
+    cwd = os.getcwd()
+    main, board = bench_data_path.load_board("/tmp/epaper-soak")
+    main.http = SoakClient(responses(encodings), text)
+    if tracemalloc:
+        tracemalloc.start()
+    samples = [(0,) + _sample()]
+    failed = None
+    for n in range(1, cycles + 1):
+        try:
+            data = main.get_data(main.url, main.api_key)
+            main.store_data(data)
+            main.show_page(board, data, 0)
+            main.board_state.refresh(main.ssd)
+            main.prune_strings()
+        except MemoryError:
+            failed = n
+            break
+        if n % every == 0:
+            samples.append((n,) + _sample())
+    if tracemalloc:
+        tracemalloc.stop()
+    os.chdir(cwd)
+
+    with open(out + ".csv", "w") as file:
+        file.write("cycle,free,largest_block,allocated\n")
+        for s in samples:
+            file.write(",".join(str(v) for v in s) + "\n")
+    chart(samples, out + ".svg")
+
+    first, end = samples[0], samples[-1]
+    print(f"Soak test on {sys.implementation.name}, {samples[-1][0]} cycles, {' and '.join(encodings)} responses" + (", req.text bodies" if text else ""))
+    if first[1] >= 0:
+        lowest = min(s[2] for s in samples)
+        print(f"Free heap: {first[1]} -> {end[1]} bytes, lowest {min(s[1] for s in samples)}")
+        print(f"Largest free block: {first[2]} -> {end[2]} bytes, lowest {lowest}")
+        if "gzip" in encodings and lowest < GZIP_WINDOW:
+            print(f"The largest free block fell below the {GZIP_WINDOW} byte gzip window, so compressResponses risks a MemoryError")
+    print(f"Allocated: {first[3]} -> {end[3]} bytes, highest {max(s[3] for s in samples)}")
+    print(f"Written {out}.csv and {out}.svg")
+    if failed:
+        print(f"MemoryError at cycle {failed}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# Stub display for host-side benchmarks. Counts refreshes instead of driving a panel.
+
+
+class StubDisplay:
+    width = 480
+    height = 280
+
+    def __init__(self):
+        self.demo_mode = False
+        self._buffer = bytearray(self.width * self.height // 8)
+        self.busy_ms = 0
+        self.show_ms = 0
+        self.show_bytes = 0
+        self.shows = 0
+        self.asleep = False
+
+    def show(self):
+        self.shows += 1
+
+    def ready(self):
+        return True
+
+    async def wait(self):
+        pass
+
+    def fill(self, c):
+        pass
+
+    def fill_rect(self, x, y, w, h, c):
+        pass
+
+    def text(self, s, x, y, c=1):
+        pass
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        pass
+
+    def sleep(self, retain=False):
+        self.asleep = True
+
+    def wake(self):
+        self.asleep = False
+
+    def init(self):
+        pass
+
+
+asyn = False
+config = None  # main.py reads config.json itself
+ssd = StubDisplay()
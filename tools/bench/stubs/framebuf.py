@@ -0,0 +1,61 @@
+# Stub of the MicroPython framebuf module for host-side benchmarks. Only MONO_VLSB and
+# MONO_HLSB pixel access is implemented.
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, mode, stride=None):
+        self._fb_buf = buffer
+        self._fb_w = width
+        self._fb_h = height
+        self._fb_mode = mode
+
+    def _index(self, x, y):
+        if self._fb_mode == MONO_VLSB:
+            return (y >> 3) * self._fb_w + x, 1 << (y & 7)
+        return (y * self._fb_w + x) >> 3, 0x80 >> (x & 7)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._fb_w and 0 <= y < self._fb_h):
+            return None
+        i, bit = self._index(x, y)
+        if c is None:
+            return int(bool(self._fb_buf[i] & bit))
+        if c:
+            self._fb_buf[i] |= bit
+        else:
+            self._fb_buf[i] &= ~bit & 0xFF
+
+    def fill(self, c):
+        value = 0xFF if c else 0
+        for i in range(len(self._fb_buf)):
+            self._fb_buf[i] = value
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(0, y), min(self._fb_h, y + h)):
+            for xx in range(max(0, x), min(self._fb_w, x + w)):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._fb_h):
+            for xx in range(fbuf._fb_w):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
+
+    def text(self, s, x, y, c=1):
+        pass
@@ -0,0 +1,5 @@
+# Stub of the NanoGUI refresh function for host-side benchmarks.
+
+
+def refresh(device, clear=False):
+    device.show()
@@ -0,0 +1,19 @@
+# Stub of the NanoGUI Writer for host-side benchmarks. Characters are a fixed 12 pixels wide.
+
+
+class Writer:
+    def __init__(self, device, font, verbose=True):
+        self.device = device
+        self.font = font
+
+    def stringlen(self, string, oh=False):
+        return 12 * len(string)
+
+    def set_clip(self, row_clip=None, col_clip=None, wrap=None):
+        pass
+
+    def set_textpos(self, device, row=None, col=None):
+        pass
+
+    def printstring(self, string, invert=False):
+        pass
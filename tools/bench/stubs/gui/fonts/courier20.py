@@ -0,0 +1,26 @@
+# Stub of the courier20 font for host-side benchmarks. Every glyph is a 12 pixel wide box.
+_GLYPH = bytes([0xFF, 0xFF, 0x0F] + [0x01, 0x00, 0x08] * 10 + [0xFF, 0xFF, 0x0F])
+
+
+def height():
+    return 20
+
+
+def max_width():
+    return 12
+
+
+def hmap():
+    return False
+
+
+def reverse():
+    return False
+
+
+def monospaced():
+    return True
+
+
+def get_ch(ch):
+    return memoryview(_GLYPH), 20, 12
@@ -0,0 +1,18 @@
+# Stub of the NanoGUI Label for host-side benchmarks. Counts renders.
+renders = [0]
+
+
+class Label:
+    def __init__(self, writer, row, col, text, invert=False, fgcolor=None, bgcolor=None, bdcolor=False, align=0):
+        self.text = text if isinstance(text, str) else ""
+        self.row = row
+        self.col = col
+        self.width = text if isinstance(text, int) else writer.stringlen(text)
+        self.height = 20
+        renders[0] += 1
+
+    def value(self, text=None, invert=False, fgcolor=None, bgcolor=None, bdcolor=None, align=None):
+        if text is not None:
+            self.text = text
+            renders[0] += 1
+        return self.text
@@ -0,0 +1,23 @@
+# Stub of the NanoGUI Textbox for host-side benchmarks. Counts renders.
+renders = [0]
+
+
+class Textbox:
+    def __init__(self, writer, row, col, width, nlines, clip=True, **kwargs):
+        self.lines = []
+
+    def append(self, s, ntrim=None, line=None):
+        self.lines.append(s)
+        if ntrim is not None:
+            del self.lines[:-ntrim]
+        renders[0] += 1
+
+    def clear(self):
+        self.lines = []
+        renders[0] += 1
+
+    def scroll(self, n):
+        pass
+
+    def value(self):
+        return self.lines
@@ -0,0 +1,47 @@
+# Stub of the MicroPython machine module for host-side benchmarks.
+_rtc = [None]
+
+
+class RTC:
+    def datetime(self, t=None):
+        if t is None:
+            return _rtc[0]
+        _rtc[0] = t
+
+
+class Pin:
+    OUT = 1
+    IN = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, *args, **kwargs):
+        self._value = 0
+
+    def __call__(self, value=None):
+        if value is not None:
+            self._value = value
+        return self._value
+
+    def value(self, value=None):
+        return self(value)
+
+
+class SPI:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        pass
+
+
+def lightsleep(ms=None):
+    pass
+
+
+def deepsleep(ms=None):
+    pass
+
+
+def reset():
+    pass
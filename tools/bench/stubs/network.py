@@ -0,0 +1,36 @@
+# Stub of the MicroPython network module for host-side benchmarks. Always connected.
+STA_IF = 0
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self._active = False
+
+    def active(self, value=None):
+        if value is not None:
+            self._active = value
+        return self._active
+
+    def connect(self, ssid, password, **kwargs):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self):
+        return True
+
+    def ifconfig(self, config=None):
+        return ("192.168.0.2", "255.255.255.0", "192.168.0.1", "192.168.0.1")
+
+    def config(self, *args, **kwargs):
+        return None
+
+    def scan(self):
+        return []
+
+    def status(self, *args):
+        return 3
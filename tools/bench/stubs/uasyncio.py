@@ -0,0 +1,6 @@
+# Stub of the MicroPython uasyncio module for host-side benchmarks.
+from asyncio import *
+
+
+async def sleep_ms(ms):
+    await sleep(ms / 1000)
@@ -0,0 +1,2 @@
+# Stub of the MicroPython ujson module for host-side benchmarks.
+from json import dump, dumps, load, loads
@@ -0,0 +1,43 @@
+# Stub of the MicroPython utime module for host-side benchmarks. Sleeps return immediately
+# so retry and poll delays don't slow the benchmark down.
+import time as _time
+import machine as _machine
+
+
+def ticks_ms():
+    return int(_time.perf_counter() * 1000)
+
+
+def ticks_us():
+    return int(_time.perf_counter() * 1000000)
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, b):
+    return a + b
+
+
+def sleep(s):
+    pass
+
+
+def sleep_ms(ms):
+    pass
+
+
+def sleep_us(us):
+    pass
+
+
+def time():
+    return int(_time.time())
+
+
+def localtime(secs=None):
+    rtc = _machine._rtc[0]
+    if rtc is None:
+        return (2021, 1, 1, 0, 0, 0, 4, 1)
+    return (rtc[0], rtc[1], rtc[2], rtc[4], rtc[5], rtc[6], rtc[3], 1)
@@ -0,0 +1,404 @@
+# epd_emulator.py Emulator of the Pico-ePaper-3.7 panel for testing drivers/ePaper3in7.py on Linux.
+# Fake SPI and Pin objects record every command and data byte the driver sends from init, show,
+# _as_show and sleep. The SSD1677 RAM is rebuilt from the captured writes (window, address
+# counters and data entry as the driver sets them up), and the image shown at each refresh is
+# written to a PNG in the driver's orientation, undoing the landscape transpose and the
+# inversion hack. The RAM auto writes (0x46, 0x47) fill the RAM with the pattern their data byte
+# selects, and deep sleep mode 2 clears it, so a wake that loses the RAM shows up as pixels that
+# differ from the framebuffer. Each refresh reports the bytes transferred, CS toggles, SPI writes, an
+# estimate of the transfer time on a Pico and the simulated busy time of the panel.
+#
+# Usage (CPython, from the repository root):
+#   python tools/epd_emulator.py [--portrait] [--async] [--per-byte-cs] [--full] [--out DIR]
+#
+# Released under the MIT license see LICENSE
+
+import os
+import struct
+import sys
+import time
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+# framebuf for CPython
+sys.path.insert(0, os.path.join(HERE, "bench", "stubs"))
+
+# Panel RAM size in pixels and bytes per RAM row
+RAM_W = 280
+RAM_H = 480
+RAM_ROW = RAM_W // 8
+
+# Simulated busy time in ms for each command that starts a panel operation, with the number of
+# data bytes it takes first. Refresh times are looked up by waveform, 3 s for the full GC update
+# and 0.3 s for the DU partial update.
+BUSY_MS = {0x12: (0, 10), 0x46: (1, 20), 0x47: (1, 20)}
+REFRESH_MS = {"GC": 3000, "DU": 300}
+
+# Pico SPI transfer model used for the time estimate: the bus rate set in color_setup.py, and
+# the MicroPython overhead of each spi.write() call and each Pin call.
+BAUDRATE = 4_000_000
+WRITE_US = 12
+PIN_US = 4
+
+
+class Clock:
+    ''' Virtual time. Real time passes as normal, sleeps return at once and are added on, so
+    busy waits take no real time but show up in ticks_ms. '''
+
+    def __init__(self):
+        self.offset_us = 0
+
+    def ticks_us(self):
+        return int(time.perf_counter() * 1_000_000) + self.offset_us
+
+    def ticks_ms(self):
+        return self.ticks_us() // 1000
+
+    def sleep_ms(self, ms):
+        self.offset_us += int(ms * 1000)
+
+    def install(self):
+        ''' Adds the MicroPython time functions the driver imports to CPython's time module, and
+        an asyncio based uasyncio whose sleeps use the virtual clock. '''
+        time.ticks_us = self.ticks_us
+        time.ticks_ms = self.ticks_ms
+        time.ticks_diff = lambda a, b: a - b
+        time.sleep_ms = self.sleep_ms
+        import asyncio
+        import types
+        uasyncio = types.ModuleType("uasyncio")
+        uasyncio.__dict__.update({k: getattr(asyncio, k) for k in ("Event", "create_task", "run", "gather", "Lock")})
+
+        async def sleep(s):
+            self.sleep_ms(s * 1000)
+            await asyncio.sleep(0)
+
+        async def sleep_ms(ms):
+            self.sleep_ms(ms)
+            await asyncio.sleep(0)
+
+        uasyncio.sleep = sleep
+        uasyncio.sleep_ms = sleep_ms
+        sys.modules["uasyncio"] = uasyncio
+
+
+class Stats:
+    ''' Counters for the traffic between two refreshes. '''
+
+    def __init__(self):
+        self.bytes = 0  # All bytes, commands and data
+        self.ram_bytes = 0  # Bytes written to the black/white RAM (0x24)
+        self.commands = 0
+        self.writes = 0  # spi.write() calls
+        self.cs_toggles = 0  # CS assertions
+        self.pin_calls = 0  # CS and DC writes
+        self.busy_ms = 0  # Simulated busy time
+
+    def transfer_ms(self):
+        ''' Estimated time for the Pico to send this traffic. '''
+        us = self.bytes * 8 * 1_000_000 / BAUDRATE + self.writes * WRITE_US + self.pin_calls * PIN_US
+        return us / 1000
+
+
+class Panel:
+    ''' SSD1677 model. Decodes the SPI traffic into commands, keeps the RAM and records a frame
+    each time a refresh is started. '''
+
+    def __init__(self, clock: Clock, luts: dict = None):
+        self.clock = clock
+        self.luts = luts or {}  # Waveform bytes to name, e.g. {EPD_3IN7_lut_1Gray_GC: "GC"}
+        self.ram = bytearray(RAM_ROW * RAM_H)  # Black/white RAM
+        self.red = bytearray(RAM_ROW * RAM_H)  # Red RAM, not shown by the driver's waveforms
+        self.dc = 0
+        self.cs = 1
+        self.asleep = False
+        self.busy_until = 0
+        self.lut = b""
+        self._cmd = None
+        self._args = bytearray()
+        self.x0, self.x1, self.y0, self.y1 = 0, RAM_W - 1, 0, RAM_H - 1
+        self.x = self.y = 0
+        self.stats = Stats()
+        self.refreshes = []  # (kind, Stats, RAM copy, command log) for each refresh
+        self.errors = []
+        self.log = []  # (command, number of data bytes) since the last refresh
+
+    # Pins
+    def set_cs(self, v):
+        self.stats.pin_calls += 1
+        if v == 0 and self.cs == 1:
+            self.stats.cs_toggles += 1
+        self.cs = v
+
+    def set_dc(self, v):
+        self.stats.pin_calls += 1
+        self.dc = v
+
+    def set_rst(self, v):
+        if v == 0:
+            # Hardware reset wakes the controller from deep sleep
+            self.asleep = False
+
+    def busy(self):
+        return 1 if self.clock.ticks_ms() < self.busy_until else 0
+
+    # SPI
+    def write(self, buf):
+        data = bytes(buf)
+        stats = self.stats
+        stats.writes += 1
+        stats.bytes += len(data)
+        if self.cs:
+            self.errors.append("write with CS high")
+            return
+        if self.asleep:
+            self.errors.append(f"write in deep sleep (cmd {self._cmd})")
+            return
+        if self.busy():
+            self.errors.append(f"write while busy (cmd {self._cmd})")
+        for v in data:
+            if self.dc == 0:
+                self._command(v)
+            else:
+                self._data(v)
+
+    def _start_busy(self, ms):
+        self.busy_until = self.clock.ticks_ms() + ms
+        self.stats.busy_ms += ms
+
+    def _command(self, v):
+        self._end_command()
+        self._cmd = v
+        self._args = bytearray()
+        self.stats.commands += 1
+        if v in BUSY_MS and BUSY_MS[v][0] == 0:
+            self._start_busy(BUSY_MS[v][1])
+        elif v == 0x20:  # Display refresh
+            kind = self.luts.get(self.lut, "LUT")
+            self._start_busy(REFRESH_MS.get(kind, REFRESH_MS["GC"]))
+            self.refreshes.append((kind, self.stats, bytes(self.ram), self.log))
+            self.stats = Stats()
+            self.log = []
+
+    def _end_command(self):
+        if self._cmd is None:
+            return
+        a = self._args
+        if self._cmd == 0x32:
+            self.lut = bytes(a)
+        self.log.append((self._cmd, len(a)))
+        self._cmd = None
+
+    def _auto_write(self, ram: bytearray, v: int):
+        ''' Fills ram with the regular pattern of an auto write: a checkerboard of steps 8 << A[6:4]
+        rows high and 8 << A[2:0] pixels wide whose first step is A[7]. Steps larger than the panel
+        fill the whole RAM with A[7], as the driver's 0xF7 does. '''
+        height = 8 << (v >> 4 & 7)
+        width = 8 << (v & 7)
+        first = v >> 7
+        for y in range(RAM_H):
+            for i in range(RAM_ROW):
+                # Steps are at least 8 pixels wide so each byte is all one value
+                ram[y * RAM_ROW + i] = 0xFF if first ^ (i * 8 // width + y // height) & 1 else 0
+
+    def _data(self, v):
+        cmd = self._cmd
+        a = self._args
+        a.append(v)
+        if cmd in BUSY_MS and len(a) == BUSY_MS[cmd][0]:
+            self._start_busy(BUSY_MS[cmd][1])
+            if cmd == 0x46:
+                self._auto_write(self.red, v)
+            elif cmd == 0x47:
+                self._auto_write(self.ram, v)
+        elif cmd == 0x10 and v & 3:  # Deep sleep until the next hardware reset
+            self.asleep = True
+            if v & 3 == 3:
+                # Mode 2 doesn't keep the RAM
+                self.ram = bytearray(len(self.ram))
+        elif cmd == 0x44 and len(a) == 4:  # RAM X window
+            self.x0, self.x1 = a[0] | a[1] << 8, a[2] | a[3] << 8
+        elif cmd == 0x45 and len(a) == 4:  # RAM Y window
+            self.y0, self.y1 = a[0] | a[1] << 8, a[2] | a[3] << 8
+        elif cmd == 0x4E and len(a) == 2:  # X address counter
+            self.x = a[0] | a[1] << 8
+        elif cmd == 0x4F and len(a) == 2:  # Y address counter
+            self.y = a[0] | a[1] << 8
+        elif cmd == 0x24:
+            # Data entry mode 0x03 as set by init: X increments first, then Y, wrapping in the window
+            self.stats.ram_bytes += 1
+            if self.y < RAM_H and self.x < RAM_W:
+                self.ram[self.y * RAM_ROW + self.x // 8] = v
+            else:
+                self.errors.append(f"RAM write outside panel at x {self.x} y {self.y}")
+            self.x += 8
+            if self.x > self.x1:
+                self.x = self.x0
+                self.y += 1
+                if self.y > self.y1:
+                    self.y = self.y0
+            # The driver's data bytes after 0x24 aren't kept as arguments
+            a.pop()
+
+
+class Pin:
+    ''' Output or input pin backed by a Panel method. '''
+
+    def __init__(self, func=None, read=None):
+        self._func = func
+        self._read = read
+
+    def __call__(self, v=None):
+        if v is None:
+            return self._read() if self._read else 0
+        if self._func:
+            self._func(v)
+        return 0
+
+
+def pixels(ram: bytes, landscape: bool):
+    ''' Returns the panel image as rows of 0 (black) and 1 (white) in the driver's orientation.
+    The driver sends inverted bytes, so a white pixel is a 1 in RAM and a 0 in the framebuffer. '''
+    def bit(x, y):  # Panel pixel, MSB first in each byte
+        return ram[y * RAM_ROW + x // 8] >> (7 - (x & 7)) & 1
+    if landscape:
+        # Framebuffer column x is panel row x, framebuffer row y is panel column 279 - y
+        return [[bit(RAM_W - 1 - y, x) for x in range(RAM_H)] for y in range(RAM_W)]
+    return [[bit(x, y) for x in range(RAM_W)] for y in range(RAM_H)]
+
+
+def write_png(path: str, rows):
+    ''' Writes rows of 0/1 pixels as a 1 bit greyscale PNG. '''
+    height = len(rows)
+    width = len(rows[0])
+    raw = bytearray()
+    for row in rows:
+        raw.append(0)  # No filter
+        for i in range(0, width, 8):
+            b = 0
+            for j in range(8):
+                b = b << 1 | (row[i + j] if i + j < width else 0)
+            raw.append(b)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(bytes(raw))))
+        file.write(chunk(b"IEND", b""))
+
+
+class Emulator:
+    ''' Builds an EPD from drivers/ePaper3in7.py wired to an emulated panel. Keyword arguments are
+    passed to the EPD constructor. '''
+
+    def __init__(self, verbose: bool = False, **kwargs):
+        self.clock = Clock()
+        self.clock.install()
+        from drivers import ePaper3in7
+        if not verbose:
+            ePaper3in7.print = lambda *args, **kw: None
+        luts = {ePaper3in7.EPD_3IN7_lut_1Gray_GC: "GC", ePaper3in7.EPD_3IN7_lut_1Gray_DU: "DU"}
+        self.panel = panel = Panel(self.clock, luts)
+        self.landscape = kwargs.get("landscape", False)
+        self.epd = ePaper3in7.EPD(panel, Pin(panel.set_cs), Pin(panel.set_dc), Pin(panel.set_rst),
+                                  Pin(read=panel.busy), **kwargs)
+        self.init_stats = panel.stats  # Traffic from the constructor's init()
+        panel.stats = Stats()
+        self._reported = 0
+
+    def image(self, ram: bytes = None):
+        ''' Returns the rows of the panel image, by default of the current RAM. '''
+        return pixels(self.panel.ram if ram is None else ram, self.landscape)
+
+    def mismatches(self, ram: bytes = None):
+        ''' Number of pixels where the panel image differs from the framebuffer. '''
+        epd = self.epd
+        rows = self.image(ram)
+        return sum(1 for y in range(epd.height) for x in range(epd.width)
+                   if rows[y][x] == epd.pixel(x, y))  # Panel 1 is white, framebuffer 1 is black
+
+    def new_refreshes(self):
+        ''' Returns the refreshes recorded since the last call. '''
+        refreshes = self.panel.refreshes[self._reported:]
+        self._reported = len(self.panel.refreshes)
+        return refreshes
+
+
+def _draw(epd, step: int):
+    ''' Draws frame step of the demo sequence: a board of boxes where one row changes per step. '''
+    w, h = epd.width, epd.height
+    if step == 0:
+        epd.fill(0)
+        epd.rect(0, 0, w, h, 1)
+        for row in range(6):
+            epd.fill_rect(10, 30 + row * 40, w // 3, 20, 1)
+    else:
+        row = step % 6
+        epd.fill_rect(w // 2, 30 + row * 40, w // 3, 20, step & 1)
+        epd.pixel(step * 7 % w, h - 5, 1)
+
+
+def main():
+    import asyncio
+    args = sys.argv[1:]
+    out = args[args.index("--out") + 1] if "--out" in args else "emulator_out"
+    asyn = "--async" in args
+    emulator = Emulator(verbose="--verbose" in args, landscape="--portrait" not in args, asyn=asyn,
+                        partial="--full" not in args, full_every=4, per_byte_cs="--per-byte-cs" in args)
+    epd = emulator.epd
+    os.makedirs(out, exist_ok=True)
+
+    stats = emulator.init_stats
+    print(f"init: {stats.bytes} bytes, {stats.commands} commands, {stats.cs_toggles} CS toggles, "
+          f"busy {stats.busy_ms} ms")
+    print(f"{'frame':>5} {'kind':>4} {'bytes':>7} {'RAM':>7} {'CS':>7} {'writes':>7} {'est ms':>8} {'busy ms':>8} {'diff px':>8}")
+
+    async def show_async():
+        epd.show()
+        await epd.wait()
+
+    frame = 0
+    failures = 0
+    for step in range(10):
+        retained = step == 4
+        if retained:
+            # Deep sleep keeping the RAM, as in a short pause, so the update after wake() is partial
+            epd.sleep(retain=True)
+            epd.wake()
+        if step == 7:
+            # Deep sleep, then wake with a reset as after a long pause
+            epd.sleep()
+            epd.init()
+        _draw(epd, step)
+        if asyn:
+            asyncio.run(show_async())
+        else:
+            epd.show()
+            epd.wait_until_ready()
+        for kind, stats, ram, _ in emulator.new_refreshes():
+            path = os.path.join(out, f"frame_{frame:03d}.png")
+            write_png(path, emulator.image(ram))
+            diff = emulator.mismatches(ram)
+            status = ""
+            if diff:
+                status = "  panel differs from framebuffer"
+                failures += 1
+            if retained and kind != "DU":
+                status += "  full refresh after wake()"
+                failures += 1
+            print(f"{frame:>5} {kind:>4} {stats.bytes:>7} {stats.ram_bytes:>7} {stats.cs_toggles:>7} {stats.writes:>7} "
+                  f"{stats.transfer_ms():>8.1f} {stats.busy_ms:>8} {diff:>8}{status}")
+            frame += 1
+    for error in emulator.panel.errors:
+        print("Panel error: " + error)
+    print(f"{frame} refreshes written to {out}")
+    return 1 if emulator.panel.errors or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
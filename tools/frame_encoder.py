@@ -0,0 +1,137 @@
+# frame_encoder.py Host-side encoder for the binary board frames read by board_frame.py.
+# Converts a Darwin GetDepBoardWithDetails/GetDepartureBoard response, or a list of services in the
+# departure cache format (records.Records.to_list), into a frame. Used by the LAN proxy, and from
+# the command line to make frames for testing.
+#
+# Usage (from the repository root):
+#   python tools/frame_encoder.py response.json [destination CRS ...] > frame.bin
+#
+# Released under the MIT license see LICENSE
+
+import io
+import json
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import board_frame
+import darwin
+import records
+
+# Most bytes in one string of the table. Longer destinations and reasons are cut
+MAX_STRING = 255
+
+# Most strings in the table and services in a frame
+MAX_ITEMS = 255
+
+
+def _truncate(data: bytes):
+    ''' Cuts UTF-8 data to MAX_STRING bytes without splitting a character. '''
+    if len(data) <= MAX_STRING:
+        return data
+    data = data[:MAX_STRING]
+    return data.decode("utf-8", "ignore").encode()
+
+
+def encode(store, found: bool = True, generated: str = None):
+    ''' Returns the frame of the services in store, a records.Records. found is False if the
+    response had no train services. generated is generatedAt, or None. Services that would take the
+    string table past MAX_ITEMS strings are left out, which is far more than a board shows. '''
+    strings = []
+    index = {}
+
+    def ref(text: str):
+        # Returns the table index of text, or None if the table is full
+        k = index.get(text)
+        if k is None:
+            if len(strings) >= MAX_ITEMS:
+                return None
+            k = index[text] = len(strings)
+            strings.append(_truncate(text.encode()))
+        return k
+
+    services = bytearray()
+    count = 0
+    for i in range(min(store.count, MAX_ITEMS)):
+        mark = len(strings)
+        etd = store.etd[i]
+        if etd < board_frame.NO_REPORT:
+            k = ref(store.etd_text(i))
+            etd = None if k is None else board_frame.OTHER - k
+        dest = ref(store.destination(i))
+        reason = board_frame.NO_REASON if store.reason[i] < 0 else ref(store.reason_text(i))
+        if etd is None or dest is None or reason is None:
+            # Drop the strings added for this service
+            del strings[mark:]
+            break
+        services += struct.pack("<HhBBH", store.std[i], etd, dest, reason, store.calls[i])
+        count += 1
+    table = b"".join(bytes((len(s),)) + s for s in strings)
+    length = board_frame.HEADER - 6 + len(table) + len(services)
+    header = struct.pack("<2sBBH", board_frame.MAGIC, board_frame.VERSION, board_frame.FOUND if found else 0, length)
+    return header + _generated(generated) + bytes((len(strings), count)) + table + services
+
+
+def _generated(generated: str):
+    ''' generatedAt as the 19 byte field of the header. '''
+    if not generated:
+        return bytes(19)
+    return generated.encode()[:19].ljust(19, b"\0")
+
+
+def with_generated(frame: bytes, generated: str):
+    ''' Returns frame with its generatedAt replaced. '''
+    return frame[:6] + _generated(generated) + frame[25:]
+
+
+def from_darwin(body: bytes, destinations=None, capacity: int = 150):
+    ''' Returns the frame of a Darwin response. If destinations is a list of CRS codes, only
+    services calling at one of them are kept, with bit n of calls set for destinations[n]. '''
+    store = records.Records(capacity)
+    services = darwin.read_services(io.BytesIO(body), store, calls=list(destinations) if destinations else None)
+    return encode(store, services is not None, darwin.generated_at)
+
+
+def from_list(services, generated: str = None, capacity: int = 150):
+    ''' Returns the frame of a list of services in the departure cache format. '''
+    store = records.Records(capacity)
+    store.from_list(services)
+    return encode(store, True, generated)
+
+
+def from_pages(pages, generated: str = None, capacity: int = 150):
+    ''' Returns the frame of one list of services per destination, as saved in departures.json.
+    Services on page n get bit n of calls. '''
+    store = records.Records(capacity)
+    page = records.Records(capacity)
+    for n in range(len(pages)):
+        page.from_list(pages[n])
+        for i in range(page.count):
+            store.add(page.std[i], page.etd[i], page.dest[i], page.reason[i], 1 << n)
+    return encode(store, True, generated)
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print("Usage: python tools/frame_encoder.py response.json [destination CRS ...] > frame.bin")
+        return 2
+    with open(args[0], "rb") as file:
+        body = file.read()
+    data = json.loads(body)
+    if isinstance(data, list):
+        frame = from_list(data)
+    elif "d" in data:
+        # departures.json saved by the board. Multi destination boards save a list per destination
+        frame = from_pages(data["d"] if data.get("m") else [data["d"]], data.get("t"))
+    else:
+        frame = from_darwin(body, args[1:])
+    sys.stdout.buffer.write(frame)
+    print(f"{len(body)} byte response, {len(frame)} byte frame", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
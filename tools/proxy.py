@@ -0,0 +1,312 @@
+# proxy.py LAN proxy that serves any number of departure boards from one Darwin poll per station.
+# Runs on a PC or Raspberry Pi with CPython. Each departing station is requested from Darwin at
+# most once every --interval seconds, whatever the number of boards, using the board's own
+# http_client and darwin extractor. Boards set "proxy" in their config.json and fetch a small
+# response holding only the fields they display, over plain HTTP. Every response has an ETag, so a
+# board whose departures haven't changed gets a 304 and skips parsing and refreshing. The 304 has an
+# X-Generated-At header with the time the station's departures were last fetched, so the board's
+# clock still moves on. Boards with
+# "proxyFrames" get the departures as a binary frame (board_frame.py) instead of JSON.
+#
+# Usage (from the repository root):
+#   python tools/proxy.py [--port 8080] [--interval 60] [--upstream URL] config.json [config.json ...]
+#
+# The config files use the board's config.json schema. The stations and destinations in them are
+# requested from the start, and the first api_key is used for every request. Boards asking for
+# other stations or destinations are served too.
+#
+# Endpoints:
+#   GET /departures/<crs>/<destination CRS>[,<destination CRS>...]?numRows=N[&format=frame]
+#   GET /stats
+#
+# Released under the MIT license see LICENSE
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import darwin
+import frame_encoder
+import http_client
+import records
+
+DARWIN_URL = "https://api1.raildata.org.uk/1010-live-departure-board-dep/LDBWS/api/20220120/GetDepBoardWithDetails/"
+
+# Services requested per station. The most Darwin returns
+FETCH_ROWS = 150
+
+# Destinations per station, the most the extractor can match in one pass
+MAX_DESTINATIONS = 16
+
+
+class Origin:
+    ''' Departures from one station, matched against every destination a board has asked for. '''
+
+    def __init__(self, crs: str, offset: int = 0, window: int = 120):
+        self.crs = crs
+        self.offset = offset
+        self.window = window
+        self.destinations = []  # Bit n of a service's calls is set if it calls at destinations[n]
+        self.store = records.Records(FETCH_ROWS)
+        self.found = False  # False if the last response had no train services
+        self.generated = None
+        self.fetched = None  # time.monotonic() of the last successful request
+        self.version = 0  # Incremented when the departures change
+        self.views = {}  # (destinations, rows, frame): (version, services JSON or frame, etag)
+
+    def url(self, upstream: str):
+        url = f"{upstream}{self.crs}?numRows={FETCH_ROWS}"
+        if self.offset or self.window != 120:
+            url += f"&timeOffset={self.offset}&timeWindow={self.window}"
+        return url
+
+
+class Proxy:
+    ''' Keeps the departures of each station no older than interval seconds, fetching them from
+    upstream on demand. Only one upstream request runs at a time, so boards asking for the same
+    station together share a request. '''
+
+    def __init__(self, api_key: str, interval: int = 60, upstream: str = DARWIN_URL):
+        self.api_key = api_key
+        self.interval = interval
+        self.upstream = upstream
+        self.origins = {}
+        self._lock = threading.Lock()  # Guards the origins and the interned string tables
+        self._client = http_client.HTTPClient(keep_alive=True)
+        self._scratch = records.Records(FETCH_ROWS)
+        # Statistics
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.requests = 0
+        self.not_modified = 0
+
+    def add(self, crs: str, destinations, offset: int = 0, window: int = 120):
+        ''' Registers a station and destinations. Returns the Origin. Raises ValueError if the
+        station would have too many destinations. '''
+        with self._lock:
+            origin = self.origins.get(crs)
+            if origin is None:
+                origin = self.origins[crs] = Origin(crs, offset, window)
+            for dest in destinations:
+                if dest not in origin.destinations:
+                    if len(origin.destinations) >= MAX_DESTINATIONS:
+                        raise ValueError(f"More than {MAX_DESTINATIONS} destinations for {crs}")
+                    origin.destinations.append(dest)
+                    # The stored services weren't matched against the new destination
+                    origin.fetched = None
+            return origin
+
+    def _refresh(self, origin: Origin):
+        ''' Fetches the station's departures if they are older than the interval. Called with the lock held. '''
+        now = time.monotonic()
+        if origin.fetched is not None and now - origin.fetched < self.interval:
+            return
+        self.upstream_calls += 1
+        response = None
+        try:
+            response = self._client.get(origin.url(self.upstream), {"x-apikey": self.api_key, "Accept-Encoding": "gzip"})
+            if response.status != 200:
+                raise http_client.FetchError(http_client.HTTP, f"HTTP status {response.status}", response.status)
+            # A copy, as the extractor only re-reads the list when it is a different object
+            services = darwin.read_services(response.body(), self._scratch, calls=list(origin.destinations))
+        except Exception as e:
+            self.upstream_errors += 1
+            print(f"{origin.crs}: upstream request failed ({http_client.classify(e)}): {e}")
+            self._client.close()
+            # The last good departures are served until a request succeeds
+            return
+        finally:
+            if response is not None:
+                response.close()
+        found = services is not None
+        if found != origin.found or not self._scratch.equals(origin.store) or self._masks_differ(origin):
+            origin.store.copy(self._scratch)
+            origin.found = found
+            origin.version += 1
+        origin.generated = darwin.generated_at
+        origin.fetched = now
+
+    def _masks_differ(self, origin: Origin):
+        ''' Records.equals doesn't compare the calls masks, which decide what each board gets. '''
+        a, b = self._scratch, origin.store
+        return any(a.calls[i] != b.calls[i] for i in range(min(a.count, b.count)))
+
+    def view(self, crs: str, destinations, rows: int, frame: bool = False):
+        ''' Returns (body, etag, generated) for a board, or None if the station's departures are
+        unknown. The body is a board frame if frame is set, otherwise JSON. generated is the time
+        of the departures, as in Darwin's generatedAt, or None. '''
+        origin = self.add(crs, destinations)
+        with self._lock:
+            self._refresh(origin)
+            if origin.fetched is None:
+                return None
+            key = (tuple(destinations), rows, frame)
+            view = origin.views.get(key)
+            if view is None or view[0] != origin.version:
+                store = _select(origin, destinations, rows)
+                if frame:
+                    services = frame_encoder.encode(store, origin.found)
+                else:
+                    services = _encode(origin, store, destinations)
+                # Weak, as generatedAt changes every request while the departures stay the same
+                etag = 'W/"' + hashlib.sha1(services).hexdigest()[:16] + '"'
+                view = origin.views[key] = (origin.version, services, etag)
+            if frame:
+                return frame_encoder.with_generated(view[1], origin.generated), view[2], origin.generated
+            return b'{"generatedAt":' + json.dumps(origin.generated).encode() + view[1], view[2], origin.generated
+
+    def stats(self):
+        return {"stations": len(self.origins), "requests": self.requests, "not_modified": self.not_modified,
+                "upstream_calls": self.upstream_calls, "upstream_errors": self.upstream_errors}
+
+
+def _select(origin: Origin, destinations, rows: int):
+    ''' Returns a records.Records of up to rows services calling at one of destinations, with bit n
+    of calls set if the service calls at destinations[n]. '''
+    store = origin.store
+    bits = [1 << origin.destinations.index(d) for d in destinations]
+    selected = records.Records(rows)
+    for i in range(store.count):
+        calls = 0
+        for n in range(len(bits)):
+            if store.calls[i] & bits[n]:
+                calls |= 1 << n
+        if calls and not selected.add(store.std[i], store.etd[i], store.dest[i], store.reason[i], calls):
+            break
+    return selected
+
+
+def _encode(origin: Origin, store, destinations):
+    ''' Builds the end of the board response after generatedAt: Darwin's JSON layout cut down to
+    the fields the board's extractor reads. The calling points list only the requested destinations
+    the service calls at, which is all multi destination mode needs. '''
+    if not origin.found:
+        return b"}"
+    services = []
+    for i in range(store.count):
+        calls = [destinations[n] for n in range(len(destinations)) if store.calls[i] & 1 << n]
+        service = {"std": store.std_text(i), "etd": store.etd_text(i),
+                   "destination": [{"locationName": store.destination(i)}],
+                   "subsequentCallingPoints": [{"callingPoint": [{"crs": crs} for crs in calls]}]}
+        if store.reason[i] >= 0:
+            service["delayReason"] = store.reason_text(i)
+        services.append(service)
+    return b',"trainServices":' + json.dumps(services, separators=(",", ":")).encode() + b"}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        proxy = self.server.proxy
+        path, _, query = self.path.partition("?")
+        parts = path.strip("/").split("/")
+        if parts == ["stats"]:
+            self._send(200, json.dumps(proxy.stats()).encode())
+            return
+        if len(parts) != 3 or parts[0] != "departures" or not parts[2]:
+            self._send(404, b'{"error":"not found"}')
+            return
+        rows = 10
+        frame = False
+        for item in query.split("&"):
+            name, _, value = item.partition("=")
+            if name == "numRows" and value.isdigit():
+                rows = max(1, min(FETCH_ROWS, int(value)))
+            elif name == "format":
+                frame = value == "frame"
+        crs = parts[1].upper()
+        destinations = [d.upper() for d in parts[2].split(",")]
+        proxy.requests += 1
+        try:
+            view = proxy.view(crs, destinations, rows, frame)
+        except ValueError as e:
+            self._send(400, json.dumps({"error": str(e)}).encode())
+            return
+        if view is None:
+            self._send(502, b'{"error":"upstream unavailable"}')
+            return
+        body, etag, generated = view
+        if self.headers.get("If-None-Match") == etag:
+            proxy.not_modified += 1
+            # The etag leaves out generatedAt, which the board still needs to set its clock
+            self._send(304, None, etag, generated=generated)
+            return
+        self._send(200, body, etag, "application/octet-stream" if frame else "application/json")
+
+    def _send(self, status: int, body, etag: str = None, content_type: str = "application/json", generated: str = None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        if generated:
+            self.send_header("X-Generated-At", generated)
+        if body is not None:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(proxy: Proxy, port: int = 8080, host: str = ""):
+    ''' Returns a started ThreadingHTTPServer serving proxy. '''
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.proxy = proxy
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_configs(paths):
+    ''' Reads board config.json files. Returns (api_key, [(crs, destinations, offset, window)]). '''
+    api_key = None
+    boards = []
+    for path in paths:
+        with open(path) as file:
+            config = json.load(file)
+        api_key = api_key or config.get("api_key")
+        destinations = config.get("destinations") or [config["filterCrs"]]
+        boards.append((config["crs"], destinations, config.get("timeOffset", 0), config.get("timeWindow", 120)))
+    return api_key, boards
+
+
+def main():
+    args = sys.argv[1:]
+    options = {"--port": 8080, "--interval": 60, "--upstream": DARWIN_URL}
+    paths = []
+    i = 0
+    while i < len(args):
+        if args[i] in options:
+            options[args[i]] = type(options[args[i]])(args[i + 1])
+            i += 2
+        else:
+            paths.append(args[i])
+            i += 1
+    if not paths:
+        print("Usage: python tools/proxy.py [--port 8080] [--interval 60] [--upstream URL] config.json [config.json ...]")
+        return 2
+    api_key, boards = load_configs(paths)
+    proxy = Proxy(api_key, options["--interval"], options["--upstream"])
+    for crs, destinations, offset, window in boards:
+        proxy.add(crs, destinations, offset, window)
+    serve(proxy, options["--port"])
+    print(f"Serving {len(proxy.origins)} stations on port {options['--port']}, polling each at most every {options['--interval']} s")
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(proxy.stats()))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
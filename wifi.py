@@ -0,0 +1,225 @@
+# wifi.py Fast Wi-Fi connection and reconnection.
+# The access point's BSSID and channel are cached on flash after the first connection so later
+# joins skip the scan, an optional static IP skips DHCP, and the link is polled at short intervals
+# with backoff. A lost connection is first rejoined on the active interface, and the interface is
+# only reset if that fails. The join and IP times of each attempt are printed. start() begins the
+# first attempt without waiting, so the rest of startup can run while the access point is joined.
+
+# Released under the MIT license see LICENSE
+
+import network
+import binascii
+import ujson
+import utime
+
+CACHE_FILE = "wifi.json"
+
+# Link status polling: the first delay in ms, doubled after each poll up to the maximum
+FIRST_POLL = 50
+MAX_POLL = 800
+
+# Pico W (cyw43) link status when joined to the access point but still waiting for an IP address
+_JOINED = 2
+# Link statuses that mean the attempt has failed
+_FAILED = (network.STAT_CONNECT_FAIL, network.STAT_NO_AP_FOUND, network.STAT_WRONG_PASSWORD)
+
+# Kinds of attempt, from the lightest
+REJOIN = "rejoin"  # connect() again on the active interface
+CACHED = "cached"  # Reset the interface and join the cached BSSID and channel
+FULL = "full"  # Reset the interface and join any access point with the SSID
+
+
+class Station:
+    ''' Station interface that connects to ssid. fast caches the access point in cache_path.
+    static is an (ip, netmask, gateway, dns) tuple, or None to use DHCP. Each attempt gives up after
+    timeout ms. '''
+
+    def __init__(self, ssid: str, password: str, fast: bool = True, static=None, timeout: int = 10000, cache_path: str = CACHE_FILE):
+        self.ssid = ssid
+        self.password = password
+        self.fast = fast
+        self.static = static
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.wlan = None
+        # (BSSID bytes, channel) of the access point last connected to, or None
+        self.cached = self._load() if fast else None
+        # Statistics for reporting. radio_ms is the total time spent connecting
+        self.attempts = 0
+        self.failures = 0
+        self.radio_ms = 0
+        # State of the attempt in progress
+        self._kind = None
+        self._start = 0
+        self._joined = -1
+        # Attempts planned by start(), the first already begun. [] if it found the interface connected
+        self._pending = None
+
+    def _load(self):
+        ''' Reads the cached access point for this SSID. '''
+        try:
+            with open(self.cache_path, "r") as file:
+                cache = ujson.load(file)
+            if cache["ssid"] == self.ssid:
+                return binascii.unhexlify(cache["bssid"]), cache["channel"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save(self):
+        ''' Finds the strongest access point with the SSID and caches it. Only runs after a full join,
+        as the scan keeps the radio on for a couple of seconds. '''
+        best = None
+        try:
+            for ssid, bssid, channel, rssi, *_ in self.wlan.scan():
+                if ssid == self.ssid.encode() and (best is None or rssi > best[2]):
+                    best = (bssid, channel, rssi)
+        except OSError as e:
+            print("Wi-Fi scan failed: " + str(e))
+        if best is None:
+            return
+        self.cached = (best[0], best[1])
+        try:
+            with open(self.cache_path, "w") as file:
+                ujson.dump({"ssid": self.ssid, "bssid": binascii.hexlify(best[0]).decode(), "channel": best[1]}, file)
+        except OSError as e:
+            print("Failed to cache access point: " + str(e))
+
+    def _plan(self):
+        ''' Returns the kinds of attempt to make, lightest first. '''
+        plan = []
+        if self.wlan is not None and self.wlan.active():
+            plan.append(REJOIN)
+        if self.cached is not None:
+            plan.append(CACHED)
+        plan.append(FULL)
+        return plan
+
+    def radio_off(self):
+        ''' Turns the radio off. The next connect() starts with the cached access point. '''
+        if self.wlan is not None:
+            self.wlan.active(False)
+
+    def _begin(self, kind: str):
+        ''' Starts an attempt without waiting for it. '''
+        self._kind = kind
+        self._start = utime.ticks_ms()
+        self._joined = -1
+        self.attempts += 1
+        wlan = self.wlan
+        if wlan is None:
+            wlan = self.wlan = network.WLAN(network.STA_IF)
+        elif kind != REJOIN:
+            wlan.active(False)
+        wlan.active(True)
+        if self.static is not None:
+            # Setting the address stops the DHCP client
+            wlan.ifconfig(self.static)
+        if kind == CACHED:
+            bssid, channel = self.cached
+            try:
+                wlan.connect(self.ssid, self.password, bssid=bssid, channel=channel)
+            except TypeError:
+                # Ports without the channel argument
+                wlan.connect(self.ssid, self.password, bssid=bssid)
+        else:
+            wlan.connect(self.ssid, self.password)
+
+    def _check(self):
+        ''' Returns True when connected, False if the attempt has failed or timed out, otherwise None. '''
+        wlan = self.wlan
+        elapsed = utime.ticks_diff(utime.ticks_ms(), self._start)
+        connected = wlan.isconnected()
+        status = wlan.status()
+        if self._joined < 0 and (status == _JOINED or connected):
+            self._joined = elapsed
+        if not connected and status not in _FAILED and elapsed < self.timeout:
+            return None
+        self.radio_ms += elapsed
+        if not connected:
+            self.failures += 1
+            print(f"Wi-Fi {self._kind} attempt failed after {elapsed} ms (status {status})")
+            if self._kind == CACHED:
+                # The access point may have changed. The next full join caches it again
+                self.cached = None
+            return False
+        print(f"Wi-Fi {self._kind} attempt: joined in {self._joined} ms, IP address {elapsed - self._joined} ms later, "
+              f"{elapsed} ms in total ({self.attempts} attempts, {self.failures} failed, {self.radio_ms} ms connecting)")
+        print("Network configuration:", wlan.ifconfig())
+        if self.fast and self._kind == FULL:
+            self._save()
+        return True
+
+    def _already_connected(self):
+        ''' Returns True if the interface is still connected from before a soft reset. '''
+        if self.wlan is not None:
+            return False
+        wlan = network.WLAN(network.STA_IF)
+        if wlan.active() and wlan.isconnected():
+            self.wlan = wlan
+            print("Wi-Fi already connected:", wlan.ifconfig())
+            return True
+        return False
+
+    def start(self):
+        ''' Begins the first attempt without waiting for it. The next connect() or connect_async()
+        waits for it, and makes the other attempts if it fails. '''
+        if self._already_connected():
+            self._pending = []
+            return
+        self._pending = self._plan()
+        self._begin(self._pending[0])
+
+    def _ready(self):
+        ''' Returns True if there is nothing to wait for, as the interface was already connected. '''
+        pending = self._pending
+        if pending is None:
+            return self._already_connected()
+        if pending:
+            return False
+        self._pending = None
+        return True
+
+    def _attempts(self):
+        ''' Yields the kind of each attempt once it has begun. The first may have been begun by start(). '''
+        plan = self._pending
+        self._pending = None
+        if plan is None:
+            plan = self._plan()
+        else:
+            yield plan.pop(0)
+        for kind in plan:
+            self._begin(kind)
+            yield kind
+
+    def connect(self):
+        ''' Connects, making lighter attempts first. Returns the WLAN interface, or raises an exception
+        if every attempt failed. '''
+        if self._ready():
+            return self.wlan
+        for kind in self._attempts():
+            delay = FIRST_POLL
+            result = self._check()
+            while result is None:
+                utime.sleep_ms(delay)
+                delay = min(delay * 2, MAX_POLL)
+                result = self._check()
+            if result:
+                return self.wlan
+        raise Exception(f"Failed to connect to {self.ssid}")
+
+    async def connect_async(self):
+        ''' Same as connect, but yields to other tasks while waiting for the connection. '''
+        import uasyncio as asyncio
+        if self._ready():
+            return self.wlan
+        for kind in self._attempts():
+            delay = FIRST_POLL
+            result = self._check()
+            while result is None:
+                await asyncio.sleep_ms(delay)
+                delay = min(delay * 2, MAX_POLL)
+                result = self._check()
+            if result:
+                return self.wlan
+        raise Exception(f"Failed to connect to {self.ssid}")